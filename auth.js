@@ -114,10 +114,15 @@ async function getCurrentUser() {
 }
 
 async function updateProfile(updateData) {
-    return await apiRequest('/users/me', {
+    const user = await apiRequest('/users/me', {
         method: 'PUT',
         body: JSON.stringify(updateData)
     });
+    // После смены пароля или имени пользователя старый токен отозван - сервер выдает новый
+    if (user && user.access_token) {
+        setToken(user.access_token);
+    }
+    return user;
 }
 
 async function getPortfolio() {
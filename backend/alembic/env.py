@@ -11,7 +11,7 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 load_dotenv()
 
 from app.database import Base
-from app.models import Item, User, Portfolio
+from app.models import Item, User, Portfolio, Tag
 
 config = context.config
 
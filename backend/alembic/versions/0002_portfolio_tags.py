@@ -0,0 +1,116 @@
+"""portfolio tags: tags, portfolio_tags and backfill from technologies
+
+Теги заполняются из строк portfolio.technologies блоками по id,
+так что миграция не держит всю таблицу в памяти. Разбор строк
+повторяет app.tags.parse_tags на момент написания миграции.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 12:10:00
+
+"""
+from typing import Dict, Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0002"
+down_revision: Union[str, None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BACKFILL_BATCH = 1000
+TAG_MAX_LENGTH = 100
+
+portfolio = sa.table(
+    "portfolio",
+    sa.column("id", sa.Integer),
+    sa.column("technologies", sa.String),
+)
+tags = sa.table(
+    "tags",
+    sa.column("id", sa.Integer),
+    sa.column("name", sa.String),
+    sa.column("slug", sa.String),
+)
+portfolio_tags = sa.table(
+    "portfolio_tags",
+    sa.column("portfolio_id", sa.Integer),
+    sa.column("tag_id", sa.Integer),
+)
+
+
+def parse_tags(technologies) -> Dict[str, str]:
+    result: Dict[str, str] = {}
+    for part in (technologies or "").split(","):
+        name = " ".join(part.split())[:TAG_MAX_LENGTH]
+        if name:
+            result.setdefault(name.lower(), name)
+    return result
+
+
+def upgrade() -> None:
+    op.create_table(
+        "tags",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("name", sa.String(length=100), nullable=False),
+        sa.Column("slug", sa.String(length=100), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_tags_id", "tags", ["id"])
+    op.create_index("ix_tags_slug", "tags", ["slug"], unique=True)
+
+    op.create_table(
+        "portfolio_tags",
+        sa.Column("portfolio_id", sa.Integer(), nullable=False),
+        sa.Column("tag_id", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["portfolio_id"], ["portfolio.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["tag_id"], ["tags.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("portfolio_id", "tag_id"),
+    )
+    op.create_index(
+        "ix_portfolio_tags_tag_id_portfolio_id", "portfolio_tags", ["tag_id", "portfolio_id"]
+    )
+
+    connection = op.get_bind()
+    tag_ids: Dict[str, int] = {}
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            sa.select(portfolio.c.id, portfolio.c.technologies)
+            .where(portfolio.c.id > last_id, portfolio.c.technologies.isnot(None))
+            .order_by(portfolio.c.id)
+            .limit(BACKFILL_BATCH)
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+
+        parsed = {item_id: parse_tags(technologies) for item_id, technologies in rows}
+        new_tags = {}
+        for item_tags in parsed.values():
+            for slug, name in item_tags.items():
+                if slug not in tag_ids:
+                    new_tags.setdefault(slug, name)
+        if new_tags:
+            connection.execute(
+                tags.insert(), [{"slug": slug, "name": name} for slug, name in new_tags.items()]
+            )
+            tag_ids.update(connection.execute(
+                sa.select(tags.c.slug, tags.c.id).where(tags.c.slug.in_(list(new_tags)))
+            ).all())
+
+        links = [
+            {"portfolio_id": item_id, "tag_id": tag_ids[slug]}
+            for item_id, item_tags in parsed.items()
+            for slug in item_tags
+        ]
+        if links:
+            connection.execute(portfolio_tags.insert(), links)
+
+
+def downgrade() -> None:
+    op.drop_table("portfolio_tags")
+    op.drop_table("tags")
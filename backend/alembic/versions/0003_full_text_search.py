@@ -0,0 +1,86 @@
+"""full-text search: tsvector + GIN (PostgreSQL) or FTS5 (SQLite)
+
+В PostgreSQL search_vector - генерируемые STORED-колонки, поэтому
+ALTER TABLE перезаписывает таблицы users и portfolio; на больших
+таблицах выполняйте миграцию в окно обслуживания. В SQLite создаются
+FTS5-таблицы с триггерами и заполняются командой 'rebuild'.
+Выражения совпадают с app.models.SEARCH_DDL.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 12:20:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0003"
+down_revision: Union[str, None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+POSTGRES_UPGRADE = [
+    "ALTER TABLE users ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ("
+    "to_tsvector('russian'::regconfig, coalesce(full_name, '') || ' ' || username)) STORED",
+    "CREATE INDEX ix_users_search_vector ON users USING gin (search_vector)",
+    "ALTER TABLE portfolio ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('russian'::regconfig, title), 'A') || "
+    "setweight(to_tsvector('russian'::regconfig, coalesce(technologies, '')), 'B') || "
+    "setweight(to_tsvector('russian'::regconfig, coalesce(description, '')), 'C')) STORED",
+    "CREATE INDEX ix_portfolio_search_vector ON portfolio USING gin (search_vector)",
+]
+
+SQLITE_UPGRADE = [
+    "CREATE VIRTUAL TABLE users_fts USING fts5("
+    "full_name, username, content='users', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER users_fts_ai AFTER INSERT ON users BEGIN "
+    "INSERT INTO users_fts(rowid, full_name, username) VALUES (new.id, new.full_name, new.username); END",
+    "CREATE TRIGGER users_fts_ad AFTER DELETE ON users BEGIN "
+    "INSERT INTO users_fts(users_fts, rowid, full_name, username) "
+    "VALUES ('delete', old.id, old.full_name, old.username); END",
+    "CREATE TRIGGER users_fts_au AFTER UPDATE OF full_name, username ON users BEGIN "
+    "INSERT INTO users_fts(users_fts, rowid, full_name, username) "
+    "VALUES ('delete', old.id, old.full_name, old.username); "
+    "INSERT INTO users_fts(rowid, full_name, username) VALUES (new.id, new.full_name, new.username); END",
+    "INSERT INTO users_fts(users_fts) VALUES ('rebuild')",
+    "CREATE VIRTUAL TABLE portfolio_fts USING fts5("
+    "title, technologies, description, content='portfolio', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER portfolio_fts_ai AFTER INSERT ON portfolio BEGIN "
+    "INSERT INTO portfolio_fts(rowid, title, technologies, description) "
+    "VALUES (new.id, new.title, new.technologies, new.description); END",
+    "CREATE TRIGGER portfolio_fts_ad AFTER DELETE ON portfolio BEGIN "
+    "INSERT INTO portfolio_fts(portfolio_fts, rowid, title, technologies, description) "
+    "VALUES ('delete', old.id, old.title, old.technologies, old.description); END",
+    "CREATE TRIGGER portfolio_fts_au AFTER UPDATE OF title, technologies, description ON portfolio BEGIN "
+    "INSERT INTO portfolio_fts(portfolio_fts, rowid, title, technologies, description) "
+    "VALUES ('delete', old.id, old.title, old.technologies, old.description); "
+    "INSERT INTO portfolio_fts(rowid, title, technologies, description) "
+    "VALUES (new.id, new.title, new.technologies, new.description); END",
+    "INSERT INTO portfolio_fts(portfolio_fts) VALUES ('rebuild')",
+]
+
+
+def upgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    statements = {"postgresql": POSTGRES_UPGRADE, "sqlite": SQLITE_UPGRADE}.get(dialect, [])
+    for statement in statements:
+        op.execute(statement)
+
+
+def downgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    if dialect == "postgresql":
+        op.drop_index("ix_portfolio_search_vector", table_name="portfolio")
+        op.drop_column("portfolio", "search_vector")
+        op.drop_index("ix_users_search_vector", table_name="users")
+        op.drop_column("users", "search_vector")
+    elif dialect == "sqlite":
+        for trigger in ("users_fts_ai", "users_fts_ad", "users_fts_au",
+                        "portfolio_fts_ai", "portfolio_fts_ad", "portfolio_fts_au"):
+            op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        op.execute("DROP TABLE IF EXISTS users_fts")
+        op.execute("DROP TABLE IF EXISTS portfolio_fts")
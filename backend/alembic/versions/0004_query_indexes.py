@@ -0,0 +1,76 @@
+"""query-shaped composite and partial indexes
+
+Индексы повторяют фильтры и сортировки запросов роутеров:
+
+- ix_portfolio_user_id_order: WHERE user_id = ? ORDER BY order_index, created_at
+  (заменяет ix_portfolio_user_id - он является его префиксом)
+- ix_portfolio_visible_user_id_order: то же для is_visible (публичные профили)
+- ix_users_public_directory: каталог анкет, keyset по (created_at, id)
+- ix_portfolio_image_url: проверка ссылок на файл изображения
+
+В PostgreSQL индексы создаются и удаляются CONCURRENTLY вне транзакции
+миграции и не блокируют запись. Если создание прервалось, останется
+невалидный индекс - удалите его (DROP INDEX CONCURRENTLY) и повторите.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17 12:30:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0004"
+down_revision: Union[str, None] = "0003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def where(postgresql: str, sqlite: str) -> dict:
+    return {"postgresql_where": sa.text(postgresql), "sqlite_where": sa.text(sqlite)}
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_portfolio_user_id_order", "portfolio", ["user_id", "order_index", "created_at"],
+            postgresql_concurrently=True, if_not_exists=True
+        )
+        op.create_index(
+            "ix_portfolio_visible_user_id_order", "portfolio", ["user_id", "order_index", "created_at"],
+            postgresql_concurrently=True, if_not_exists=True,
+            **where("is_visible = true", "is_visible = 1")
+        )
+        op.create_index(
+            "ix_users_public_directory", "users", ["created_at", "id"],
+            postgresql_concurrently=True, if_not_exists=True,
+            **where("is_profile_public = true AND is_active = true", "is_profile_public = 1 AND is_active = 1")
+        )
+        op.create_index(
+            "ix_portfolio_image_url", "portfolio", ["image_url"],
+            postgresql_concurrently=True, if_not_exists=True,
+            **where("image_url IS NOT NULL", "image_url IS NOT NULL")
+        )
+        op.drop_index(
+            "ix_portfolio_user_id", table_name="portfolio",
+            postgresql_concurrently=True, if_exists=True
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_portfolio_user_id", "portfolio", ["user_id"],
+            postgresql_concurrently=True, if_not_exists=True
+        )
+        for name, table in (
+            ("ix_portfolio_image_url", "portfolio"),
+            ("ix_users_public_directory", "users"),
+            ("ix_portfolio_visible_user_id_order", "portfolio"),
+            ("ix_portfolio_user_id_order", "portfolio"),
+        ):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
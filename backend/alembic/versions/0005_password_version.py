@@ -0,0 +1,34 @@
+"""users.password_version: версия пароля для claim ver токенов
+
+claim ver раньше считался от hashed_password, и перехеширование пароля при
+входе (новые параметры argon2, переход с bcrypt) отзывало бы все токены
+пользователя. Теперь ver зависит от счетчика, который растет только при
+смене пароля.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17 13:10:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0005"
+down_revision: Union[str, None] = "0004"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "users",
+        sa.Column("password_version", sa.Integer(), server_default="0", nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("users", "password_version")
@@ -0,0 +1,40 @@
+"""items: индекс title COLLATE "C" для поиска по началу названия
+
+Диапазон [prefix, следующая строка) в items.title_prefix_range верен
+только при побайтовой сортировке, поэтому в PostgreSQL сравнение идет в
+COLLATE "C", и обычный ix_items_title (сортировка базы, например ru_RU)
+для него не подходит. В SQLite сортировка BINARY по умолчанию - миграция
+ничего не делает.
+
+Индекс создается CONCURRENTLY вне транзакции миграции. Если создание
+прервалось, удалите невалидный индекс (DROP INDEX CONCURRENTLY) и повторите.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17 15:40:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0006"
+down_revision: Union[str, None] = "0005"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    with op.get_context().autocommit_block():
+        op.execute('CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_items_title_c ON items (title COLLATE "C")')
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_items_title_c")
@@ -1,12 +1,20 @@
+import asyncio
+import contextvars
+import hashlib
+import time
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Dict, Optional
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
-from app.database import get_db
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import make_transient_to_detached
+from app.database import get_db, primary_session
 from app.models import User
+from app.hashing import password_hasher, needs_rehash
+from app.cache import LRUCache
+from app.login_throttle import login_throttle
 import os
 from dotenv import load_dotenv
 
@@ -17,33 +25,137 @@ SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-in-production")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-# Password hashing
-pwd_context = CryptContext(
-    schemes=["argon2", "bcrypt"],
-    default="argon2",  # Argon2 
-    deprecated="auto"
-)
+# Кэш пользователей для get_current_user
+AUTH_USER_CACHE_SIZE = int(os.getenv("AUTH_USER_CACHE_SIZE", "10000"))
+AUTH_USER_CACHE_TTL = int(os.getenv("AUTH_USER_CACHE_TTL", "60"))
+# Сколько паролей может перехешироваться одновременно; остальные - при следующем входе
+PASSWORD_REHASH_MAX_PENDING = int(os.getenv("PASSWORD_REHASH_MAX_PENDING", "4"))
 
 # OAuth2 scheme
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/v1/auth/login")
 
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Проверка пароля"""
-    try:
-        # Argon2 и bcrypt 
-        return pwd_context.verify(plain_password, hashed_password)
-    except ValueError as e:
-
-        if "password cannot be longer than 72 bytes" in str(e):
-            return False
-        raise
+    # Argon2 и bcrypt, в пуле процессов
+    verified = await password_hasher.verify(plain_password, hashed_password)
+    # Только проверки, дошедшие до хеширования: без неизвестных пользователей и 503
+    login_throttle.record_hash()
+    return verified
 
 
-def get_password_hash(password: str) -> str:
+async def get_password_hash(password: str) -> str:
     """Хеширование пароля"""
-    # Argon2
-    return pwd_context.hash(password)
+    # Argon2, в пуле процессов
+    return await password_hasher.hash(password)
+
+
+def token_version(user: User) -> str:
+    """Версия учетных данных: меняется вместе с username, паролем или is_active.
+
+    Берется password_version, а не сам хеш: перехеширование при входе не отзывает токены.
+    """
+    raw = f"{user.username}|{user.password_version}|{user.is_active}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+
+def token_claims(user: User) -> dict:
+    """Данные для JWT: стабильный id пользователя и версия учетных данных"""
+    return {"sub": user.username, "uid": user.id, "ver": token_version(user)}
+
+
+class AuthenticatedUserCache:
+    """LRU снимков пользователей по id для get_current_user.
+
+    Хранятся значения колонок, а не ORM-объекты: каждый запрос получает
+    собственный отсоединенный User и не может испортить общий экземпляр.
+    Кэш локален для процесса: запись сбрасывает только воркер, выполнивший
+    изменение. Новый токен с другим ver другой воркер примет сразу (снимок
+    перечитывается из БД), а отозванный старый токен и деактивированный
+    аккаунт принимает, пока живет его снимок - до AUTH_USER_CACHE_TTL секунд.
+    """
+
+    def __init__(self, max_entries: int, ttl: int):
+        self.lru = LRUCache(max_entries, ttl=ttl)
+        self.lookups = 0
+        self.lookup_seconds = 0.0
+
+    def get(self, user_id: int) -> Optional[User]:
+        snapshot = self.lru.get(user_id)
+        if snapshot is None:
+            return None
+        user = User(**snapshot)
+        make_transient_to_detached(user)
+        return user
+
+    def set(self, user: User):
+        self.lru.set(user.id, {column.key: getattr(user, column.key) for column in User.__table__.columns})
+
+    def invalidate(self, user_id: int):
+        self.lru.delete(user_id)
+
+    def record_lookup(self, seconds: float):
+        self.lookups += 1
+        self.lookup_seconds += seconds
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self.lru),
+            **self.lru.stats.as_dict(),
+            "lookups": self.lookups,
+            "avg_lookup_ms": round(self.lookup_seconds / self.lookups * 1000, 4) if self.lookups else 0.0,
+        }
+
+
+user_cache = AuthenticatedUserCache(AUTH_USER_CACHE_SIZE, AUTH_USER_CACHE_TTL)
+
+
+class PasswordRehashQueue:
+    """Фоновое перехеширование пароля после успешного входа.
+
+    Новый хеш записывается, только если в БД все еще старый (пароль не
+    сменили, другой воркер не успел раньше). Задача идет в пустом контексте:
+    ее SQL не попадает в статистику и маршрутизацию реплик HTTP-запроса.
+    Переполненная очередь, 503 пула хеширования или ошибка БД не мешают
+    входу - хеш обновится в следующий раз.
+    """
+
+    def __init__(self, max_pending: int):
+        self.max_pending = max_pending
+        self._tasks: Dict[int, asyncio.Task] = {}
+
+    def schedule(self, user: User, password: str):
+        if user.id in self._tasks or len(self._tasks) >= self.max_pending:
+            return
+        user_id = user.id
+        task = asyncio.get_running_loop().create_task(
+            self._rehash(user_id, user.hashed_password, password), context=contextvars.Context()
+        )
+        self._tasks[user_id] = task
+        task.add_done_callback(lambda done: self._tasks.pop(user_id, None))
+
+    async def _rehash(self, user_id: int, old_hash: str, password: str):
+        try:
+            new_hash = await password_hasher.hash(password)
+            async with primary_session() as db:
+                result = await db.execute(
+                    update(User)
+                    .where(User.id == user_id, User.hashed_password == old_hash)
+                    # updated_at не трогаем: данные профиля не менялись
+                    .values(hashed_password=new_hash, updated_at=User.updated_at)
+                )
+                await db.commit()
+            if result.rowcount:
+                user_cache.invalidate(user_id)
+        except Exception as e:
+            print(f"Ошибка при перехешировании пароля пользователя {user_id}: {e}")
+
+    def shutdown(self):
+        for task in list(self._tasks.values()):
+            task.cancel()
+
+
+password_rehasher = PasswordRehashQueue(PASSWORD_REHASH_MAX_PENDING)
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
@@ -58,36 +170,41 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return encoded_jwt
 
 
-def get_user_by_email(db: Session, email: str) -> Optional[User]:
+async def get_user_by_email(db: AsyncSession, email: str) -> Optional[User]:
     """Получить пользователя по email"""
-    return db.query(User).filter(User.email == email).first()
+    return await db.scalar(select(User).where(User.email == email).limit(1))
 
 
-def get_user_by_username(db: Session, username: str) -> Optional[User]:
+async def get_user_by_username(db: AsyncSession, username: str) -> Optional[User]:
     """Получить пользователя по username"""
-    return db.query(User).filter(User.username == username).first()
+    return await db.scalar(select(User).where(User.username == username).limit(1))
 
 
-def get_user_by_username_or_email(db: Session, identifier: str) -> Optional[User]:
+async def get_user_by_username_or_email(db: AsyncSession, identifier: str) -> Optional[User]:
     """Получить пользователя по username или email"""
-    user = db.query(User).filter(
-        (User.username == identifier) | (User.email == identifier)
-    ).first()
+    user = await db.scalar(
+        select(User).where(
+            (User.username == identifier) | (User.email == identifier)
+        ).limit(1)
+    )
     return user
 
 
-def authenticate_user(db: Session, username: str, password: str) -> Optional[User]:
+async def authenticate_user(db: AsyncSession, username: str, password: str) -> Optional[User]:
     """Аутентификация пользователя (поддерживает вход по username или email)"""
     try:
         # Ищем пользователя по username или email
-        user = get_user_by_username_or_email(db, username)
+        user = await get_user_by_username_or_email(db, username)
         if not user:
             return None
         
         # Проверка пароля с обработкой ошибок
         try:
-            if not verify_password(password, user.hashed_password):
+            if not await verify_password(password, user.hashed_password):
                 return None
+        except HTTPException:
+            # Пул хеширования перегружен - отдаем 503 как есть
+            raise
         except ValueError as e:
             # Обработка ошибки bcrypt для длинных паролей
             if "password cannot be longer than 72 bytes" in str(e):
@@ -101,8 +218,13 @@ def authenticate_user(db: Session, username: str, password: str) -> Optional[Use
             # Логи ошибки проверки пароля
             print(f"Ошибка при проверке пароля: {e}")
             return None
-        
+
+        # bcrypt или устаревшие параметры argon2 - новый хеш в фоне, ответ не ждет
+        if needs_rehash(user.hashed_password):
+            password_rehasher.schedule(user, password)
         return user
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Ошибка при аутентификации: {e}")
         return None
@@ -110,7 +232,7 @@ def authenticate_user(db: Session, username: str, password: str) -> Optional[Use
 
 async def get_current_user(
     token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ) -> User:
     """Получить текущего пользователя из токена"""
     credentials_exception = HTTPException(
@@ -125,9 +247,26 @@ async def get_current_user(
             raise credentials_exception
     except JWTError:
         raise credentials_exception
-    
-    user = get_user_by_username(db, username=username)
+
+    user_id = payload.get("uid")
+    version = payload.get("ver")
+    if user_id is None or version is None:
+        # Токены до появления uid/ver не отзываются сменой пароля - нужен повторный вход
+        raise credentials_exception
+
+    started = time.perf_counter()
+    user = user_cache.get(user_id)
+    if user is not None and token_version(user) != version:
+        # Снимок мог устареть: пароль или username сменили в другом воркере
+        user_cache.invalidate(user_id)
+        user = None
     if user is None:
+        user = await db.get(User, user_id)
+        if user is not None:
+            user_cache.set(user)
+    user_cache.record_lookup(time.perf_counter() - started)
+
+    if user is None or token_version(user) != version:
         raise credentials_exception
     return user
 
@@ -139,3 +278,12 @@ async def get_current_active_user(
     if not current_user.is_active:
         raise HTTPException(status_code=400, detail="Неактивный пользователь")
     return current_user
+
+
+async def get_current_superuser(
+    current_user: User = Depends(get_current_active_user)
+) -> User:
+    """Служебные эндпоинты (статистика кэша и ограничения входа) - только суперпользователю"""
+    if not current_user.is_superuser:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Недостаточно прав")
+    return current_user
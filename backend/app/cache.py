@@ -0,0 +1,301 @@
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, NamedTuple, Optional
+from dotenv import load_dotenv
+from app.conditional import Validators
+from app.database import reads_from_primary_only, reads_from_replica
+
+load_dotenv()
+
+# memory:// - LRU в процессе, redis://host:port/db - общий кэш для нескольких воркеров,
+# пустая строка - кэш выключен
+CACHE_URL = os.getenv("CACHE_URL", "memory://")
+CACHE_TTL_SECONDS = int(os.getenv("CACHE_TTL_SECONDS", "60"))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# Ответ, собранный по реплике, может отставать от записи, сбросившей поколение
+CACHE_REPLICA_TTL_SECONDS = int(os.getenv("CACHE_REPLICA_TTL_SECONDS", "5"))
+
+
+def generation_ttl(ttl: int) -> Optional[int]:
+    """Срок поколения после последнего сброса: дольше любого ответа, собранного по нему"""
+    return 2 * ttl if ttl else None
+
+
+class CacheStats:
+    """Счетчики кэша"""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
+
+
+class LRUCache:
+    """LRU в памяти процесса с TTL и ограничением по числу записей и объему.
+
+    Размер записи задает вызывающий код (для bytes - длина), так что
+    max_bytes ограничивает суммарный объем закэшированных данных.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: Optional[int] = None, ttl: Optional[float] = None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.stats = CacheStats()
+        self._entries: "OrderedDict[Any, tuple]" = OrderedDict()
+        self._bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def size_bytes(self) -> int:
+        return self._bytes
+
+    def get(self, key, default=None):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.stats.misses += 1
+            return default
+        value, size, expires_at = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            self._remove(key)
+            self.stats.expirations += 1
+            self.stats.misses += 1
+            return default
+        self._entries.move_to_end(key)
+        self.stats.hits += 1
+        return value
+
+    def set(self, key, value, size: int = 1, ttl: Optional[float] = None):
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl else None
+        self._entries[key] = (value, size, expires_at)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or (
+            self.max_bytes is not None and self._bytes > self.max_bytes
+        ):
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.stats.evictions += 1
+
+    def delete(self, key):
+        if key in self._entries:
+            self._remove(key)
+            self.stats.invalidations += 1
+
+    def clear(self):
+        self._entries.clear()
+        self._bytes = 0
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+
+class MemoryBackend:
+    """Кэш ответов в памяти процесса"""
+
+    name = "memory"
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl: int):
+        self.lru = LRUCache(max_entries, max_bytes, ttl)
+        # Поколение хранится только после сброса и истекает, когда ответов по
+        # прежним поколениям уже нет; отсутствующее поколение - _base_generation
+        self._generations = LRUCache(max_entries, ttl=generation_ttl(ttl))
+        self._base_generation = 0
+
+    @property
+    def stats(self) -> CacheStats:
+        return self.lru.stats
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return self.lru.get(key)
+
+    async def set(self, key: str, value: bytes, ttl: Optional[int] = None):
+        self.lru.set(key, value, size=len(value) + len(key), ttl=ttl)
+
+    async def generation(self, key: str) -> int:
+        return self._generations.get(key, self._base_generation)
+
+    async def bump(self, key: str):
+        current = self._generations.get(key)
+        evictions = self._generations.stats.evictions
+        self._generations.set(key, (time.time_ns() if current is None else current) + 1)
+        if self._generations.stats.evictions != evictions:
+            # Вытесненное до срока поколение читалось бы как базовое и «оживило»
+            # бы старые ответы: новое базовое поколение для всех ключей без записи
+            self._base_generation = time.time_ns()
+        self.stats.invalidations += 1
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "backend": self.name,
+            "entries": len(self.lru),
+            "bytes": self.lru.size_bytes,
+            "max_bytes": self.lru.max_bytes,
+            "generations": len(self._generations),
+            **self.stats.as_dict(),
+        }
+
+
+class RedisBackend:
+    """Общий кэш для нескольких воркеров (Redis или любой совместимый сервер)"""
+
+    name = "redis"
+
+    def __init__(
+        self,
+        url: Optional[str] = None,
+        client=None,
+        prefix: str = "dalee:cache:",
+        ttl: int = CACHE_TTL_SECONDS
+    ):
+        if client is None:
+            import redis.asyncio as redis
+
+            client = redis.from_url(url)
+        self.client = client
+        self.prefix = prefix
+        self.generation_ttl = generation_ttl(ttl)
+        self.stats = CacheStats()
+
+    async def get(self, key: str) -> Optional[bytes]:
+        value = await self.client.get(self.prefix + key)
+        if value is None:
+            self.stats.misses += 1
+        else:
+            self.stats.hits += 1
+        return value
+
+    async def set(self, key: str, value: bytes, ttl: Optional[int] = None):
+        await self.client.set(self.prefix + key, value, ex=ttl or None)
+
+    async def generation(self, key: str) -> int:
+        # Ключ создает только bump: чтение по несуществующему id ничего не хранит
+        value = await self.client.get(self.prefix + "gen:" + key)
+        return int(value) if value is not None else 0
+
+    async def bump(self, key: str):
+        full_key = self.prefix + "gen:" + key
+        pipe = self.client.pipeline()
+        # Начальное значение от времени: после истечения ключа прежние поколения не повторятся
+        pipe.set(full_key, time.time_ns(), nx=True)
+        pipe.incr(full_key)
+        if self.generation_ttl:
+            pipe.expire(full_key, self.generation_ttl)
+        await pipe.execute()
+        self.stats.invalidations += 1
+
+    def describe(self) -> Dict[str, Any]:
+        return {"backend": self.name, **self.stats.as_dict()}
+
+
+class CachedResponse(NamedTuple):
+    """Сериализованный ответ вместе с его валидаторами"""
+    body: bytes
+    validators: Validators
+
+    def pack(self) -> bytes:
+        last_modified = "" if self.validators.last_modified is None else str(self.validators.last_modified)
+        return f"{self.validators.etag}\n{last_modified}\n".encode("ascii") + self.body
+
+    @classmethod
+    def unpack(cls, raw: bytes) -> "CachedResponse":
+        etag, last_modified, body = raw.split(b"\n", 2)
+        return cls(body, Validators(etag.decode("ascii"), int(last_modified) if last_modified else None))
+
+
+class ResponseCache:
+    """Read-through кэш сериализованных публичных ответов.
+
+    Ключи включают «поколение» пользователя или каталога; запись
+    пользователя увеличивает поколение, и старые ответы просто перестают
+    находиться, а затем вытесняются по TTL/LRU.
+    """
+
+    def __init__(self, backend, ttl: int):
+        self.backend = backend
+        self.ttl = ttl
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend is not None
+
+    async def get(self, key: str) -> Optional[CachedResponse]:
+        if self.backend is None or reads_from_primary_only():
+            # Клиент только что писал: ответ строится заново с основной БД и обновляет кэш
+            return None
+        raw = await self.backend.get(key)
+        return CachedResponse.unpack(raw) if raw is not None else None
+
+    async def set(self, key: str, body: bytes, validators: Validators):
+        if self.backend is not None:
+            ttl = min(self.ttl, CACHE_REPLICA_TTL_SECONDS) if reads_from_replica() else self.ttl
+            await self.backend.set(key, CachedResponse(body, validators).pack(), ttl)
+
+    async def user_generation(self, user_id: int) -> int:
+        if self.backend is None:
+            return 0
+        return await self.backend.generation(f"user:{user_id}")
+
+    async def directory_generation(self) -> int:
+        if self.backend is None:
+            return 0
+        return await self.backend.generation("directory")
+
+    async def portfolio_owner(self, item_id: int) -> Optional[int]:
+        """Владелец проекта, если уже известен кэшу (владелец проекта не меняется)"""
+        if self.backend is None:
+            return None
+        value = await self.backend.get(f"portfolio:owner:{item_id}")
+        return int(value) if value is not None else None
+
+    async def remember_portfolio_owner(self, item_id: int, owner_id: int):
+        if self.backend is not None:
+            await self.backend.set(f"portfolio:owner:{item_id}", str(owner_id).encode("ascii"), self.ttl)
+
+    async def invalidate_user(self, user_id: int):
+        """Сбросить кэш профиля пользователя, его проектов и каталога"""
+        if self.backend is None:
+            return
+        await self.backend.bump(f"user:{user_id}")
+        await self.backend.bump("directory")
+
+    def stats(self) -> Dict[str, Any]:
+        if self.backend is None:
+            return {"backend": None}
+        return self.backend.describe()
+
+
+def create_backend(url: str):
+    """Выбрать бэкенд кэша по CACHE_URL"""
+    if not url:
+        return None
+    if url.startswith("memory://"):
+        return MemoryBackend(CACHE_MAX_ENTRIES, CACHE_MAX_BYTES, CACHE_TTL_SECONDS)
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisBackend(url, ttl=CACHE_TTL_SECONDS)
+    raise ValueError(f"Неизвестный бэкенд кэша: {url}")
+
+
+response_cache = ResponseCache(create_backend(CACHE_URL), CACHE_TTL_SECONDS)
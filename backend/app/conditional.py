@@ -0,0 +1,66 @@
+import hashlib
+from datetime import datetime, timezone
+from email.utils import formatdate, parsedate_to_datetime
+from typing import NamedTuple, Optional
+from fastapi import Request
+from fastapi.responses import Response
+
+
+class Validators(NamedTuple):
+    """Валидаторы ответа: сильный ETag и Last-Modified (unix-время, секунды)"""
+    etag: str
+    last_modified: Optional[int] = None
+
+    def headers(self) -> dict:
+        headers = {"ETag": self.etag}
+        if self.last_modified is not None:
+            headers["Last-Modified"] = formatdate(self.last_modified, usegmt=True)
+        return headers
+
+
+def _timestamp(value: Optional[datetime]) -> Optional[int]:
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        # SQLite возвращает время без зоны, в БД оно хранится в UTC
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp())
+
+
+def make_validators(*parts, updated_at=()) -> Validators:
+    """ETag по ключевым значениям выборки, Last-Modified - максимальный updated_at"""
+    stamps = [stamp for stamp in (_timestamp(value) for value in updated_at) if stamp is not None]
+    raw = "|".join(str(part) for part in (*parts, *updated_at))
+    etag = '"' + hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32] + '"'
+    return Validators(etag, max(stamps) if stamps else None)
+
+
+def is_not_modified(request: Request, validators: Validators) -> bool:
+    """Проверить If-None-Match / If-Modified-Since"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # If-None-Match важнее If-Modified-Since; для GET допустимо слабое сравнение
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or validators.etag in tags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and validators.last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        return validators.last_modified <= since.timestamp()
+    return False
+
+
+def not_modified_response(validators: Validators) -> Response:
+    return Response(status_code=304, headers=validators.headers())
+
+
+def conditional_json_response(request: Request, body: bytes, validators: Validators) -> Response:
+    """JSON-ответ с валидаторами или 304, если у клиента актуальная версия"""
+    if is_not_modified(request, validators):
+        return not_modified_response(validators)
+    return Response(content=body, media_type="application/json", headers=validators.headers())
@@ -1,8 +1,17 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from starlette.concurrency import run_in_threadpool
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import List, Optional
+import itertools
 import os
+import time
 from dotenv import load_dotenv
+from app.metrics import instrument_pool, pool_class
+from app.query_stats import instrument_engine
 
 load_dotenv()
 
@@ -17,21 +26,313 @@ DATABASE_URL = os.getenv(
     f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 )
 
+# Асинхронный режим (asyncpg) включается явно, синхронный движок остается для alembic
+DATABASE_ASYNC = os.getenv("DATABASE_ASYNC", "false").lower() in ("1", "true", "yes")
+
+
+def to_async_url(url: str) -> str:
+    """Подставить асинхронный драйвер в URL базы данных"""
+    scheme, sep, rest = url.partition("://")
+    driver = {
+        "postgresql": "postgresql+asyncpg",
+        "postgresql+psycopg2": "postgresql+asyncpg",
+        "postgres": "postgresql+asyncpg",
+        "sqlite": "sqlite+aiosqlite",
+    }.get(scheme, scheme)
+    return f"{driver}{sep}{rest}"
+
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", to_async_url(DATABASE_URL))
+
+# Реплики только для чтения (через запятую); анонимные GET идут на них по кругу
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+# Сколько секунд после записи клиент читает с основной БД (больше задержки репликации)
+DB_REPLICA_STICKY_SECONDS = int(os.getenv("DB_REPLICA_STICKY_SECONDS", "10"))
+# Через сколько секунд снова пробовать недоступную реплику
+DB_REPLICA_RETRY_SECONDS = float(os.getenv("DB_REPLICA_RETRY_SECONDS", "30"))
+
+# Соединения с БД делятся между воркерами: DB_CONNECTION_BUDGET - сколько всего
+# соединений может открыть приложение (меньше max_connections PostgreSQL с запасом
+# на миграции и администрирование), WEB_CONCURRENCY - число воркеров uvicorn
+WEB_CONCURRENCY = max(int(os.getenv("WEB_CONCURRENCY", "1")), 1)
+DB_CONNECTION_BUDGET = int(os.getenv("DB_CONNECTION_BUDGET", "30"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+
+
+def pool_settings(budget: int = DB_CONNECTION_BUDGET, workers: int = WEB_CONCURRENCY) -> dict:
+    """pool_size и max_overflow воркера: треть доли - запас на пики.
+
+    DB_POOL_SIZE / DB_MAX_OVERFLOW задают значения явно.
+    """
+    per_worker = max(budget // workers, 1)
+    overflow = per_worker // 3
+    return {
+        "pool_size": int(os.getenv("DB_POOL_SIZE", str(max(per_worker - overflow, 1)))),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", str(overflow))),
+        "pool_timeout": DB_POOL_TIMEOUT,
+    }
+
+
+POOL_SETTINGS = pool_settings()
+
 engine = create_engine(
     DATABASE_URL,
     pool_pre_ping=True,
-    pool_size=10,
-    max_overflow=20
+    poolclass=pool_class(),
+    **POOL_SETTINGS
 )
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+def enable_sqlite_foreign_keys(sync_engine):
+    """SQLite по умолчанию не проверяет внешние ключи и не выполняет ON DELETE CASCADE"""
+    if sync_engine.dialect.name != "sqlite":
+        return
+
+    @event.listens_for(sync_engine, "connect")
+    def _set_pragma(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
+
+
+enable_sqlite_foreign_keys(engine)
+instrument_engine(engine)
+instrument_pool(engine, "sync")
+
+class PrimarySession(Session):
+    """Сессия основной БД: после ее commit клиент временно читает только с основной БД"""
+
+
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine, class_=PrimarySession)
+
+async_engine = None
+AsyncSessionLocal = None
+if DATABASE_ASYNC:
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    async_engine = create_async_engine(
+        ASYNC_DATABASE_URL,
+        pool_pre_ping=True,
+        # Явно: для aiosqlite по умолчанию NullPool, а настройки пула общие
+        poolclass=pool_class(async_engine=True),
+        **POOL_SETTINGS
+    )
+    enable_sqlite_foreign_keys(async_engine.sync_engine)
+    instrument_engine(async_engine.sync_engine)
+    instrument_pool(async_engine.sync_engine, "async")
+    AsyncSessionLocal = async_sessionmaker(
+        async_engine, autoflush=False, expire_on_commit=False, sync_session_class=PrimarySession
+    )
+
+
+
+class Replica:
+    """Реплика: движок, фабрика сессий и время, до которого она считается недоступной"""
+
+    def __init__(self, url: str, index: int):
+        self.url = url
+        self.down_until = 0.0
+        if DATABASE_ASYNC:
+            self.engine = create_async_engine(
+                to_async_url(url),
+                pool_pre_ping=True,
+                poolclass=pool_class(async_engine=True),
+                **POOL_SETTINGS
+            )
+            sync_engine = self.engine.sync_engine
+            self.session_factory = async_sessionmaker(self.engine, autoflush=False, expire_on_commit=False)
+        else:
+            self.engine = sync_engine = create_engine(
+                url,
+                pool_pre_ping=True,
+                poolclass=pool_class(),
+                **POOL_SETTINGS
+            )
+            self.session_factory = sessionmaker(autocommit=False, autoflush=False, bind=sync_engine)
+        enable_sqlite_foreign_keys(sync_engine)
+        instrument_engine(sync_engine)
+        instrument_pool(sync_engine, f"replica{index}")
+
+    @property
+    def available(self) -> bool:
+        return time.monotonic() >= self.down_until
+
+    def mark_down(self):
+        self.down_until = time.monotonic() + DB_REPLICA_RETRY_SECONDS
+
+
+replicas: List[Replica] = [Replica(url, index) for index, url in enumerate(DATABASE_REPLICA_URLS)]
+_replica_order = itertools.cycle(range(len(replicas))) if replicas else None
 
 Base = declarative_base()
 
 
-def get_db():
-    db = SessionLocal()
+class ThreadedSession:
+    """Синхронная сессия с интерфейсом AsyncSession.
+
+    Роутеры написаны под AsyncSession; в синхронном режиме каждый запрос
+    к psycopg2 уходит в пул потоков, чтобы не блокировать event loop.
+    """
+
+    def __init__(self, session: Session):
+        self.sync_session = session
+
+    def add(self, instance):
+        self.sync_session.add(instance)
+
+    def add_all(self, instances):
+        self.sync_session.add_all(instances)
+
+    def expunge(self, instance):
+        self.sync_session.expunge(instance)
+
+    async def _run_statement(self, method, statement, params, execution_options):
+        # Как и AsyncSession, выбираем все строки (и selectinload) в потоке
+        options = {"prebuffer_rows": True, **(execution_options or {})}
+        return await run_in_threadpool(
+            method, statement, params, execution_options=options
+        )
+
+    async def execute(self, statement, params=None, execution_options=None):
+        return await self._run_statement(
+            self.sync_session.execute, statement, params, execution_options
+        )
+
+    async def scalar(self, statement, params=None, execution_options=None):
+        return await self._run_statement(
+            self.sync_session.scalar, statement, params, execution_options
+        )
+
+    async def scalars(self, statement, params=None, execution_options=None):
+        return await self._run_statement(
+            self.sync_session.scalars, statement, params, execution_options
+        )
+
+    async def get(self, entity, ident, **kwargs):
+        return await run_in_threadpool(self.sync_session.get, entity, ident, **kwargs)
+
+    async def merge(self, instance, **kwargs):
+        return await run_in_threadpool(self.sync_session.merge, instance, **kwargs)
+
+    async def refresh(self, instance, attribute_names=None):
+        return await run_in_threadpool(self.sync_session.refresh, instance, attribute_names)
+
+    async def delete(self, instance):
+        return await run_in_threadpool(self.sync_session.delete, instance)
+
+    async def flush(self, objects=None):
+        return await run_in_threadpool(self.sync_session.flush, objects)
+
+    async def commit(self):
+        return await run_in_threadpool(self.sync_session.commit)
+
+    async def rollback(self):
+        return await run_in_threadpool(self.sync_session.rollback)
+
+    async def close(self):
+        return await run_in_threadpool(self.sync_session.close)
+
+    async def connection(self):
+        return await run_in_threadpool(self.sync_session.connection)
+
+
+async def dispose_engines():
+    """Закрыть соединения пулов при остановке воркера"""
+    if async_engine is not None:
+        await async_engine.dispose()
+    await run_in_threadpool(engine.dispose)
+    for replica in replicas:
+        if DATABASE_ASYNC:
+            await replica.engine.dispose()
+        else:
+            await run_in_threadpool(replica.engine.dispose)
+
+
+class ReadRouting:
+    """Маршрутизация чтения в рамках HTTP-запроса (см. ReplicaRoutingMiddleware).
+
+    pinned - клиент недавно писал (cookie), читает с основной БД;
+    wrote - запрос сделал commit в основной БД; replica - чтение идет с реплики.
+    """
+    __slots__ = ("pinned", "wrote", "replica")
+
+    def __init__(self, pinned: bool = False):
+        self.pinned = pinned
+        self.wrote = False
+        self.replica = False
+
+
+read_routing: ContextVar[Optional[ReadRouting]] = ContextVar("read_routing", default=None)
+
+
+@event.listens_for(PrimarySession, "after_commit")
+def _remember_write(session):
+    # Объект общий для копий контекста, поэтому флаг виден и из пула потоков
+    routing = read_routing.get()
+    if routing is not None:
+        routing.wrote = True
+
+
+def reads_from_primary_only() -> bool:
+    """Клиент недавно писал: кэш ответов и реплики для него пропускаются"""
+    routing = read_routing.get()
+    return routing is not None and (routing.pinned or routing.wrote)
+
+
+def reads_from_replica() -> bool:
+    routing = read_routing.get()
+    return routing is not None and routing.replica
+
+
+@asynccontextmanager
+async def primary_session():
+    if DATABASE_ASYNC:
+        async with AsyncSessionLocal() as db:
+            yield db
+        return
+
+    db = ThreadedSession(SessionLocal(expire_on_commit=False))
     try:
         yield db
     finally:
-        db.close()
+        await db.close()
+
+
+async def get_db():
+    async with primary_session() as db:
+        yield db
+
+
+async def _open_replica_session(replica: Replica):
+    """Сессия реплики с уже полученным соединением; None - реплика недоступна"""
+    db = replica.session_factory() if DATABASE_ASYNC else ThreadedSession(replica.session_factory(expire_on_commit=False))
+    try:
+        # pool_pre_ping: недоступная реплика падает здесь, до запросов эндпоинта
+        await db.connection()
+    except (DBAPIError, OSError):
+        await db.close()
+        replica.mark_down()
+        return None
+    return db
+
+
+async def get_read_db():
+    """Сессия для эндпоинтов только на чтение: реплика по кругу, иначе основная БД"""
+    routing = read_routing.get()
+    if replicas and not reads_from_primary_only():
+        for _ in range(len(replicas)):
+            replica = replicas[next(_replica_order)]
+            if not replica.available:
+                continue
+            db = await _open_replica_session(replica)
+            if db is None:
+                continue
+            if routing is not None:
+                routing.replica = True
+            try:
+                yield db
+            finally:
+                await db.close()
+            return
+
+    async with primary_session() as db:
+        yield db
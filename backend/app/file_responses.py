@@ -0,0 +1,166 @@
+import os
+import re
+import stat
+from mimetypes import guess_type
+from pathlib import Path
+from typing import Optional, Tuple
+import anyio
+from fastapi import Request
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+from dotenv import load_dotenv
+from app.conditional import Validators, is_not_modified
+
+load_dotenv()
+
+# Файлы с неизменяемыми именами кэшируются навсегда
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+SHORT_CACHE_CONTROL = "public, max-age=60"
+
+# Если задан (например, /internal-uploads/), байты отдает nginx:
+#   location /internal-uploads/ { internal; alias /path/to/backend/uploads/; }
+ACCEL_REDIRECT_PREFIX = os.getenv("IMAGE_ACCEL_REDIRECT_PREFIX", "")
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class FileRangeResponse(Response):
+    """Отдача файла или его диапазона.
+
+    Если сервер поддерживает ASGI-расширения http.response.pathsend или
+    http.response.zerocopy, файл уходит через sendfile без копирования в
+    Python; иначе читается блоками в пуле потоков.
+    """
+
+    chunk_size = 256 * 1024
+
+    def __init__(self, path: Path, offset: int, count: int, size: int,
+                 status_code: int, headers: dict, media_type: str):
+        self.path = path
+        self.offset = offset
+        self.count = count
+        self.size = size
+        self.status_code = status_code
+        self.media_type = media_type
+        self.background = None
+        self.init_headers({**headers, "content-length": str(count)})
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({
+            "type": "http.response.start",
+            "status": self.status_code,
+            "headers": self.raw_headers,
+        })
+        if self.count == 0:
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        extensions = scope.get("extensions") or {}
+        if "http.response.pathsend" in extensions and self.offset == 0 and self.count == self.size:
+            await send({"type": "http.response.pathsend", "path": str(self.path)})
+            return
+        if "http.response.zerocopy" in extensions:
+            # open/close - в пуле потоков, как и остальной доступ к файлам
+            file = await anyio.to_thread.run_sync(open, self.path, "rb")
+            try:
+                await send({
+                    "type": "http.response.zerocopy",
+                    "file": file,
+                    "offset": self.offset,
+                    "count": self.count,
+                })
+            finally:
+                await anyio.to_thread.run_sync(file.close)
+            return
+
+        async with await anyio.open_file(self.path, "rb") as file:
+            await file.seek(self.offset)
+            remaining = self.count
+            while remaining > 0:
+                chunk = await file.read(min(self.chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+            if remaining > 0:
+                # Файл оказался короче, чем при stat - закрываем ответ
+                await send({"type": "http.response.body", "body": b""})
+
+
+async def stat_file(path: Path) -> Optional[os.stat_result]:
+    """stat в пуле потоков; None, если файла нет"""
+    try:
+        result = await anyio.to_thread.run_sync(os.stat, path)
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+    return result if stat.S_ISREG(result.st_mode) else None
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """Один диапазон bytes=a-b; None - заголовок игнорируем, (-1, -1) - диапазон вне файла"""
+    match = RANGE_RE.match(header.strip())
+    if not match or not any(match.groups()):
+        return None
+    if size == 0:
+        return -1, -1
+    start, end = match.groups()
+    if not start:
+        suffix = int(end)
+        if suffix == 0:
+            return -1, -1
+        return max(size - suffix, 0), size - 1
+    start = int(start)
+    if end and int(end) < start:
+        return None
+    if start >= size:
+        return -1, -1
+    end = int(end) if end else size - 1
+    return start, min(end, size - 1)
+
+
+async def file_response(
+    request: Request,
+    path: Path,
+    stat_result: os.stat_result,
+    cache_control: str,
+    accel_path: str,
+    media_type: Optional[str] = None
+) -> Response:
+    """Ответ с файлом: ETag/304, Range и Cache-Control.
+
+    accel_path - путь файла относительно каталога uploads, используется
+    в режиме X-Accel-Redirect.
+    """
+    size = stat_result.st_size
+    media_type = media_type or guess_type(path.name)[0] or "application/octet-stream"
+    validators = Validators(f'"{path.stem}-{size:x}"', int(stat_result.st_mtime))
+    headers = {
+        **validators.headers(),
+        "cache-control": cache_control,
+        "accept-ranges": "bytes",
+    }
+
+    if is_not_modified(request, validators):
+        return Response(status_code=304, headers=headers)
+
+    if ACCEL_REDIRECT_PREFIX:
+        # Range и sendfile обработает nginx
+        return Response(
+            media_type=media_type,
+            headers={**headers, "x-accel-redirect": ACCEL_REDIRECT_PREFIX + accel_path},
+        )
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (if_range is None or if_range.strip() in (validators.etag, headers["Last-Modified"])):
+        byte_range = parse_range(range_header, size)
+        if byte_range == (-1, -1):
+            return Response(status_code=416, headers={**headers, "content-range": f"bytes */{size}"})
+        if byte_range is not None:
+            start, end = byte_range
+            return FileRangeResponse(
+                path, start, end - start + 1, size, 206,
+                {**headers, "content-range": f"bytes {start}-{end}/{size}"}, media_type
+            )
+
+    return FileRangeResponse(path, 0, size, size, 200, headers, media_type)
@@ -0,0 +1,140 @@
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from typing import Optional
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+from dotenv import load_dotenv
+from app.metrics import PASSWORD_HASH_DURATION
+
+load_dotenv()
+
+# Размер пула процессов для argon2 (0 - хешировать в потоках текущего процесса);
+# по умолчанию ядра делятся между воркерами uvicorn (WEB_CONCURRENCY)
+_WEB_CONCURRENCY = max(int(os.getenv("WEB_CONCURRENCY", "1")), 1)
+PASSWORD_HASH_WORKERS = int(
+    os.getenv("PASSWORD_HASH_WORKERS", str(max((os.cpu_count() or 1) // _WEB_CONCURRENCY, 1)))
+)
+# Сколько операций может ждать в очереди, прежде чем мы начнем отказывать
+PASSWORD_HASH_MAX_PENDING = int(
+    os.getenv("PASSWORD_HASH_MAX_PENDING", str(max(PASSWORD_HASH_WORKERS, 1) * 8))
+)
+
+# Параметры argon2 подбирает scripts.calibrate_argon2 под железо и целевую задержку;
+# не заданы - значения passlib по умолчанию. Хеши с другими параметрами и bcrypt
+# перехешируются при следующем успешном входе (needs_update)
+ARGON2_SETTINGS = {
+    f"argon2__{name}": int(os.environ[variable])
+    for name, variable in (
+        ("time_cost", "ARGON2_TIME_COST"),
+        ("memory_cost", "ARGON2_MEMORY_COST"),
+        ("parallelism", "ARGON2_PARALLELISM"),
+    )
+    if os.getenv(variable)
+}
+
+# Password hashing
+pwd_context = CryptContext(
+    schemes=["argon2", "bcrypt"],
+    default="argon2",  # Argon2
+    deprecated="auto",
+    **ARGON2_SETTINGS
+)
+
+
+def _hash_password(password: str) -> str:
+    """Хеширование пароля (выполняется в рабочем процессе)"""
+    return pwd_context.hash(password)
+
+
+def needs_rehash(hashed_password: str) -> bool:
+    """Хеш устаревшей схемы (bcrypt) или с параметрами argon2, отличными от текущих"""
+    try:
+        return pwd_context.needs_update(hashed_password)
+    except ValueError:
+        # Нераспознанный хеш: проверка пароля его все равно не пропустит
+        return False
+
+
+def _verify_password(plain_password: str, hashed_password: str) -> bool:
+    """Проверка пароля (выполняется в рабочем процессе)"""
+    try:
+        # Argon2 и bcrypt
+        return pwd_context.verify(plain_password, hashed_password)
+    except ValueError as e:
+        if "password cannot be longer than 72 bytes" in str(e):
+            return False
+        raise
+
+
+class PasswordHasher:
+    """Пул процессов для argon2 с ограничением глубины очереди.
+
+    Argon2 держит CPU десятки миллисекунд, поэтому хеширование вынесено
+    из event loop. Если в очереди уже max_pending операций, новая сразу
+    получает 503, а не копится в памяти.
+    """
+
+    def __init__(self, workers: int, max_pending: int):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pending = 0
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def _get_executor(self) -> Optional[ProcessPoolExecutor]:
+        if self.workers <= 0:
+            # Пул потоков event loop по умолчанию
+            return None
+        if self._executor is None:
+            # spawn: рабочим процессам не нужно наследовать соединения с БД
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    async def _run(self, operation: str, func, *args):
+        if self._pending >= self.max_pending:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Сервис авторизации перегружен, повторите попытку позже",
+                headers={"Retry-After": "1"},
+            )
+        self._pending += 1
+        started = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(self._get_executor(), partial(func, *args))
+            PASSWORD_HASH_DURATION.labels(operation).observe(time.perf_counter() - started)
+            return result
+        except BrokenProcessPool:
+            # Рабочий процесс упал - пересоздадим пул при следующем вызове
+            self._executor = None
+            raise
+        finally:
+            self._pending -= 1
+
+    async def hash(self, password: str) -> str:
+        """Хеширование пароля"""
+        return await self._run("hash", _hash_password, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        """Проверка пароля"""
+        return await self._run("verify", _verify_password, plain_password, hashed_password)
+
+    def shutdown(self):
+        """Остановить рабочие процессы"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+password_hasher = PasswordHasher(PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_PENDING)
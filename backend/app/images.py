@@ -0,0 +1,129 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import List, Optional, Set
+from dotenv import load_dotenv
+from app.storage import (
+    DERIVATIVE_DIR,
+    IMAGE_URL_PREFIX,
+    IMAGE_VARIANT_WIDTHS,
+    derivative_name,
+    has_derivatives,
+    shard_prefix
+)
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow не установлен - отдаем только оригиналы
+    Image = None
+    ImageOps = None
+
+load_dotenv()
+
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "2"))
+IMAGE_MAX_PENDING = int(os.getenv("IMAGE_MAX_PENDING", "256"))
+WEBP_QUALITY = int(os.getenv("WEBP_QUALITY", "80"))
+
+
+def render_derivatives(source: str, widths: List[int], out_dir: str) -> List[int]:
+    """Сделать WebP-копии заданных ширин (выполняется в рабочем процессе).
+
+    Ориентация из EXIF применяется к пикселям, сами метаданные (EXIF,
+    в том числе GPS) в копии не попадают.
+    """
+    done = []
+    Path(out_dir).mkdir(parents=True, exist_ok=True)
+    with Image.open(source) as original:
+        if getattr(original, "is_animated", False):
+            # Анимацию не пережимаем - клиент получит оригинал
+            return done
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ("RGB", "RGBA"):
+            has_alpha = "A" in image.getbands() or "transparency" in image.info
+            image = image.convert("RGBA" if has_alpha else "RGB")
+
+        for width in widths:
+            target_width = min(width, image.width)
+            target_height = max(1, round(image.height * target_width / image.width))
+            resized = image
+            if target_width != image.width:
+                resized = image.resize((target_width, target_height), Image.Resampling.LANCZOS)
+            path = Path(out_dir) / derivative_name(source, width)
+            tmp_path = path.with_name(f".{path.name}.tmp")
+            resized.save(tmp_path, "WEBP", quality=WEBP_QUALITY, method=4)
+            os.replace(tmp_path, path)
+            done.append(width)
+    return done
+
+
+class DerivativeQueue:
+    """Фоновая генерация превью в пуле процессов.
+
+    Очередь ограничена: при переполнении задача просто не ставится, а
+    превью будет заказано повторно при следующем запросе с ?w=.
+    """
+
+    def __init__(self, workers: int, max_pending: int, widths: List[int]):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.widths = widths
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._in_flight: Set[str] = set()
+
+    @property
+    def enabled(self) -> bool:
+        return Image is not None and self.workers > 0 and bool(self.widths)
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    def schedule(self, filename: str, source: Path):
+        """Поставить изображение в очередь на генерацию превью (source - где лежит оригинал)"""
+        if not self.enabled or filename in self._in_flight or len(self._in_flight) >= self.max_pending:
+            return
+        if not has_derivatives(filename):
+            return
+        self._in_flight.add(filename)
+        future = asyncio.get_running_loop().run_in_executor(
+            self._get_executor(),
+            render_derivatives,
+            str(source),
+            self.widths,
+            str(DERIVATIVE_DIR / shard_prefix(filename))
+        )
+        future.add_done_callback(lambda done: self._finished(filename, done))
+
+    def _finished(self, filename: str, future: asyncio.Future):
+        self._in_flight.discard(filename)
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is not None:
+            print(f"Ошибка при создании превью {filename}: {error}")
+            if isinstance(error, BrokenProcessPool):
+                self._executor = None
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+derivative_queue = DerivativeQueue(IMAGE_WORKERS, IMAGE_MAX_PENDING, IMAGE_VARIANT_WIDTHS)
+
+
+def variant_urls(image_url: str) -> List[dict]:
+    """URL уменьшенных копий - только если копии для изображения действительно делаются"""
+    if not image_url or not image_url.startswith(IMAGE_URL_PREFIX) or not derivative_queue.enabled:
+        return []
+    if not has_derivatives(image_url[len(IMAGE_URL_PREFIX):]):
+        return []
+    return [{"width": width, "url": f"{image_url}?w={width}"} for width in IMAGE_VARIANT_WIDTHS]
@@ -0,0 +1,245 @@
+"""Ограничение попыток входа до проверки пароля (LOGIN_THROTTLE_URL: memory:// или redis://)"""
+import hashlib
+import math
+import os
+import time
+from typing import Any, Dict, Optional
+from dotenv import load_dotenv
+from fastapi import HTTPException, Request, status
+from app.cache import LRUCache
+from app.metrics import LOGIN_ATTEMPTS
+
+load_dotenv()
+
+LOGIN_THROTTLE_URL = os.getenv("LOGIN_THROTTLE_URL", "memory://")
+LOGIN_THROTTLE_WINDOW_SECONDS = int(os.getenv("LOGIN_THROTTLE_WINDOW_SECONDS", "300"))
+# Попыток за окно до первой блокировки: на идентификатор и на IP (NAT, офисы - лимит выше)
+LOGIN_THROTTLE_IDENTIFIER_LIMIT = int(os.getenv("LOGIN_THROTTLE_IDENTIFIER_LIMIT", "5"))
+LOGIN_THROTTLE_IP_LIMIT = int(os.getenv("LOGIN_THROTTLE_IP_LIMIT", "50"))
+LOGIN_THROTTLE_BASE_DELAY = float(os.getenv("LOGIN_THROTTLE_BASE_DELAY", "1"))
+LOGIN_THROTTLE_MAX_DELAY = float(os.getenv("LOGIN_THROTTLE_MAX_DELAY", "900"))
+LOGIN_THROTTLE_MAX_KEYS = int(os.getenv("LOGIN_THROTTLE_MAX_KEYS", "100000"))
+
+# Длинные идентификаторы хранятся как хеш, чтобы ключ не рос вместе с вводом
+_MAX_KEY_LENGTH = 64
+
+
+def backoff(estimate: float, limit: int, base: float, maximum: float) -> float:
+    """Блокировка после estimate попыток: base, 2*base, 4*base... не больше maximum"""
+    excess = min(int(estimate) - limit, 32)
+    return min(base * 2 ** excess, maximum)
+
+
+def sliding_estimate(previous: int, current: int, now: float, window: int) -> float:
+    """Оценка числа попыток за последние window секунд по двум фиксированным окнам"""
+    elapsed = (now % window) / window
+    return previous * (1 - elapsed) + current
+
+
+class ThrottleStats:
+    """Счетчики попыток входа"""
+
+    def __init__(self):
+        self.throttled = 0
+        self.hashed = 0
+        self.rejected = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"throttled": self.throttled, "hashed": self.hashed, "rejected": self.rejected}
+
+
+class MemoryThrottleBackend:
+    """Счетчики в памяти процесса; запись - [номер окна, текущее, предыдущее, блок до]"""
+
+    name = "memory"
+
+    def __init__(self, max_keys: int):
+        self.lru = LRUCache(max_keys)
+
+    @staticmethod
+    def _current(entry: Optional[list], index: int) -> list:
+        """Запись, сдвинутая к окну index"""
+        if entry is None or entry[0] < index - 1:
+            return [index, 0, 0, 0.0]
+        if entry[0] == index - 1:
+            return [index, 0, entry[1], entry[3]]
+        return entry
+
+    async def attempt(self, key: str, limit: int, window: int, base: float, maximum: float) -> float:
+        """Зарезервировать попытку; вернуть блокировку в секундах (0 - попытка разрешена).
+
+        Между чтением и записью нет await: одновременные запросы процесса
+        получают разные значения счетчика.
+        """
+        now = time.time()
+        entry = self._current(self.lru.get(key), int(now // window))
+        if entry[3] > now:
+            return entry[3] - now
+        entry[1] += 1
+        estimate = sliding_estimate(entry[2], entry[1], now, window)
+        if estimate >= limit:
+            entry[3] = now + backoff(estimate, limit, base, maximum)
+        # Запись нужна, пока считается предыдущее окно или держится блокировка
+        self.lru.set(key, entry, ttl=max(2 * window, entry[3] - now))
+        return 0.0
+
+    async def release(self, key: str, window: int):
+        """Вернуть резерв попытки, если окно не сменилось"""
+        entry = self.lru.get(key)
+        if entry is not None and entry[0] == int(time.time() // window) and entry[1] > 0:
+            entry[1] -= 1
+
+    async def reset(self, key: str, window: int):
+        self.lru.delete(key)
+
+    def describe(self) -> Dict[str, Any]:
+        return {"backend": self.name, "keys": len(self.lru), "evictions": self.lru.stats.evictions}
+
+
+class RedisThrottleBackend:
+    """Общие счетчики для нескольких воркеров: INCR по окнам и ключ блокировки с PX"""
+
+    name = "redis"
+
+    def __init__(self, url: Optional[str] = None, client=None, prefix: str = "dalee:login:"):
+        if client is None:
+            import redis.asyncio as redis
+
+            client = redis.from_url(url)
+        self.client = client
+        self.prefix = prefix
+
+    async def blocked_for(self, key: str) -> float:
+        remaining = await self.client.pttl(self.prefix + "block:" + key)
+        return remaining / 1000 if remaining and remaining > 0 else 0.0
+
+    async def attempt(self, key: str, limit: int, window: int, base: float, maximum: float) -> float:
+        """Зарезервировать попытку; INCR дает каждому одновременному запросу свое значение,
+        а блокировку с SET NX ставит только один из них"""
+        blocked = await self.blocked_for(key)
+        if blocked > 0:
+            return blocked
+        now = time.time()
+        index = int(now // window)
+        counter = f"{self.prefix}count:{key}:"
+        pipe = self.client.pipeline()
+        pipe.incr(counter + str(index))
+        pipe.expire(counter + str(index), 2 * window)
+        pipe.get(counter + str(index - 1))
+        current, _, previous = await pipe.execute()
+        estimate = sliding_estimate(int(previous or 0), int(current), now, window)
+        if estimate < limit:
+            return 0.0
+        delay = backoff(estimate, limit, base, maximum)
+        if await self.client.set(self.prefix + "block:" + key, 1, px=max(int(delay * 1000), 1), nx=True):
+            return 0.0
+        # Блокировку только что поставил параллельный запрос: эта попытка не учитывается
+        await self.client.decr(counter + str(index))
+        return await self.blocked_for(key) or delay
+
+    async def release(self, key: str, window: int):
+        """Вернуть резерв попытки; счетчик нового окна не уходит в минус"""
+        counter = f"{self.prefix}count:{key}:{int(time.time() // window)}"
+        if await self.client.decr(counter) < 0:
+            await self.client.delete(counter)
+
+    async def reset(self, key: str, window: int):
+        index = int(time.time() // window)
+        counter = f"{self.prefix}count:{key}:"
+        await self.client.delete(
+            self.prefix + "block:" + key, counter + str(index), counter + str(index - 1)
+        )
+
+    def describe(self) -> Dict[str, Any]:
+        return {"backend": self.name}
+
+
+def client_ip(request: Request) -> str:
+    return request.client.host if request.client else "unknown"
+
+
+def identifier_key(identifier: str) -> str:
+    normalized = identifier.strip().lower()
+    if len(normalized) > _MAX_KEY_LENGTH:
+        normalized = hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+    return "id:" + normalized
+
+
+class LoginThrottle:
+    """Проверка перед authenticate_user и учет результата входа"""
+
+    def __init__(
+        self,
+        backend,
+        window: int = LOGIN_THROTTLE_WINDOW_SECONDS,
+        identifier_limit: int = LOGIN_THROTTLE_IDENTIFIER_LIMIT,
+        ip_limit: int = LOGIN_THROTTLE_IP_LIMIT,
+        base_delay: float = LOGIN_THROTTLE_BASE_DELAY,
+        max_delay: float = LOGIN_THROTTLE_MAX_DELAY,
+    ):
+        self.backend = backend
+        self.window = window
+        self.identifier_limit = identifier_limit
+        self.ip_limit = ip_limit
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.stats = ThrottleStats()
+
+    async def reserve(self, identifier: str, ip: str):
+        """Учесть попытку до проверки пароля; 429 с Retry-After сверх лимита или при блокировке"""
+        if self.backend is not None:
+            settings = (self.window, self.base_delay, self.max_delay)
+            ip_key = "ip:" + ip
+            retry_after = await self.backend.attempt(ip_key, self.ip_limit, *settings)
+            if retry_after <= 0:
+                retry_after = await self.backend.attempt(identifier_key(identifier), self.identifier_limit, *settings)
+                if retry_after > 0:
+                    await self.backend.release(ip_key, self.window)
+            if retry_after > 0:
+                self.stats.throttled += 1
+                LOGIN_ATTEMPTS.labels("throttled").inc()
+                raise HTTPException(
+                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                    detail="Слишком много попыток входа, повторите позже",
+                    headers={"Retry-After": str(math.ceil(retry_after))},
+                )
+
+    async def release(self, identifier: str, ip: str):
+        """Вернуть резерв попытки, которая не дошла до проверки пароля (503 пула хеширования)"""
+        if self.backend is not None:
+            await self.backend.release(identifier_key(identifier), self.window)
+            await self.backend.release("ip:" + ip, self.window)
+
+    def record_hash(self):
+        """Пароль действительно проверен (argon2/bcrypt), см. auth.verify_password"""
+        self.stats.hashed += 1
+        LOGIN_ATTEMPTS.labels("hashed").inc()
+
+    def failure(self):
+        """Неверный пароль или неизвестный пользователь: попытка уже учтена в reserve"""
+        self.stats.rejected += 1
+        LOGIN_ATTEMPTS.labels("rejected").inc()
+
+    async def success(self, identifier: str, ip: str):
+        """Успешный вход снимает счетчик идентификатора и возвращает резерв IP"""
+        if self.backend is not None:
+            await self.backend.reset(identifier_key(identifier), self.window)
+            await self.backend.release("ip:" + ip, self.window)
+
+    def describe(self) -> Dict[str, Any]:
+        backend = self.backend.describe() if self.backend is not None else {"backend": None}
+        return {**backend, **self.stats.as_dict()}
+
+
+def create_backend(url: str):
+    """Выбрать бэкенд счетчиков по LOGIN_THROTTLE_URL"""
+    if not url:
+        return None
+    if url.startswith("memory://"):
+        return MemoryThrottleBackend(LOGIN_THROTTLE_MAX_KEYS)
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisThrottleBackend(url)
+    raise ValueError(f"Неизвестный бэкенд ограничения входа: {url}")
+
+
+login_throttle = LoginThrottle(create_backend(LOGIN_THROTTLE_URL))
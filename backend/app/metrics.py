@@ -0,0 +1,164 @@
+"""Метрики Prometheus (при нескольких воркерах - через PROMETHEUS_MULTIPROC_DIR)"""
+import os
+import time
+from typing import Dict, Tuple
+from dotenv import load_dotenv
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+)
+from prometheus_client import multiprocess
+from sqlalchemy import event, exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+load_dotenv()
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+MULTIPROCESS = bool(os.getenv("PROMETHEUS_MULTIPROC_DIR"))
+
+# Запросы без подходящего маршрута (404) - одна метка, чтобы число рядов не росло от сканеров
+UNMATCHED_ROUTE = "<unmatched>"
+
+HTTP_REQUESTS = Counter(
+    "http_requests_total", "HTTP-запросы", ["method", "route", "status"]
+)
+HTTP_LATENCY = Histogram(
+    "http_request_duration_seconds", "Время обработки HTTP-запроса до конца ответа", ["method", "route"]
+)
+DB_QUERIES_PER_REQUEST = Histogram(
+    "db_queries_per_request", "Число SQL-запросов на HTTP-запрос", ["route"],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, float("inf"))
+)
+DB_TIME_PER_REQUEST = Histogram(
+    "db_query_seconds_per_request", "Суммарное время SQL-запросов на HTTP-запрос", ["route"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, float("inf"))
+)
+DB_POOL_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds", "Ожидание соединения из пула", ["engine"],
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, float("inf"))
+)
+DB_POOL_TIMEOUTS = Counter(
+    "db_pool_checkout_timeouts_total", "Соединение из пула не получено за pool_timeout", ["engine"]
+)
+DB_POOL_CHECKED_OUT = Gauge(
+    "db_pool_checked_out", "Выданные соединения пула", ["engine"], multiprocess_mode="livesum"
+)
+DB_POOL_OVERFLOW = Gauge(
+    "db_pool_overflow", "Соединения сверх pool_size (max_overflow)", ["engine"], multiprocess_mode="livesum"
+)
+PASSWORD_HASH_DURATION = Histogram(
+    "password_hash_duration_seconds", "Хеширование и проверка пароля, включая очередь пула", ["operation"],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, float("inf"))
+)
+LOGIN_ATTEMPTS = Counter(
+    "login_attempts_total",
+    "Попытки входа: throttled - отказ до БД и argon2, hashed - пароль проверен хешированием, rejected - неверные данные",
+    ["outcome"]
+)
+
+
+def _timed_pool(base):
+    class TimedPool(base):
+        """Пул, который измеряет ожидание свободного соединения"""
+
+        def _do_get(self):
+            started = time.perf_counter()
+            try:
+                return super()._do_get()
+            except exc.TimeoutError:
+                DB_POOL_TIMEOUTS.labels(self._metrics_label).inc()
+                raise
+            finally:
+                self._wait_histogram().observe(time.perf_counter() - started)
+
+        @classmethod
+        def _wait_histogram(cls):
+            # Ряд создается при первой выдаче, а не при импорте (импортируют и процессы хеширования)
+            if cls._wait_series is None:
+                cls._wait_series = DB_POOL_WAIT.labels(cls._metrics_label)
+            return cls._wait_series
+
+    TimedPool.__name__ = f"Timed{base.__name__}"
+    TimedPool._metrics_label = "sync" if base is QueuePool else "async"
+    TimedPool._wait_series = None
+    return TimedPool
+
+
+TimedQueuePool = _timed_pool(QueuePool)
+TimedAsyncAdaptedQueuePool = _timed_pool(AsyncAdaptedQueuePool)
+
+
+def pool_class(async_engine: bool = False):
+    """poolclass для create_engine: с замером ожидания, если метрики включены"""
+    if not METRICS_ENABLED:
+        return AsyncAdaptedQueuePool if async_engine else QueuePool
+    return TimedAsyncAdaptedQueuePool if async_engine else TimedQueuePool
+
+
+def instrument_pool(sync_engine, label: str):
+    """Занятые соединения и overflow после каждой выдачи/возврата"""
+    if not METRICS_ENABLED:
+        return
+    pool = sync_engine.pool
+    if not hasattr(pool, "overflow"):
+        return
+    checked_out = DB_POOL_CHECKED_OUT.labels(label)
+    overflow = DB_POOL_OVERFLOW.labels(label)
+
+    def on_checkout(*args):
+        checked_out.set(pool.checkedout())
+        overflow.set(max(pool.overflow(), 0))
+
+    def on_checkin(*args):
+        # Событие приходит до возврата соединения в пул
+        checked_out.set(max(pool.checkedout() - 1, 0))
+        overflow.set(max(pool.overflow(), 0))
+
+    event.listen(pool, "checkout", on_checkout)
+    event.listen(pool, "checkin", on_checkin)
+
+
+def route_label(scope) -> str:
+    """Шаблон пути (/api/v1/portfolio/{item_id}), а не фактический URL"""
+    route = scope.get("route")
+    return getattr(route, "path", None) or UNMATCHED_ROUTE
+
+
+# Ряды по (method, route, status): labels() - поиск под блокировкой, на каждый запрос он не нужен.
+# Число ключей ограничено: маршруты фиксированы, метод и статус - из небольших множеств
+_request_series: Dict[Tuple[str, str, int], tuple] = {}
+
+
+def _series(method: str, route: str, status: int) -> tuple:
+    key = (method, route, status)
+    series = _request_series.get(key)
+    if series is None:
+        series = _request_series[key] = (
+            HTTP_REQUESTS.labels(method, route, str(status)),
+            HTTP_LATENCY.labels(method, route),
+            DB_QUERIES_PER_REQUEST.labels(route),
+            DB_TIME_PER_REQUEST.labels(route),
+        )
+    return series
+
+
+def observe_request(scope, status: int, elapsed: float, stats) -> None:
+    requests, latency, queries, db_time = _series(scope["method"], route_label(scope), status)
+    requests.inc()
+    latency.observe(elapsed)
+    queries.observe(stats.queries)
+    db_time.observe(stats.seconds)
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    """Текст для /metrics в формате Prometheus"""
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead():
+    """Убрать livesum-значения остановленного воркера"""
+    if MULTIPROCESS:
+        multiprocess.mark_process_dead(os.getpid())
@@ -0,0 +1,230 @@
+"""Middleware на чистом ASGI (без BaseHTTPMiddleware).
+
+Заголовки ответа меняются прямо в сообщении http.response.start, тело
+проходит без изменений: нет отдельной задачи и потока в памяти на каждый
+запрос, стриминг и файловые ответы (Range, sendfile) работают как есть.
+Новые заголовки (время, кэширование) добавляются функциями-хуками.
+"""
+import os
+import time
+from typing import Callable, List, Mapping, Sequence, Tuple
+from starlette.datastructures import MutableHeaders
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.database import DB_REPLICA_STICKY_SECONDS, ReadRouting, read_routing
+from app.metrics import observe_request, route_label
+from app.query_budget import check_query_budget
+from app.query_stats import track_queries
+
+# Server-Timing: app;dur=... - время до начала ответа, для отладки с клиента
+SERVER_TIMING = os.getenv("SERVER_TIMING", "false").lower() in ("1", "true", "yes")
+
+# Хук получает scope запроса, изменяемые заголовки ответа и perf_counter() начала запроса
+HeaderHook = Callable[[Scope, MutableHeaders, float], None]
+
+
+def json_charset(scope: Scope, headers: MutableHeaders, started: float) -> None:
+    """Явная кодировка UTF-8 для JSON"""
+    if headers.get("content-type", "").startswith("application/json"):
+        headers["content-type"] = "application/json; charset=utf-8"
+
+
+def revalidate_by_default(scope: Scope, headers: MutableHeaders, started: float) -> None:
+    """Ответы с ETag/Last-Modified без Cache-Control браузер не кэширует эвристически"""
+    if "cache-control" not in headers and ("etag" in headers or "last-modified" in headers):
+        headers["cache-control"] = "no-cache"
+
+
+def server_timing(scope: Scope, headers: MutableHeaders, started: float) -> None:
+    headers.append("server-timing", f"app;dur={(time.perf_counter() - started) * 1000:.1f}")
+
+
+def response_header_hooks() -> List[HeaderHook]:
+    """Хуки по умолчанию с учетом настроек окружения"""
+    hooks = [json_charset, revalidate_by_default]
+    if SERVER_TIMING:
+        hooks.append(server_timing)
+    return hooks
+
+
+class ResponseHeadersMiddleware:
+    """Применяет хуки к заголовкам каждого HTTP-ответа"""
+
+    def __init__(self, app: ASGIApp, hooks: Sequence[HeaderHook] = ()):
+        self.app = app
+        self.hooks = tuple(hooks)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not self.hooks:
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+
+        async def send_with_headers(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", [])
+                headers = MutableHeaders(scope=message)
+                for hook in self.hooks:
+                    hook(scope, headers, started)
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
+
+
+class MetricsMiddleware:
+    """Метрики запроса: статус, время до конца ответа, запросы к БД"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        with track_queries() as stats:
+            try:
+                await self.app(scope, receive, send_with_status)
+            finally:
+                observe_request(scope, status_code, time.perf_counter() - started, stats)
+
+
+class QueryBudgetMiddleware:
+    """Проверка @query_budget и повторяющихся запросов (QUERY_BUDGET_MODE != off).
+
+    Проверка идет перед отправкой заголовков ответа: в режиме raise клиент
+    получает 500, а не успешный ответ эндпоинта, превысившего бюджет.
+    """
+
+    def __init__(self, app: ASGIApp, mode: str):
+        self.app = app
+        self.mode = mode
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        with track_queries(record_statements=True) as stats:
+            async def send_checked(message: Message) -> None:
+                if message["type"] == "http.response.start":
+                    check_query_budget(scope, f"{scope['method']} {route_label(scope)}", stats, self.mode)
+                await send(message)
+
+            await self.app(scope, receive, send_checked)
+
+
+# Cookie «клиент недавно писал»: его чтения идут на основную БД, пока реплики догоняют
+PRIMARY_COOKIE = "db_primary"
+
+
+class ReplicaRoutingMiddleware:
+    """Состояние маршрутизации чтения на запрос и cookie после записи (DATABASE_REPLICA_URLS)"""
+
+    def __init__(self, app: ASGIApp, sticky_seconds: int = DB_REPLICA_STICKY_SECONDS):
+        self.app = app
+        self.cookie = (
+            f"{PRIMARY_COOKIE}=1; Max-Age={sticky_seconds}; Path=/; HttpOnly; SameSite=Lax"
+        ).encode("latin-1")
+
+    @staticmethod
+    def _pinned(scope: Scope) -> bool:
+        for name, value in scope["headers"]:
+            if name == b"cookie" and f"{PRIMARY_COOKIE}=".encode("latin-1") in value:
+                return True
+        return False
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        routing = ReadRouting(pinned=self._pinned(scope))
+        token = read_routing.set(routing)
+
+        async def send_with_cookie(message: Message) -> None:
+            if message["type"] == "http.response.start" and routing.wrote:
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"set-cookie", self.cookie)]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_cookie)
+        finally:
+            read_routing.reset(token)
+
+
+class BodyTooLarge(Exception):
+    """Тело запроса превысило предел BodySizeLimitMiddleware"""
+
+
+class BodySizeLimitMiddleware:
+    """413 для слишком больших тел запроса до их разбора (multipart, JSON).
+
+    limits - путь -> (предел в байтах, текст ошибки). Content-Length больше
+    предела - ответ сразу, тело не читается. Без него (chunked) байты
+    считаются в receive(): после предела чтение обрывается, а ответ
+    приложения на оборванное тело заменяется на 413.
+    """
+
+    def __init__(self, app: ASGIApp, limits: Mapping[str, Tuple[int, str]]):
+        self.app = app
+        self.limits = dict(limits)
+
+    @staticmethod
+    async def _reject(scope: Scope, receive: Receive, send: Send, detail: str) -> None:
+        response = JSONResponse({"detail": detail}, status_code=413, headers={"connection": "close"})
+        await response(scope, receive, send)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        limit = self.limits.get(scope["path"]) if scope["type"] == "http" else None
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+
+        max_bytes, detail = limit
+        for name, value in scope["headers"]:
+            if name == b"content-length" and value.isdigit() and int(value) > max_bytes:
+                await self._reject(scope, receive, send, detail)
+                return
+
+        received = 0
+        exceeded = False
+        response_started = False
+
+        async def receive_limited() -> Message:
+            nonlocal received, exceeded
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > max_bytes:
+                    exceeded = True
+                    raise BodyTooLarge()
+            return message
+
+        async def send_checked(message: Message) -> None:
+            nonlocal response_started
+            if exceeded and not response_started:
+                # Ответ приложения на оборванное тело (обычно 400) не отправляется
+                return
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, receive_limited, send_checked)
+        except Exception:
+            if not exceeded:
+                raise
+        if exceeded and not response_started:
+            await self._reject(scope, receive, send, detail)
@@ -1,17 +1,37 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, Index, Table, DDL, event, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database import Base
 
 
+# Связь проект - тег; индекс (tag_id, portfolio_id) - инвертированный индекс для поиска по тегам
+portfolio_tags = Table(
+    "portfolio_tags",
+    Base.metadata,
+    Column("portfolio_id", Integer, ForeignKey("portfolio.id", ondelete="CASCADE"), primary_key=True),
+    Column("tag_id", Integer, ForeignKey("tags.id", ondelete="CASCADE"), primary_key=True),
+    Index("ix_portfolio_tags_tag_id_portfolio_id", "tag_id", "portfolio_id"),
+)
+
+
 class User(Base):
     """Модель пользователя"""
     __tablename__ = "users"
+    __table_args__ = (
+        # Каталог анкет: только публичные активные, keyset по (created_at, id)
+        Index(
+            "ix_users_public_directory", "created_at", "id",
+            postgresql_where=text("is_profile_public = true AND is_active = true"),
+            sqlite_where=text("is_profile_public = 1 AND is_active = 1")
+        ),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     email = Column(String(255), unique=True, index=True, nullable=False)
     username = Column(String(100), unique=True, index=True, nullable=False)
     hashed_password = Column(String(255), nullable=False)
+    # Растет при смене пароля и входит в claim ver токена; перехеширование его не меняет
+    password_version = Column(Integer, default=0, server_default="0", nullable=False)
     full_name = Column(String(200), nullable=True)
     telegram = Column(String(100), nullable=True)
     phone = Column(String(20), nullable=True)
@@ -23,7 +43,12 @@ class User(Base):
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
 
     # связь с портфолио
-    portfolio_items = relationship("Portfolio", back_populates="owner", cascade="all, delete-orphan")
+    portfolio_items = relationship(
+        "Portfolio",
+        back_populates="owner",
+        cascade="all, delete-orphan",
+        order_by=lambda: (Portfolio.order_index, Portfolio.created_at)
+    )
 
     def __repr__(self):
         return f"<User(id={self.id}, username='{self.username}', email='{self.email}')>"
@@ -32,14 +57,30 @@ class User(Base):
 class Portfolio(Base):
     """Модель портфолио пользователя"""
     __tablename__ = "portfolio"
+    __table_args__ = (
+        # Проекты владельца в порядке показа (/portfolio); заменяет индекс по одному user_id
+        Index("ix_portfolio_user_id_order", "user_id", "order_index", "created_at"),
+        # Видимые проекты владельцев страницы каталога и публичного профиля
+        Index(
+            "ix_portfolio_visible_user_id_order", "user_id", "order_index", "created_at",
+            postgresql_where=text("is_visible = true"),
+            sqlite_where=text("is_visible = 1")
+        ),
+        # Ссылается ли еще какой-нибудь проект на файл изображения
+        Index(
+            "ix_portfolio_image_url", "image_url",
+            postgresql_where=text("image_url IS NOT NULL"),
+            sqlite_where=text("image_url IS NOT NULL")
+        ),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     title = Column(String(200), nullable=False)
     description = Column(Text, nullable=True)
     image_url = Column(String(500), nullable=True)
     project_url = Column(String(500), nullable=True)
-    technologies = Column(String(500), nullable=True)  # Comma-separated technologies
+    technologies = Column(String(500), nullable=True)  # Comma-separated technologies, теги - в portfolio_tags
     is_visible = Column(Boolean, default=True, nullable=False)
     order_index = Column(Integer, default=0, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
@@ -47,11 +88,25 @@ class Portfolio(Base):
 
     # связь с пользователем
     owner = relationship("User", back_populates="portfolio_items")
+    # теги из technologies (только чтение: связи пишет app.tags, удаляет ON DELETE CASCADE)
+    tags = relationship("Tag", secondary=portfolio_tags, viewonly=True)
 
     def __repr__(self):
         return f"<Portfolio(id={self.id}, title='{self.title}', user_id={self.user_id})>"
 
 
+class Tag(Base):
+    """Технология (тег) проекта; slug - нормализованное имя для поиска"""
+    __tablename__ = "tags"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String(100), nullable=False)
+    slug = Column(String(100), unique=True, index=True, nullable=False)
+
+    def __repr__(self):
+        return f"<Tag(id={self.id}, slug='{self.slug}')>"
+
+
 class Item(Base):
     """Базовая модель для примера"""
     __tablename__ = "items"
@@ -65,3 +120,74 @@ class Item(Base):
 
     def __repr__(self):
         return f"<Item(id={self.id}, title='{self.title}')>"
+
+
+# Поиск по началу названия (items.title_prefix_range) сравнивает title COLLATE "C":
+# диапазон префикса верен только при побайтовой сортировке. В SQLite она по
+# умолчанию (BINARY) и хватает ix_items_title. Тот же индекс создает миграция 0006.
+ITEM_TITLE_C_INDEX = 'CREATE INDEX ix_items_title_c ON items (title COLLATE "C")'
+event.listen(Item.__table__, "after_create", DDL(ITEM_TITLE_C_INDEX).execute_if(dialect="postgresql"))
+
+
+# Полнотекстовый поиск (app/search.py). Индексы поддерживает сама БД при любой записи:
+# в PostgreSQL - генерируемые tsvector-колонки с GIN, в SQLite - FTS5-таблицы с триггерами.
+# Те же объекты создает миграция 0003.
+SEARCH_DDL = {
+    "postgresql": {
+        "users": [
+            "ALTER TABLE users ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ("
+            "to_tsvector('russian'::regconfig, coalesce(full_name, '') || ' ' || username)) STORED",
+            "CREATE INDEX ix_users_search_vector ON users USING gin (search_vector)",
+        ],
+        "portfolio": [
+            "ALTER TABLE portfolio ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ("
+            "setweight(to_tsvector('russian'::regconfig, title), 'A') || "
+            "setweight(to_tsvector('russian'::regconfig, coalesce(technologies, '')), 'B') || "
+            "setweight(to_tsvector('russian'::regconfig, coalesce(description, '')), 'C')) STORED",
+            "CREATE INDEX ix_portfolio_search_vector ON portfolio USING gin (search_vector)",
+        ],
+    },
+    "sqlite": {
+        "users": [
+            "CREATE VIRTUAL TABLE IF NOT EXISTS users_fts USING fts5("
+            "full_name, username, content='users', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+            "CREATE TRIGGER users_fts_ai AFTER INSERT ON users BEGIN "
+            "INSERT INTO users_fts(rowid, full_name, username) VALUES (new.id, new.full_name, new.username); END",
+            "CREATE TRIGGER users_fts_ad AFTER DELETE ON users BEGIN "
+            "INSERT INTO users_fts(users_fts, rowid, full_name, username) "
+            "VALUES ('delete', old.id, old.full_name, old.username); END",
+            "CREATE TRIGGER users_fts_au AFTER UPDATE OF full_name, username ON users BEGIN "
+            "INSERT INTO users_fts(users_fts, rowid, full_name, username) "
+            "VALUES ('delete', old.id, old.full_name, old.username); "
+            "INSERT INTO users_fts(rowid, full_name, username) VALUES (new.id, new.full_name, new.username); END",
+        ],
+        "portfolio": [
+            "CREATE VIRTUAL TABLE IF NOT EXISTS portfolio_fts USING fts5("
+            "title, technologies, description, content='portfolio', content_rowid='id', "
+            "tokenize='unicode61 remove_diacritics 2')",
+            "CREATE TRIGGER portfolio_fts_ai AFTER INSERT ON portfolio BEGIN "
+            "INSERT INTO portfolio_fts(rowid, title, technologies, description) "
+            "VALUES (new.id, new.title, new.technologies, new.description); END",
+            "CREATE TRIGGER portfolio_fts_ad AFTER DELETE ON portfolio BEGIN "
+            "INSERT INTO portfolio_fts(portfolio_fts, rowid, title, technologies, description) "
+            "VALUES ('delete', old.id, old.title, old.technologies, old.description); END",
+            "CREATE TRIGGER portfolio_fts_au AFTER UPDATE OF title, technologies, description ON portfolio BEGIN "
+            "INSERT INTO portfolio_fts(portfolio_fts, rowid, title, technologies, description) "
+            "VALUES ('delete', old.id, old.title, old.technologies, old.description); "
+            "INSERT INTO portfolio_fts(rowid, title, technologies, description) "
+            "VALUES (new.id, new.title, new.technologies, new.description); END",
+        ],
+    },
+}
+
+for _dialect, _tables in SEARCH_DDL.items():
+    for _table_name, _statements in _tables.items():
+        _table = Base.metadata.tables[_table_name]
+        for _statement in _statements:
+            event.listen(_table, "after_create", DDL(_statement).execute_if(dialect=_dialect))
+        if _dialect == "sqlite":
+            # FTS-таблица не входит в metadata, drop_all ее бы не удалил
+            event.listen(
+                _table, "before_drop",
+                DDL(f"DROP TABLE IF EXISTS {_table_name}_fts").execute_if(dialect=_dialect)
+            )
@@ -0,0 +1,67 @@
+import base64
+import json
+from datetime import datetime
+from typing import Optional
+from fastapi import HTTPException, status
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.exc import OperationalError
+from app.database import engine
+
+
+def encode_cursor(*values) -> str:
+    """Упаковать значения ключа последней строки в непрозрачный курсор"""
+    payload = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, *types) -> tuple:
+    """Распаковать курсор, приведя значения к ожидаемым типам"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+        if not isinstance(values, list) or len(values) != len(types):
+            raise ValueError("cursor shape")
+        return tuple(
+            datetime.fromisoformat(value) if value_type is datetime else value_type(value)
+            for value_type, value in zip(types, values)
+        )
+    except (ValueError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Некорректный курсор пагинации"
+        )
+
+
+async def estimated_count(db, statement) -> Optional[int]:
+    """Оценка числа строк выборки по статистике планировщика, без COUNT(*).
+
+    PostgreSQL - Plan Rows из EXPLAIN (учитывает фильтры, точность - как у
+    ANALYZE/autovacuum). SQLite - только выборка без условий, по sqlite_stat1
+    после ANALYZE. None - оценки нет.
+    """
+    if engine.dialect.name == "postgresql":
+        # Именованные параметры одинаково передаются и psycopg2, и asyncpg
+        compiled = statement.compile(
+            dialect=postgresql.dialect(paramstyle="named"),
+            compile_kwargs={"render_postcompile": True}
+        )
+        plan = await db.scalar(text("EXPLAIN (FORMAT JSON) " + str(compiled)).bindparams(**compiled.params))
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]["Plan"]["Plan Rows"])
+
+    if engine.dialect.name == "sqlite" and statement.whereclause is None:
+        froms = statement.get_final_froms()
+        if len(froms) != 1 or not hasattr(froms[0], "name"):
+            return None
+        try:
+            stat = await db.scalar(
+                text("SELECT stat FROM sqlite_stat1 WHERE tbl = :table LIMIT 1").bindparams(table=froms[0].name)
+            )
+        except OperationalError:
+            # sqlite_stat1 появляется только после первого ANALYZE
+            return None
+        return int(stat.split()[0]) if stat else None
+    return None
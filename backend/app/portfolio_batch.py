@@ -0,0 +1,148 @@
+import os
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy import delete, insert, select, update
+from dotenv import load_dotenv
+from app.models import Portfolio
+from app.schemas import PortfolioBatchRequest
+from app.tags import sync_portfolio_tags
+
+load_dotenv()
+
+# Максимум операций в одном запросе и размер одного INSERT/UPDATE/IN (...)
+PORTFOLIO_BATCH_MAX = int(os.getenv("PORTFOLIO_BATCH_MAX", "5000"))
+BATCH_CHUNK_SIZE = 1000
+
+
+@dataclass
+class BatchResult:
+    created: List[Portfolio] = field(default_factory=list)
+    updated: List[int] = field(default_factory=list)
+    deleted: List[int] = field(default_factory=list)
+    errors: List[dict] = field(default_factory=list)
+    applied: bool = False
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.created or self.updated or self.deleted)
+
+
+def chunks(values: list, size: int = BATCH_CHUNK_SIZE) -> Iterable[list]:
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def column_error(values: dict) -> Optional[str]:
+    """Проверить значения по ограничениям колонок (NOT NULL, длина строк).
+
+    В PostgreSQL нарушение отменило бы всю транзакцию пакета, поэтому
+    такие строки отсеиваются заранее и попадают в ошибки.
+    """
+    columns = Portfolio.__table__.c
+    for name, value in values.items():
+        column = columns[name]
+        if value is None:
+            if not column.nullable:
+                return f"Поле {name} не может быть пустым"
+            continue
+        length = getattr(column.type, "length", None)
+        if length and isinstance(value, str) and len(value) > length:
+            return f"Поле {name} длиннее {length} символов"
+    return None
+
+
+async def apply_portfolio_batch(db, user_id: int, batch: PortfolioBatchRequest, atomic: bool = False) -> BatchResult:
+    """Применить пакет операций одной транзакцией.
+
+    Создание - многострочный INSERT ... RETURNING, изменение - UPDATE по
+    первичному ключу через executemany, удаление - DELETE ... IN, все
+    блоками по BATCH_CHUNK_SIZE. Операции с ошибками пропускаются и
+    попадают в result.errors; при atomic=True любая ошибка отменяет пакет.
+    """
+    result = BatchResult()
+
+    def reject(operation: str, index: int, detail: str, item_id: Optional[int] = None):
+        result.errors.append({"operation": operation, "index": index, "id": item_id, "detail": detail})
+
+    create_rows = []
+    for index, item in enumerate(batch.create):
+        values = item.model_dump()
+        problem = column_error(values)
+        if problem:
+            reject("create", index, problem)
+            continue
+        create_rows.append({**values, "user_id": user_id})
+
+    # Принадлежность изменяемых и удаляемых элементов - одним запросом на блок
+    target_ids = sorted({item.id for item in batch.update} | set(batch.delete))
+    owned = set()
+    for chunk in chunks(target_ids):
+        owned.update(await db.scalars(
+            select(Portfolio.id).where(
+                Portfolio.user_id == user_id,
+                Portfolio.id.in_(chunk)
+            )
+        ))
+
+    # dict сохраняет порядок и убирает повторы
+    delete_ids: Dict[int, None] = {}
+    for index, item_id in enumerate(batch.delete):
+        if item_id not in owned:
+            reject("delete", index, "Элемент портфолио не найден", item_id)
+        else:
+            delete_ids[item_id] = None
+
+    update_rows = []
+    updated_ids = set()
+    for index, item in enumerate(batch.update):
+        values = item.model_dump(exclude_unset=True, exclude={"id"})
+        problem = None
+        if item.id not in owned:
+            problem = "Элемент портфолио не найден"
+        elif item.id in updated_ids:
+            problem = "Элемент изменяется в пакете дважды"
+        elif item.id in delete_ids:
+            problem = "Элемент одновременно изменяется и удаляется"
+        elif not values:
+            problem = "Нет полей для изменения"
+        else:
+            problem = column_error(values)
+        if problem:
+            reject("update", index, problem, item.id)
+            continue
+        updated_ids.add(item.id)
+        update_rows.append({"id": item.id, **values})
+
+    if atomic and result.errors:
+        return result
+
+    try:
+        for chunk in chunks(create_rows):
+            created = await db.scalars(
+                insert(Portfolio).returning(Portfolio, sort_by_parameter_order=True), chunk
+            )
+            created = created.all()
+            await sync_portfolio_tags(db, {item.id: item.technologies for item in created})
+            result.created.extend(created)
+        for chunk in chunks(update_rows):
+            await db.execute(update(Portfolio), chunk)
+            await sync_portfolio_tags(db, {
+                row["id"]: row["technologies"] for row in chunk if "technologies" in row
+            })
+        for chunk in chunks(list(delete_ids)):
+            await db.execute(
+                delete(Portfolio).where(Portfolio.user_id == user_id, Portfolio.id.in_(chunk)),
+                execution_options={"synchronize_session": False}
+            )
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+
+    result.updated = [row["id"] for row in update_rows]
+    result.deleted = list(delete_ids)
+    result.applied = True
+
+    # Файлы изображений удаленных проектов удаляет сборщик мусора (app.upload_gc)
+    return result
+
@@ -0,0 +1,79 @@
+"""Плагин pytest: число SQL-запросов на эндпоинт.
+
+Подключение (conftest.py в каталоге тестов):
+
+    pytest_plugins = ["app.pytest_plugin"]
+
+Плагин включает QUERY_BUDGET_MODE=raise до импорта приложения, поэтому
+эндпоинт, превысивший @query_budget, роняет тест с QueryBudgetExceeded.
+Фикстура query_counts проверяет конкретные числа:
+
+    def test_public_item(client, query_counts):
+        client.get("/api/v1/portfolio/public/1")
+        query_counts.assert_count("GET /api/v1/portfolio/public/{item_id}", 2)
+        query_counts.assert_no_repeats()
+"""
+import os
+
+# До импорта app.*: QueryBudgetMiddleware подключается в main.py по этой настройке
+os.environ.setdefault("QUERY_BUDGET_MODE", "raise")
+
+from typing import Dict, List, Optional  # noqa: E402
+
+import pytest  # noqa: E402
+
+from app.query_budget import (  # noqa: E402
+    QUERY_BUDGET_MODE, QUERY_REPEAT_THRESHOLD, add_observer, describe, remove_observer
+)
+from app.query_stats import QueryStats, track_queries  # noqa: E402
+
+
+class QueryCounts:
+    """Статистика SQL по HTTP-запросам теста, ключ - "МЕТОД /шаблон/маршрута" """
+
+    def __init__(self):
+        self.requests: Dict[str, List[QueryStats]] = {}
+
+    def record(self, route: str, stats: QueryStats) -> None:
+        self.requests.setdefault(route, []).append(stats)
+
+    def last(self, route: str) -> QueryStats:
+        if not self.requests.get(route):
+            raise AssertionError(f"Запросов к {route} не было; были: {sorted(self.requests)}")
+        return self.requests[route][-1]
+
+    def assert_count(self, route: str, expected: int) -> None:
+        """Последний запрос к маршруту выполнил ровно expected SQL-запросов"""
+        stats = self.last(route)
+        assert stats.queries == expected, describe(route, stats, expected)
+
+    def assert_at_most(self, route: str, budget: int) -> None:
+        stats = self.last(route)
+        assert stats.queries <= budget, describe(route, stats, budget)
+
+    def assert_no_repeats(self, route: Optional[str] = None, threshold: int = QUERY_REPEAT_THRESHOLD) -> None:
+        """Ни один запрос не повторялся threshold раз с разными параметрами (N+1)"""
+        routes = [route] if route is not None else list(self.requests)
+        for name in routes:
+            for stats in self.requests.get(name, []):
+                assert not stats.repeated(threshold), describe(name, stats, None)
+
+    def clear(self) -> None:
+        self.requests.clear()
+
+    @staticmethod
+    def capture(record_statements: bool = True):
+        """Счетчик для кода вне HTTP (сервисные функции, скрипты) в том же потоке"""
+        return track_queries(record_statements)
+
+
+@pytest.fixture
+def query_counts():
+    if QUERY_BUDGET_MODE == "off":
+        pytest.fail("QUERY_BUDGET_MODE=off: счетчик запросов не подключен к приложению")
+    counts = QueryCounts()
+    add_observer(counts.record)
+    try:
+        yield counts
+    finally:
+        remove_observer(counts.record)
@@ -0,0 +1,62 @@
+"""Бюджет SQL-запросов на эндпоинт и поиск N+1 (QUERY_BUDGET_MODE: off/log/raise)"""
+import logging
+import os
+from typing import Callable, List, Optional
+from dotenv import load_dotenv
+from app.query_stats import QueryStats
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# off - production, log - предупреждение в лог, raise - QueryBudgetExceeded (тесты)
+QUERY_BUDGET_MODE = os.getenv("QUERY_BUDGET_MODE", "off").lower()
+# Столько одинаковых запросов с разными параметрами - признак N+1
+QUERY_REPEAT_THRESHOLD = int(os.getenv("QUERY_REPEAT_THRESHOLD", "3"))
+
+# Подписчики на статистику каждого запроса: ("GET /шаблон/маршрута", статистика)
+_observers: List[Callable[[str, QueryStats], None]] = []
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Эндпоинт выполнил больше запросов, чем заявлено в @query_budget"""
+
+
+def query_budget(max_queries: int):
+    """Объявить максимум SQL-запросов на один HTTP-запрос к эндпоинту"""
+    def decorator(endpoint):
+        endpoint.query_budget = max_queries
+        return endpoint
+    return decorator
+
+
+def endpoint_budget(scope) -> Optional[int]:
+    return getattr(scope.get("endpoint"), "query_budget", None)
+
+
+def describe(route: str, stats: QueryStats, budget: Optional[int]) -> str:
+    lines = [f"{route}: {stats.queries} SQL-запросов" + (f" при бюджете {budget}" if budget is not None else "")]
+    for statement, count in stats.repeated(QUERY_REPEAT_THRESHOLD):
+        lines.append(f"  повтор x{count}: {statement}")
+    return "\n".join(lines)
+
+
+def check_query_budget(scope, route: str, stats: QueryStats, mode: str = QUERY_BUDGET_MODE) -> None:
+    """Сообщить о превышении бюджета и о повторяющихся запросах"""
+    for observer in _observers:
+        observer(route, stats)
+
+    budget = endpoint_budget(scope)
+    over_budget = budget is not None and stats.queries > budget
+    if over_budget and mode == "raise":
+        raise QueryBudgetExceeded(describe(route, stats, budget))
+    if over_budget or stats.repeated(QUERY_REPEAT_THRESHOLD):
+        logger.warning("%s", describe(route, stats, budget))
+
+
+def add_observer(observer: Callable[[str, QueryStats], None]) -> None:
+    _observers.append(observer)
+
+
+def remove_observer(observer: Callable[[str, QueryStats], None]) -> None:
+    _observers.remove(observer)
@@ -0,0 +1,102 @@
+"""Счетчик SQL-запросов текущего HTTP-запроса.
+
+Статистика хранится в contextvar: run_in_threadpool (синхронный режим) и
+greenlet SQLAlchemy (asyncpg/aiosqlite) выполняют запросы в копии контекста
+запроса, поэтому события движка попадают в объект того запроса, который их
+вызвал. Вне track_queries() события ничего не делают.
+"""
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, List, Optional, Tuple
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Плейсхолдеры драйверов: ? (sqlite), %(name)s (psycopg2), $1 (asyncpg), :name
+_PLACEHOLDER = r"(?:\?|%\(\w+\)s|\$\d+|:\w+)"
+# IN (?, ?, ?) после раскрытия списка - длина зависит от числа параметров
+_EXPANDED_LIST = re.compile(r"\(\s*" + _PLACEHOLDER + r"(?:\s*,\s*" + _PLACEHOLDER + r")*\s*\)")
+_NUMBERED = re.compile(r"\$\d+")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_statement(statement: str) -> str:
+    """SQL без различий в параметрах: одинаковый для запросов, отличающихся только значениями"""
+    statement = _EXPANDED_LIST.sub("(...)", statement)
+    statement = _NUMBERED.sub("$n", statement)
+    return _SPACES.sub(" ", statement).strip()
+
+
+class QueryStats:
+    """Число запросов к БД и суммарное время их выполнения.
+
+    statements (если включено) - сколько раз выполнялся каждый нормализованный запрос.
+    Вложенный track_queries() считает запросы и во всех внешних.
+    """
+    __slots__ = ("queries", "seconds", "statements", "parent")
+
+    def __init__(self, record_statements: bool = False, parent: Optional["QueryStats"] = None):
+        self.queries = 0
+        self.seconds = 0.0
+        self.statements: Optional[Counter] = Counter() if record_statements else None
+        self.parent = parent
+
+    def repeated(self, threshold: int) -> List[Tuple[str, int]]:
+        """Запросы, выполненные threshold раз и больше (признак N+1)"""
+        if self.statements is None:
+            return []
+        return [(statement, count) for statement, count in self.statements.most_common() if count >= threshold]
+
+
+current_query_stats: ContextVar[Optional[QueryStats]] = ContextVar("current_query_stats", default=None)
+
+
+@contextmanager
+def track_queries(record_statements: bool = False) -> Iterator[QueryStats]:
+    """Считать запросы, выполненные внутри блока"""
+    stats = QueryStats(record_statements, parent=current_query_stats.get())
+    token = current_query_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        current_query_stats.reset(token)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if current_query_stats.get() is not None:
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = current_query_stats.get()
+    started = conn.info.get("query_started")
+    if stats is None or not started:
+        return
+    elapsed = time.perf_counter() - started.pop()
+    normalized = None
+    while stats is not None:
+        stats.queries += 1
+        stats.seconds += elapsed
+        if stats.statements is not None:
+            if normalized is None:
+                normalized = normalize_statement(statement)
+            stats.statements[normalized] += 1
+        stats = stats.parent
+
+
+def _handle_error(exception_context):
+    # Запрос упал - after_cursor_execute не будет, убираем его отметку времени
+    connection = exception_context.connection
+    if connection is not None and connection.info.get("query_started"):
+        connection.info["query_started"].pop()
+
+
+def instrument_engine(sync_engine: Engine):
+    """Подключить счетчик к движку (для async - к engine.sync_engine)"""
+    if event.contains(sync_engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(sync_engine, "handle_error", _handle_error)
@@ -0,0 +1,33 @@
+from functools import lru_cache
+from fastapi.responses import JSONResponse, Response
+from pydantic import TypeAdapter
+
+try:
+    import orjson
+    from fastapi.responses import ORJSONResponse as DefaultResponse
+except ImportError:  # orjson не установлен - стандартный json
+    orjson = None
+    DefaultResponse = JSONResponse
+
+
+@lru_cache(maxsize=None)
+def response_adapter(model) -> TypeAdapter:
+    """TypeAdapter схемы ответа (строится один раз на схему)"""
+    return TypeAdapter(model)
+
+
+def render_json(model, data) -> bytes:
+    """Провалидировать данные схемой ответа и сразу сериализовать в JSON.
+
+    model - схема или тип вроде List[PortfolioResponse], data - dict-ы и/или
+    ORM-объекты. Экземпляры схем строятся один раз, JSON пишет pydantic-core
+    без промежуточных dict и повторной валидации, как в пути FastAPI
+    response_model -> jsonable -> json.dumps.
+    """
+    adapter = response_adapter(model)
+    return adapter.dump_json(adapter.validate_python(data, from_attributes=True))
+
+
+def model_response(model, data, status_code: int = 200) -> Response:
+    """Ответ по схеме через render_json; response_model у маршрута остается для OpenAPI"""
+    return Response(content=render_json(model, data), status_code=status_code, media_type="application/json")
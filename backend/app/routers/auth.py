@@ -1,14 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import timedelta
 from app.database import get_db
 from app.models import User
 from app.schemas import UserCreate, UserResponse, Token, LoginRequest
+from app.login_throttle import login_throttle, client_ip
 from app.auth import (
     get_password_hash,
     authenticate_user,
     create_access_token,
+    token_claims,
     get_user_by_email,
     get_user_by_username,
     ACCESS_TOKEN_EXPIRE_MINUTES
@@ -18,10 +20,10 @@ router = APIRouter()
 
 
 @router.post("/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-async def register(user_data: UserCreate, db: Session = Depends(get_db)):
+async def register(user_data: UserCreate, db: AsyncSession = Depends(get_db)):
     """Регистрация нового пользователя"""
     # Проверка существования пользователя с таким email
-    db_user = get_user_by_email(db, email=user_data.email)
+    db_user = await get_user_by_email(db, email=user_data.email)
     if db_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -29,7 +31,7 @@ async def register(user_data: UserCreate, db: Session = Depends(get_db)):
         )
     
     # Проверка существования пользователя с таким username
-    db_user = get_user_by_username(db, username=user_data.username)
+    db_user = await get_user_by_username(db, username=user_data.username)
     if db_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -38,7 +40,7 @@ async def register(user_data: UserCreate, db: Session = Depends(get_db)):
     
     # Создание нового пользователя
     try:
-        hashed_password = get_password_hash(user_data.password)
+        hashed_password = await get_password_hash(user_data.password)
         db_user = User(
             email=user_data.email,
             username=user_data.username,
@@ -48,14 +50,14 @@ async def register(user_data: UserCreate, db: Session = Depends(get_db)):
             is_superuser=False
         )
         db.add(db_user)
-        db.commit()
-        db.refresh(db_user)
+        await db.commit()
+        await db.refresh(db_user)
         return db_user
     except HTTPException:
-        db.rollback()
+        await db.rollback()
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         error_msg = str(e)
 
         if "password cannot be longer than 72 bytes" in error_msg:
@@ -68,39 +70,60 @@ async def register(user_data: UserCreate, db: Session = Depends(get_db)):
 
 @router.post("/login", response_model=Token)
 async def login(
+    request: Request,
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Авторизация пользователя"""
-    user = authenticate_user(db, form_data.username, form_data.password)
+    ip = client_ip(request)
+    # До БД и argon2: попытка учитывается сразу, сверх лимита - 429
+    await login_throttle.reserve(form_data.username, ip)
+    try:
+        user = await authenticate_user(db, form_data.username, form_data.password)
+    except HTTPException:
+        # Пул хеширования перегружен (503): пароль не проверялся, резерв возвращается
+        await login_throttle.release(form_data.username, ip)
+        raise
     if not user:
+        login_throttle.failure()
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Неверное имя пользователя или пароль",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    await login_throttle.success(form_data.username, ip)
     
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
+        data=token_claims(user), expires_delta=access_token_expires
     )
     return {"access_token": access_token, "token_type": "bearer"}
 
 
 @router.post("/login-json", response_model=Token)
 async def login_json(
+    request: Request,
     login_data: LoginRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Авторизация пользователя (JSON формат)"""
     try:
-        user = authenticate_user(db, login_data.username, login_data.password)
+        ip = client_ip(request)
+        await login_throttle.reserve(login_data.username, ip)
+        try:
+            user = await authenticate_user(db, login_data.username, login_data.password)
+        except HTTPException:
+            # Пул хеширования перегружен (503): пароль не проверялся, резерв возвращается
+            await login_throttle.release(login_data.username, ip)
+            raise
         if not user:
+            login_throttle.failure()
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Неверное имя пользователя или пароль",
                 headers={"WWW-Authenticate": "Bearer"},
             )
+        await login_throttle.success(login_data.username, ip)
         
         if not user.is_active:
             raise HTTPException(
@@ -110,7 +133,7 @@ async def login_json(
         
         access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
         access_token = create_access_token(
-            data={"sub": user.username}, expires_delta=access_token_expires
+            data=token_claims(user), expires_delta=access_token_expires
         )
         return {"access_token": access_token, "token_type": "bearer"}
     except HTTPException:
@@ -1,43 +1,118 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
-from app.database import get_db
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+from app.database import engine, get_db, get_read_db
 from app.models import Item
-from app.schemas import ItemCreate, ItemUpdate, ItemResponse
+from app.schemas import ItemCreate, ItemUpdate, ItemResponse, ItemPage
+from app.conditional import make_validators, is_not_modified, not_modified_response, conditional_json_response
+from app.responses import render_json
+from app.pagination import encode_cursor, decode_cursor, estimated_count
+from app.query_budget import query_budget
 
 router = APIRouter()
 
+ITEMS_PAGE_DEFAULT = 100
+ITEMS_PAGE_MAX = 500
 
-@router.get("/items", response_model=List[ItemResponse])
+
+def title_prefix_range(prefix: str):
+    """Префикс как диапазон [prefix, следующая строка) по индексу title.
+
+    Диапазон совпадает с началом строки только при побайтовой сортировке,
+    поэтому в PostgreSQL сравнение идет в COLLATE "C" (индекс ix_items_title_c),
+    а при локали вроде ru_RU часть совпадений лежала бы вне диапазона. В SQLite
+    сортировка BINARY по умолчанию; в остальных СУБД - только LIKE 'prefix%'.
+    """
+    if engine.dialect.name == "postgresql":
+        title = Item.title.collate("C")
+    elif engine.dialect.name == "sqlite":
+        title = Item.title
+    else:
+        return (Item.title.startswith(prefix, autoescape=True),)
+    last = ord(prefix[-1]) + 1
+    if last > 0x10FFFF:
+        return (title >= prefix,)
+    if 0xD800 <= last <= 0xDFFF:
+        # Суррогаты не кодируются в UTF-8
+        last = 0xE000
+    return (title >= prefix, title < prefix[:-1] + chr(last))
+
+
+@router.get("/items", response_model=ItemPage)
+@query_budget(3)
 async def get_items(
-    skip: int = 0,
-    limit: int = 100,
-    db: Session = Depends(get_db)
+    request: Request,
+    limit: int = Query(ITEMS_PAGE_DEFAULT, ge=1, le=ITEMS_PAGE_MAX),
+    cursor: Optional[str] = None,
+    is_active: Optional[bool] = None,
+    title_prefix: Optional[str] = Query(None, min_length=1, max_length=200),
+    db: AsyncSession = Depends(get_read_db)
 ):
-    """Получить список всех элементов"""
-    items = db.query(Item).offset(skip).limit(limit).all()
-    return items
+    """Получить страницу элементов (keyset по id, фильтры по активности и началу названия)"""
+    filters = []
+    if is_active is not None:
+        filters.append(Item.is_active == is_active)
+    if title_prefix:
+        filters.extend(title_prefix_range(title_prefix))
+
+    # Оценка общего числа - только для первой страницы, по статистике планировщика
+    estimated_total = None
+    if not cursor:
+        estimated_total = await estimated_count(db, select(Item.id).where(*filters))
+
+    page_query = select(Item).where(*filters).order_by(Item.id).limit(limit + 1)
+    if cursor:
+        (after_id,) = decode_cursor(cursor, int)
+        page_query = page_query.where(Item.id > after_id)
+
+    # Валидаторы страницы одним агрегатом: при совпадении ETag строки не загружаются
+    page = page_query.with_only_columns(Item.id, Item.updated_at).subquery()
+    count, id_sum, updated_at = (await db.execute(
+        select(func.count(page.c.id), func.sum(page.c.id), func.max(page.c.updated_at))
+    )).one()
+    validators = make_validators(
+        "items", limit, cursor, is_active, title_prefix, estimated_total, count, id_sum, updated_at=(updated_at,)
+    )
+    if is_not_modified(request, validators):
+        return not_modified_response(validators)
+
+    items = (await db.scalars(page_query)).all()
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        next_cursor = encode_cursor(items[-1].id)
+
+    body = render_json(ItemPage, {
+        "items": items,
+        "next_cursor": next_cursor,
+        "estimated_total": estimated_total
+    })
+    return conditional_json_response(request, body, validators)
 
 
 @router.get("/items/{item_id}", response_model=ItemResponse)
-async def get_item(item_id: int, db: Session = Depends(get_db)):
+@query_budget(1)
+async def get_item(request: Request, item_id: int, db: AsyncSession = Depends(get_read_db)):
     """Получить элемент по ID"""
-    item = db.query(Item).filter(Item.id == item_id).first()
+    item = await db.get(Item, item_id)
     if not item:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Элемент с ID {item_id} не найден"
         )
-    return item
+    validators = make_validators("items", item.id, updated_at=(item.updated_at,))
+    body = render_json(ItemResponse, item)
+    return conditional_json_response(request, body, validators)
 
 
 @router.post("/items", response_model=ItemResponse, status_code=status.HTTP_201_CREATED)
-async def create_item(item: ItemCreate, db: Session = Depends(get_db)):
+async def create_item(item: ItemCreate, db: AsyncSession = Depends(get_db)):
     """Создать новый элемент"""
     db_item = Item(**item.dict())
     db.add(db_item)
-    db.commit()
-    db.refresh(db_item)
+    await db.commit()
+    await db.refresh(db_item)
     return db_item
 
 
@@ -45,10 +120,10 @@ async def create_item(item: ItemCreate, db: Session = Depends(get_db)):
 async def update_item(
     item_id: int,
     item_update: ItemUpdate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Обновить элемент"""
-    db_item = db.query(Item).filter(Item.id == item_id).first()
+    db_item = await db.get(Item, item_id)
     if not db_item:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -59,20 +134,20 @@ async def update_item(
     for field, value in update_data.items():
         setattr(db_item, field, value)
     
-    db.commit()
-    db.refresh(db_item)
+    await db.commit()
+    await db.refresh(db_item)
     return db_item
 
 
 @router.delete("/items/{item_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_item(item_id: int, db: Session = Depends(get_db)):
+async def delete_item(item_id: int, db: AsyncSession = Depends(get_db)):
     """Удалить элемент"""
-    db_item = db.query(Item).filter(Item.id == item_id).first()
+    db_item = await db.get(Item, item_id)
     if not db_item:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Элемент с ID {item_id} не найден"
         )
-    db.delete(db_item)
-    db.commit()
+    await db.delete(db_item)
+    await db.commit()
     return None
@@ -1,37 +1,109 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
-from fastapi.responses import FileResponse
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status, UploadFile, File, Form
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import contains_eager
 from typing import List, Optional
-import os
-import shutil
-import uuid
 from pathlib import Path
-from app.database import get_db
-from app.models import Portfolio, User
-from app.schemas import PortfolioCreate, PortfolioUpdate, PortfolioResponse, PortfolioWithOwnerResponse
+from app.database import get_db, get_read_db
+from app.models import Portfolio, User, Tag, portfolio_tags
+from app.schemas import (
+    PortfolioCreate,
+    PortfolioUpdate,
+    PortfolioResponse,
+    PortfolioWithOwnerResponse,
+    PortfolioBatchRequest,
+    PortfolioBatchResponse,
+    PublicPortfolioPage,
+    TagFacet
+)
 from app.auth import get_current_active_user
+from app.cache import response_cache
+from app.responses import render_json, model_response
+from app.conditional import (
+    make_validators,
+    is_not_modified,
+    not_modified_response,
+    conditional_json_response
+)
+from app.storage import (
+    UPLOAD_ROOT,
+    ALLOWED_EXTENSIONS,
+    MAX_FILE_SIZE,
+    IMAGE_URL_PREFIX,
+    IMAGE_VARIANT_WIDTHS,
+    UploadTooLarge,
+    derivative_path,
+    has_derivatives,
+    is_valid_image_name,
+    legacy_path,
+    pick_variant_width,
+    save_upload,
+    upload_path
+)
+from app.images import derivative_queue
+from app.portfolio_batch import PORTFOLIO_BATCH_MAX, apply_portfolio_batch
+from app.tags import find_tag_ids, sync_portfolio_tags, tag_slug
+from app.pagination import encode_cursor, decode_cursor
+from app.file_responses import IMMUTABLE_CACHE_CONTROL, SHORT_CACHE_CONTROL, file_response, stat_file
+from app.query_budget import query_budget
 
 router = APIRouter()
 
-# Настройки для хранения файлов
-# Путь относительно корня backend
-BASE_DIR = Path(__file__).resolve().parent.parent.parent
-UPLOAD_DIR = BASE_DIR / "uploads" / "portfolio"
-UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
-ALLOWED_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".webp"}
-MAX_FILE_SIZE = 10 * 1024 * 1024  # 10 MB
+# Запас на заголовки multipart сверх самого файла
+MULTIPART_OVERHEAD = 64 * 1024
+# Предел тела запроса загрузки (BodySizeLimitMiddleware в main.py)
+UPLOAD_REQUEST_MAX = MAX_FILE_SIZE + MULTIPART_OVERHEAD
+
+# Проект виден всем: сам видим, владелец активен и с публичным профилем
+PUBLIC_PORTFOLIO = (
+    Portfolio.is_visible == True,
+    User.is_profile_public == True,
+    User.is_active == True
+)
+PUBLIC_PAGE_DEFAULT = 20
+PUBLIC_PAGE_MAX = 100
+TAG_FACETS_MAX = 200
+
+
+def upload_too_large() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"Файл слишком большой (максимум {MAX_FILE_SIZE // (1024 * 1024)} МБ)"
+    )
+
+
+async def stat_stored_file(path: Path):
+    """Файл в подкаталоге shard_prefix или, до миграции, в плоском каталоге.
+
+    scripts.shard_uploads удаляет старую ссылку не сразу после новой, поэтому
+    файл виден хотя бы в одном из мест, пока идет перенос.
+    """
+    for candidate in (path, legacy_path(path)):
+        file_stat = await stat_file(candidate)
+        if file_stat is not None:
+            return candidate, file_stat
+    return path, None
+
+
+def accel_path(path: Path) -> str:
+    """Путь для X-Accel-Redirect относительно каталога uploads"""
+    return path.relative_to(UPLOAD_ROOT).as_posix()
 
 
 @router.get("/portfolio", response_model=List[PortfolioResponse])
+@query_budget(2)
 async def get_my_portfolio(
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Получить портфолио текущего пользователя"""
-    portfolio_items = db.query(Portfolio).filter(
-        Portfolio.user_id == current_user.id
-    ).order_by(Portfolio.order_index, Portfolio.created_at).all()
-    return portfolio_items
+    result = await db.scalars(
+        select(Portfolio).where(
+            Portfolio.user_id == current_user.id
+        ).order_by(Portfolio.order_index, Portfolio.created_at)
+    )
+    return model_response(List[PortfolioResponse], result.all())
 
 
 @router.post("/portfolio/upload-image", status_code=status.HTTP_201_CREATED)
@@ -48,45 +120,64 @@ async def upload_portfolio_image(
             detail=f"Недопустимый формат файла. Разрешенные форматы: {', '.join(ALLOWED_EXTENSIONS)}"
         )
     
-    # Генерируем уникальное имя файла
-    file_id = str(uuid.uuid4())
-    filename = f"{file_id}{file_ext}"
-    file_path = UPLOAD_DIR / filename
-    
-    # Сохраняем файл
+    # Сохраняем файл потоково; имя - хеш содержимого, одинаковые изображения хранятся один раз
     try:
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        
-        # Возвращаем URL для доступа к файлу
-        image_url = f"/api/v1/portfolio/images/{filename}"
-        return {"image_url": image_url, "filename": filename}
+        stored = await save_upload(file, file_ext)
+    except UploadTooLarge:
+        raise upload_too_large()
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Ошибка при загрузке файла: {str(e)}"
         )
 
+    # Превью готовятся в фоне, до их готовности по ?w= отдается оригинал
+    if stored.created:
+        derivative_queue.schedule(stored.filename, stored.path)
+
+    # Возвращаем URL для доступа к файлу
+    image_url = f"{IMAGE_URL_PREFIX}{stored.filename}"
+    return {"image_url": image_url, "filename": stored.filename}
+
 
 @router.get("/portfolio/images/{filename}")
-async def get_portfolio_image(filename: str):
-    """Получить изображение портфолио"""
-    file_path = UPLOAD_DIR / filename
-    
-    if not file_path.exists():
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Изображение не найдено"
-        )
+async def get_portfolio_image(request: Request, filename: str, w: Optional[int] = Query(None, ge=1)):
+    """Получить изображение портфолио (w - желаемая ширина превью)"""
+    image_not_found = HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail="Изображение не найдено"
+    )
+    if not is_valid_image_name(filename):
+        raise image_not_found
+
+    file_path, file_stat = await stat_stored_file(upload_path(filename))
+    cache_control = IMMUTABLE_CACHE_CONTROL
+
+    if w is not None and IMAGE_VARIANT_WIDTHS and has_derivatives(filename):
+        variant_path, variant_stat = await stat_stored_file(derivative_path(filename, pick_variant_width(w)))
+        if variant_stat is not None:
+            return await file_response(
+                request, variant_path, variant_stat, IMMUTABLE_CACHE_CONTROL,
+                accel_path=accel_path(variant_path), media_type="image/webp"
+            )
+        if file_stat is not None:
+            # Превью еще нет: отдаем оригинал ненадолго и заказываем превью
+            derivative_queue.schedule(filename, file_path)
+            cache_control = SHORT_CACHE_CONTROL
     
-    return FileResponse(file_path)
+    if file_stat is None:
+        raise image_not_found
+
+    return await file_response(
+        request, file_path, file_stat, cache_control, accel_path=accel_path(file_path)
+    )
 
 
 @router.post("/portfolio", response_model=PortfolioResponse, status_code=status.HTTP_201_CREATED)
 async def create_portfolio_item(
     portfolio_data: PortfolioCreate,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Создать новый элемент портфолио"""
     db_item = Portfolio(
@@ -96,28 +187,203 @@ async def create_portfolio_item(
     # Сохранение в базу данных
     try:
         db.add(db_item)
-        db.commit()
-        db.refresh(db_item)
+        await db.flush()
+        await sync_portfolio_tags(db, {db_item.id: db_item.technologies})
+        await db.commit()
+        await db.refresh(db_item)
+        await response_cache.invalidate_user(current_user.id)
         return db_item
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Ошибка при сохранении проекта в базу данных: {str(e)}"
         )
 
 
+@router.post("/portfolio/batch", response_model=PortfolioBatchResponse)
+async def batch_portfolio_items(
+    batch: PortfolioBatchRequest,
+    atomic: bool = Query(False, description="Отменить весь пакет при любой ошибке"),
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Создать, изменить и удалить несколько элементов портфолио одной транзакцией"""
+    total = len(batch.create) + len(batch.update) + len(batch.delete)
+    if total > PORTFOLIO_BATCH_MAX:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Слишком много операций в пакете (максимум {PORTFOLIO_BATCH_MAX})"
+        )
+
+    try:
+        result = await apply_portfolio_batch(db, current_user.id, batch, atomic=atomic)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Ошибка при сохранении пакета в базу данных: {str(e)}"
+        )
+    if not result.applied:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=result.errors
+        )
+
+    if result.changed:
+        await response_cache.invalidate_user(current_user.id)
+    return model_response(PortfolioBatchResponse, {
+        "created": result.created,
+        "updated": result.updated,
+        "deleted": result.deleted,
+        "errors": result.errors
+    })
+
+
+def public_portfolio_data(item: Portfolio) -> dict:
+    """Проект с информацией о владельце; owner должен быть уже загружен"""
+    return {
+        "id": item.id,
+        "user_id": item.user_id,
+        "title": item.title,
+        "description": item.description,
+        "image_url": item.image_url,
+        "project_url": item.project_url,
+        "technologies": item.technologies,
+        "is_visible": item.is_visible,
+        "order_index": item.order_index,
+        "created_at": item.created_at,
+        "updated_at": item.updated_at,
+        "owner_username": item.owner.username,
+        "owner_full_name": item.owner.full_name
+    }
+
+
+def requested_tags(tags: List[str]) -> List[str]:
+    """Slug-и из ?tags=a&tags=b или ?tags=a,b"""
+    slugs = {tag_slug(part) for value in tags for part in value.split(",")}
+    slugs.discard("")
+    return sorted(slugs)
+
+
+def tagged_portfolio_ids(tag_ids: List[int], match_all: bool):
+    """id проектов с тегами - по индексу (tag_id, portfolio_id), без LIKE по technologies"""
+    query = select(portfolio_tags.c.portfolio_id).where(
+        portfolio_tags.c.tag_id.in_(tag_ids)
+    ).group_by(portfolio_tags.c.portfolio_id)
+    if match_all and len(tag_ids) > 1:
+        query = query.having(func.count() == len(tag_ids))
+    return query
+
+
+async def resolve_tag_filter(db: AsyncSession, tags: List[str], match: str):
+    """Подзапрос id проектов по фильтру тегов; None - фильтра нет, False - совпадений быть не может"""
+    slugs = requested_tags(tags)
+    if not slugs:
+        return None
+    tag_ids = list((await find_tag_ids(db, slugs)).values())
+    if not tag_ids or (match == "all" and len(tag_ids) < len(slugs)):
+        return False
+    return tagged_portfolio_ids(tag_ids, match == "all")
+
+
+@router.get("/portfolio/tags", response_model=List[TagFacet])
+@query_budget(1)
+async def get_tag_facets(
+    request: Request,
+    tags: List[str] = Query([], description="Посчитать теги среди проектов с этими тегами"),
+    match: str = Query("all", pattern="^(all|any)$"),
+    limit: int = Query(50, ge=1, le=TAG_FACETS_MAX),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Теги публичных проектов с количеством проектов, по убыванию"""
+    cache_key = f"portfolio:tags:{await response_cache.directory_generation()}:{match}:{limit}:{','.join(requested_tags(tags))}"
+    cached = await response_cache.get(cache_key)
+    if cached is not None:
+        return conditional_json_response(request, cached.body, cached.validators)
+
+    facets = []
+    tag_filter = await resolve_tag_filter(db, tags, match)
+    if tag_filter is not False:
+        count = func.count().label("count")
+        query = select(Tag.name, Tag.slug, count).join(
+            portfolio_tags, portfolio_tags.c.tag_id == Tag.id
+        ).join(
+            Portfolio, Portfolio.id == portfolio_tags.c.portfolio_id
+        ).join(Portfolio.owner).where(*PUBLIC_PORTFOLIO).group_by(
+            Tag.id, Tag.name, Tag.slug
+        ).order_by(count.desc(), Tag.slug).limit(limit)
+        if tag_filter is not None:
+            query = query.where(Portfolio.id.in_(tag_filter))
+        facets = [
+            {"name": name, "slug": slug, "count": count}
+            for name, slug, count in (await db.execute(query)).all()
+        ]
+
+    body = render_json(List[TagFacet], facets)
+    validators = make_validators("portfolio:tags", body)
+    await response_cache.set(cache_key, body, validators)
+    return conditional_json_response(request, body, validators)
+
+
+@router.get("/portfolio/public", response_model=PublicPortfolioPage)
+@query_budget(2)
+async def get_public_portfolio(
+    request: Request,
+    tags: List[str] = Query([], description="Теги (slug или имя), можно через запятую"),
+    match: str = Query("all", pattern="^(all|any)$"),
+    limit: int = Query(PUBLIC_PAGE_DEFAULT, ge=1, le=PUBLIC_PAGE_MAX),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Публичные проекты, отфильтрованные по тегам; новые сначала"""
+    cache_key = (
+        f"portfolio:public:{await response_cache.directory_generation()}:"
+        f"{match}:{limit}:{cursor or ''}:{','.join(requested_tags(tags))}"
+    )
+    cached = await response_cache.get(cache_key)
+    if cached is not None:
+        return conditional_json_response(request, cached.body, cached.validators)
+
+    items = []
+    next_cursor = None
+    tag_filter = await resolve_tag_filter(db, tags, match)
+    if tag_filter is not False:
+        query = select(Portfolio).join(Portfolio.owner).options(
+            contains_eager(Portfolio.owner)
+        ).where(*PUBLIC_PORTFOLIO).order_by(Portfolio.id.desc()).limit(limit + 1)
+        if tag_filter is not None:
+            query = query.where(Portfolio.id.in_(tag_filter))
+        if cursor:
+            (after_id,) = decode_cursor(cursor, int)
+            query = query.where(Portfolio.id < after_id)
+        items = (await db.scalars(query)).all()
+        if len(items) > limit:
+            items = items[:limit]
+            next_cursor = encode_cursor(items[-1].id)
+
+    body = render_json(PublicPortfolioPage, {
+        "items": [public_portfolio_data(item) for item in items],
+        "next_cursor": next_cursor
+    })
+    validators = make_validators("portfolio:public", body)
+    await response_cache.set(cache_key, body, validators)
+    return conditional_json_response(request, body, validators)
+
+
 @router.get("/portfolio/{item_id}", response_model=PortfolioResponse)
+@query_budget(2)
 async def get_portfolio_item(
     item_id: int,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Получить элемент портфолио по ID"""
-    db_item = db.query(Portfolio).filter(
-        Portfolio.id == item_id,
-        Portfolio.user_id == current_user.id
-    ).first()
+    db_item = await db.scalar(
+        select(Portfolio).where(
+            Portfolio.id == item_id,
+            Portfolio.user_id == current_user.id
+        )
+    )
     if not db_item:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -131,13 +397,15 @@ async def update_portfolio_item(
     item_id: int,
     portfolio_update: PortfolioUpdate,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Обновить элемент портфолио"""
-    db_item = db.query(Portfolio).filter(
-        Portfolio.id == item_id,
-        Portfolio.user_id == current_user.id
-    ).first()
+    db_item = await db.scalar(
+        select(Portfolio).where(
+            Portfolio.id == item_id,
+            Portfolio.user_id == current_user.id
+        )
+    )
     if not db_item:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -150,11 +418,14 @@ async def update_portfolio_item(
     
     # Сохранение изменений в базу данных
     try:
-        db.commit()
-        db.refresh(db_item)
+        if "technologies" in update_data:
+            await sync_portfolio_tags(db, {db_item.id: db_item.technologies})
+        await db.commit()
+        await db.refresh(db_item)
+        await response_cache.invalidate_user(current_user.id)
         return db_item
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Ошибка при обновлении проекта в базе данных: {str(e)}"
@@ -165,36 +436,33 @@ async def update_portfolio_item(
 async def delete_portfolio_item(
     item_id: int,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Удалить элемент портфолио"""
-    db_item = db.query(Portfolio).filter(
-        Portfolio.id == item_id,
-        Portfolio.user_id == current_user.id
-    ).first()
+    db_item = await db.scalar(
+        select(Portfolio).where(
+            Portfolio.id == item_id,
+            Portfolio.user_id == current_user.id
+        )
+    )
     if not db_item:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Элемент портфолио не найден"
         )
     
-    # Удаляем файл изображения, если он был загружен
-    if db_item.image_url and db_item.image_url.startswith("/api/v1/portfolio/images/"):
-        filename = db_item.image_url.split("/")[-1]
-        file_path = UPLOAD_DIR / filename
-        if file_path.exists():
-            try:
-                file_path.unlink()
-            except Exception:
-                pass  # Игнорируем ошибки при удалении
+    # Файл изображения не удаляется: одинаковые изображения хранятся одним
+    # файлом, и параллельная загрузка могла только что его переиспользовать.
+    # Файл без ссылок удалит сборщик мусора (app.upload_gc) после срока ожидания.
     
     # Удаление из базы данных
     try:
-        db.delete(db_item)
-        db.commit()
+        await db.delete(db_item)
+        await db.commit()
+        await response_cache.invalidate_user(current_user.id)
         return None
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Ошибка при удалении проекта из базы данных: {str(e)}"
@@ -202,17 +470,43 @@ async def delete_portfolio_item(
 
 
 @router.get("/portfolio/public/{item_id}", response_model=PortfolioWithOwnerResponse)
+@query_budget(2)
 async def get_public_portfolio_item(
+    request: Request,
     item_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Получить публичный элемент портфолио по ID (для просмотра проектов из публичных анкет)"""
-    db_item = db.query(Portfolio).join(User).filter(
-        Portfolio.id == item_id,
-        Portfolio.is_visible == True,
-        User.is_profile_public == True,
-        User.is_active == True
-    ).first()
+    # Ключ зависит от поколения владельца; пока владелец неизвестен, ответ не кэшируем,
+    # иначе поколение было бы прочитано уже после запроса к БД
+    cache_key = None
+    owner_id = await response_cache.portfolio_owner(item_id)
+    if owner_id is not None:
+        cache_key = f"portfolio:public:{item_id}:{await response_cache.user_generation(owner_id)}"
+        cached = await response_cache.get(cache_key)
+        if cached is not None:
+            return conditional_json_response(request, cached.body, cached.validators)
+
+    public_item = (Portfolio.id == item_id, *PUBLIC_PORTFOLIO)
+    # Валидаторы по updated_at проекта и владельца - без загрузки строк
+    stamps = (await db.execute(
+        select(Portfolio.updated_at, User.updated_at).join(Portfolio.owner).where(*public_item)
+    )).first()
+    if stamps is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Проект портфолио не найден или не доступен для публичного просмотра"
+        )
+    validators = make_validators("portfolio:public", item_id, updated_at=tuple(stamps))
+    if is_not_modified(request, validators):
+        return not_modified_response(validators)
+
+    # Владелец подгружается тем же JOIN, без отдельного запроса
+    db_item = await db.scalar(
+        select(Portfolio).join(Portfolio.owner).options(
+            contains_eager(Portfolio.owner)
+        ).where(*public_item)
+    )
     if not db_item:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -220,19 +514,9 @@ async def get_public_portfolio_item(
         )
     
     # Возвращаем проект с информацией о владельце
-    result = {
-        "id": db_item.id,
-        "user_id": db_item.user_id,
-        "title": db_item.title,
-        "description": db_item.description,
-        "image_url": db_item.image_url,
-        "project_url": db_item.project_url,
-        "technologies": db_item.technologies,
-        "is_visible": db_item.is_visible,
-        "order_index": db_item.order_index,
-        "created_at": db_item.created_at,
-        "updated_at": db_item.updated_at,
-        "owner_username": db_item.owner.username,
-        "owner_full_name": db_item.owner.full_name
-    }
-    return result
+    body = render_json(PortfolioWithOwnerResponse, public_portfolio_data(db_item))
+    if cache_key is not None:
+        await response_cache.set(cache_key, body, validators)
+    else:
+        await response_cache.remember_portfolio_owner(item_id, db_item.user_id)
+    return conditional_json_response(request, body, validators)
@@ -0,0 +1,106 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from sqlalchemy import and_, or_, select, tuple_, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import contains_eager
+from typing import Optional
+from app.database import get_read_db
+from app.models import Portfolio, User
+from app.schemas import SearchPage
+from app.pagination import encode_cursor, decode_cursor
+from app.cache import response_cache
+from app.responses import render_json
+from app.conditional import make_validators, conditional_json_response
+from app.search import profile_hits, project_hits, search_supported, search_terms
+from app.routers.portfolio import public_portfolio_data
+from app.query_budget import query_budget
+
+router = APIRouter()
+
+SEARCH_PAGE_DEFAULT = 20
+SEARCH_PAGE_MAX = 50
+
+
+@router.get("/search", response_model=SearchPage)
+@query_budget(3)
+async def search(
+    request: Request,
+    q: str = Query(..., min_length=1, max_length=200, description="Слова для поиска"),
+    type: str = Query("all", pattern="^(all|profiles|projects)$"),
+    limit: int = Query(SEARCH_PAGE_DEFAULT, ge=1, le=SEARCH_PAGE_MAX),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Полнотекстовый поиск по публичным профилям и проектам, по убыванию релевантности"""
+    if not search_supported():
+        raise HTTPException(
+            status_code=status.HTTP_501_NOT_IMPLEMENTED,
+            detail="Поиск не поддерживается для этой базы данных"
+        )
+    terms = search_terms(q)
+    cache_key = (
+        f"search:{await response_cache.directory_generation()}:"
+        f"{type}:{limit}:{cursor or ''}:{' '.join(terms)}"
+    )
+    cached = await response_cache.get(cache_key)
+    if cached is not None:
+        return conditional_json_response(request, cached.body, cached.validators)
+
+    hits = []
+    next_cursor = None
+    if terms:
+        parts = []
+        if type in ("all", "profiles"):
+            parts.append(profile_hits(terms))
+        if type in ("all", "projects"):
+            parts.append(project_hits(terms))
+        ranked = union_all(*parts).subquery() if len(parts) > 1 else parts[0].subquery()
+
+        # Keyset по (rank DESC, kind, id): порядок стабилен при равной релевантности
+        query = select(ranked.c.kind, ranked.c.id, ranked.c.rank).order_by(
+            ranked.c.rank.desc(), ranked.c.kind, ranked.c.id
+        ).limit(limit + 1)
+        if cursor:
+            after_rank, after_kind, after_id = decode_cursor(cursor, float, str, int)
+            query = query.where(or_(
+                ranked.c.rank < after_rank,
+                and_(
+                    ranked.c.rank == after_rank,
+                    tuple_(ranked.c.kind, ranked.c.id) > tuple_(after_kind, after_id)
+                )
+            ))
+        hits = (await db.execute(query)).all()
+        if len(hits) > limit:
+            hits = hits[:limit]
+            last = hits[-1]
+            next_cursor = encode_cursor(float(last.rank), last.kind, last.id)
+
+    profile_ids = [hit.id for hit in hits if hit.kind == "profile"]
+    project_ids = [hit.id for hit in hits if hit.kind == "project"]
+    profiles = {}
+    projects = {}
+    if profile_ids:
+        profiles = {user.id: user for user in await db.scalars(select(User).where(User.id.in_(profile_ids)))}
+    if project_ids:
+        projects = {
+            item.id: item for item in await db.scalars(
+                select(Portfolio).join(Portfolio.owner).options(
+                    contains_eager(Portfolio.owner)
+                ).where(Portfolio.id.in_(project_ids))
+            )
+        }
+
+    items = []
+    for hit in hits:
+        if hit.kind == "profile" and hit.id in profiles:
+            items.append({"type": "profile", "rank": hit.rank, "profile": profiles[hit.id]})
+        elif hit.kind == "project" and hit.id in projects:
+            items.append({
+                "type": "project",
+                "rank": hit.rank,
+                "project": public_portfolio_data(projects[hit.id])
+            })
+
+    body = render_json(SearchPage, {"items": items, "next_cursor": next_cursor})
+    validators = make_validators("search", body)
+    await response_cache.set(cache_key, body, validators)
+    return conditional_json_response(request, body, validators)
@@ -1,34 +1,59 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session, joinedload
-from typing import List
-from app.database import get_db
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from sqlalchemy import func, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from datetime import datetime, timedelta
+from typing import List, Optional, Union
+from app.database import get_db, get_read_db
 from app.models import User, Portfolio
-from app.schemas import UserResponse, UserUpdate, PublicProfileResponse, PortfolioResponse
-from app.auth import get_current_active_user, get_password_hash, get_user_by_email, get_user_by_username
+from app.schemas import UserResponse, UserUpdate, UserUpdateResponse, PublicProfileResponse, PublicProfilePage
+from app.pagination import encode_cursor, decode_cursor
+from app.cache import response_cache
+from app.responses import render_json, model_response
+from app.conditional import (
+    Validators,
+    make_validators,
+    is_not_modified,
+    not_modified_response,
+    conditional_json_response
+)
+from app.auth import (
+    ACCESS_TOKEN_EXPIRE_MINUTES,
+    create_access_token,
+    get_current_active_user,
+    get_password_hash,
+    get_user_by_email,
+    get_user_by_username,
+    token_claims,
+    token_version,
+    user_cache
+)
+from app.query_budget import query_budget
 
 router = APIRouter()
 
 
 @router.get("/me", response_model=UserResponse)
+@query_budget(1)
 async def get_current_user_info(
     current_user: User = Depends(get_current_active_user)
 ):
     """Получить информацию о текущем пользователе"""
-    return current_user
+    return model_response(UserResponse, current_user)
 
 
-@router.put("/me", response_model=UserResponse)
+@router.put("/me", response_model=UserUpdateResponse)
 async def update_current_user(
     user_update: UserUpdate,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Обновить информацию о текущем пользователе"""
     update_data = user_update.dict(exclude_unset=True)
     
     # Проверка уникальности email
     if "email" in update_data and update_data["email"] != current_user.email:
-        existing_user = get_user_by_email(db, email=update_data["email"])
+        existing_user = await get_user_by_email(db, email=update_data["email"])
         if existing_user:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -37,7 +62,7 @@ async def update_current_user(
     
     # Проверка уникальности username
     if "username" in update_data and update_data["username"] != current_user.username:
-        existing_user = get_user_by_username(db, username=update_data["username"])
+        existing_user = await get_user_by_username(db, username=update_data["username"])
         if existing_user:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -46,101 +71,207 @@ async def update_current_user(
     
     # Хеширование пароля, если он обновляется
     if "password" in update_data:
-        update_data["hashed_password"] = get_password_hash(update_data.pop("password"))
+        update_data["hashed_password"] = await get_password_hash(update_data.pop("password"))
+        # Новая версия пароля отзывает выданные токены (claim ver)
+        update_data["password_version"] = User.password_version + 1
     
+    previous_version = token_version(current_user)
+
+    # Пользователь мог прийти из кэша get_current_user - присоединяем к сессии без SELECT
+    current_user = await db.merge(current_user, load=False)
+
     # Обновление полей
     for field, value in update_data.items():
         setattr(current_user, field, value)
     
     # Сохранение изменений в базе данных
     try:
-        db.commit()
-        db.refresh(current_user)
-        return current_user
+        await db.commit()
+        await db.refresh(current_user)
+        # Снимок в кэше устарел; при смене username/пароля старые токены не пройдут проверку ver
+        user_cache.invalidate(current_user.id)
+        await response_cache.invalidate_user(current_user.id)
+        response = UserUpdateResponse.model_validate(current_user)
+        if token_version(current_user) != previous_version:
+            # Токен текущей сессии отозван вместе с остальными - выдаем новый
+            response.access_token = create_access_token(
+                data=token_claims(current_user),
+                expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+            )
+            response.token_type = "bearer"
+        return response
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Ошибка при сохранении данных в базу: {str(e)}"
         )
 
 
-@router.get("/public", response_model=List[PublicProfileResponse])
-async def get_public_profiles(
-    db: Session = Depends(get_db)
-):
-    """Получить список публичных профилей пользователей с портфолио"""
-    # Получаем пользователей с публичными профилями и их портфолио
-    users = db.query(User).filter(
+# Видимые проекты фильтруются и сортируются (order_index, created_at) в SQL
+VISIBLE_PORTFOLIO = selectinload(User.portfolio_items.and_(Portfolio.is_visible == True))
+PUBLIC_PAGE_DEFAULT = 20
+PUBLIC_PAGE_MAX = 100
+
+
+def public_profile_data(user: User) -> dict:
+    """Данные публичного профиля; portfolio_items уже отфильтрованы VISIBLE_PORTFOLIO"""
+    return {
+        "id": user.id,
+        "username": user.username,
+        "full_name": user.full_name,
+        "email": user.email if user.show_email_in_profile else None,
+        "telegram": user.telegram,
+        "phone": user.phone,
+        "portfolio_items": user.portfolio_items,
+        "created_at": user.created_at
+    }
+
+
+def public_users_page(columns, limit: int, cursor: Optional[str]):
+    """Запрос страницы каталога (limit + 1 строка, чтобы понять, есть ли следующая)"""
+    query = select(*columns).where(
         User.is_profile_public == True,
         User.is_active == True
-    ).options(
-        joinedload(User.portfolio_items)
-    ).all()
-    
-    # Формируем ответ с видимыми проектами портфолио
-    result = []
-    for user in users:
-        # Фильтруем только видимые проекты портфолио
-        visible_portfolio = [
-            item for item in user.portfolio_items 
-            if item.is_visible
-        ]
-        # Сортируем по order_index
-        visible_portfolio.sort(key=lambda x: x.order_index)
-        
-        # Создаем объект профиля
-        profile_data = {
-            "id": user.id,
-            "username": user.username,
-            "full_name": user.full_name,
-            "email": user.email if user.show_email_in_profile else None,
-            "telegram": user.telegram,
-            "phone": user.phone,
-            "portfolio_items": visible_portfolio,
-            "created_at": user.created_at
-        }
-        result.append(profile_data)
-    
-    return result
+    ).order_by(User.created_at, User.id).limit(limit + 1)
+    if cursor:
+        after_created_at, after_id = decode_cursor(cursor, datetime, int)
+        query = query.where(tuple_(User.created_at, User.id) > tuple_(after_created_at, after_id))
+    return query
+
+
+async def public_page_validators(
+    db: AsyncSession, limit: int, cursor: Optional[str], paged: bool
+) -> Validators:
+    """Валидаторы страницы каталога одним агрегатом, без загрузки строк"""
+    page = public_users_page((User.id, User.updated_at), limit, cursor).subquery()
+    row = (await db.execute(
+        select(
+            func.count(page.c.id.distinct()),
+            func.sum(page.c.id.distinct()),
+            func.max(page.c.updated_at),
+            func.count(Portfolio.id),
+            func.max(Portfolio.updated_at)
+        ).select_from(page).outerjoin(
+            Portfolio,
+            (Portfolio.user_id == page.c.id) & (Portfolio.is_visible == True)
+        )
+    )).one()
+    users_count, users_id_sum, users_updated_at, items_count, items_updated_at = row
+    return make_validators(
+        "users:public", paged, limit, cursor, users_count, users_id_sum, items_count,
+        updated_at=(users_updated_at, items_updated_at)
+    )
+
+
+async def public_profile_validators(db: AsyncSession, user_id: int) -> Optional[Validators]:
+    """Валидаторы публичного профиля; None, если профиль не публичный"""
+    row = (await db.execute(
+        select(
+            User.updated_at,
+            func.count(Portfolio.id),
+            func.max(Portfolio.updated_at)
+        ).outerjoin(
+            Portfolio,
+            (Portfolio.user_id == User.id) & (Portfolio.is_visible == True)
+        ).where(
+            User.id == user_id,
+            User.is_profile_public == True,
+            User.is_active == True
+        ).group_by(User.id, User.updated_at)
+    )).first()
+    if row is None:
+        return None
+    user_updated_at, items_count, items_updated_at = row
+    return make_validators(
+        "users:public", user_id, items_count,
+        updated_at=(user_updated_at, items_updated_at)
+    )
+
+
+@router.get("/public", response_model=Union[List[PublicProfileResponse], PublicProfilePage])
+@query_budget(3)
+async def get_public_profiles(
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=PUBLIC_PAGE_MAX),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Получить публичные профили пользователей с портфолио"""
+    # Без limit/cursor - прежний список (первые PUBLIC_PAGE_MAX), иначе страница {items, next_cursor}
+    paged = limit is not None or cursor is not None
+    if limit is None:
+        limit = PUBLIC_PAGE_DEFAULT if paged else PUBLIC_PAGE_MAX
+
+    # Поколение читаем до запроса, чтобы не закэшировать устаревшие данные под новым ключом
+    generation = await response_cache.directory_generation()
+    cache_key = f"users:public:{generation}:{int(paged)}:{limit}:{cursor or ''}"
+    cached = await response_cache.get(cache_key)
+    if cached is not None:
+        return conditional_json_response(request, cached.body, cached.validators)
+
+    validators = await public_page_validators(db, limit, cursor, paged)
+    if is_not_modified(request, validators):
+        return not_modified_response(validators)
+
+    # Keyset-пагинация по (created_at, id): два запроса на страницу при любой глубине
+    result = await db.scalars(
+        public_users_page((User,), limit, cursor).options(VISIBLE_PORTFOLIO)
+    )
+    users = result.all()
+
+    next_cursor = None
+    if len(users) > limit:
+        users = users[:limit]
+        next_cursor = encode_cursor(users[-1].created_at, users[-1].id)
+
+    items = [public_profile_data(user) for user in users]
+    if paged:
+        body = render_json(PublicProfilePage, {"items": items, "next_cursor": next_cursor})
+    else:
+        body = render_json(List[PublicProfileResponse], items)
+    await response_cache.set(cache_key, body, validators)
+    return conditional_json_response(request, body, validators)
 
 
 @router.get("/public/{user_id}", response_model=PublicProfileResponse)
+@query_budget(3)
 async def get_public_profile(
+    request: Request,
     user_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Получить публичный профиль конкретного пользователя"""
-    user = db.query(User).options(
-        joinedload(User.portfolio_items)
-    ).filter(
-        User.id == user_id,
-        User.is_profile_public == True,
-        User.is_active == True
-    ).first()
+    cache_key = f"users:public:{user_id}:{await response_cache.user_generation(user_id)}"
+    cached = await response_cache.get(cache_key)
+    if cached is not None:
+        return conditional_json_response(request, cached.body, cached.validators)
+
+    validators = await public_profile_validators(db, user_id)
+    if validators is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Публичный профиль не найден"
+        )
+    if is_not_modified(request, validators):
+        return not_modified_response(validators)
+
+    user = await db.scalar(
+        select(User).options(
+            VISIBLE_PORTFOLIO
+        ).where(
+            User.id == user_id,
+            User.is_profile_public == True,
+            User.is_active == True
+        )
+    )
     
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Публичный профиль не найден"
         )
-    
-    # Фильтруем только видимые проекты портфолио
-    visible_portfolio = [
-        item for item in user.portfolio_items 
-        if item.is_visible
-    ]
-    visible_portfolio.sort(key=lambda x: x.order_index)
-    
-    return {
-        "id": user.id,
-        "username": user.username,
-        "full_name": user.full_name,
-        "email": user.email if user.show_email_in_profile else None,
-        "telegram": user.telegram,
-        "phone": user.phone,
-        "portfolio_items": visible_portfolio,
-        "created_at": user.created_at
-    }
-
 
+    body = render_json(PublicProfileResponse, public_profile_data(user))
+    await response_cache.set(cache_key, body, validators)
+    return conditional_json_response(request, body, validators)
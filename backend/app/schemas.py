@@ -1,6 +1,7 @@
-from pydantic import BaseModel, EmailStr, Field, field_validator, ValidationError
+from pydantic import BaseModel, EmailStr, Field, computed_field, field_validator, ValidationError
 from datetime import datetime
-from typing import Optional, List
+from typing import Any, Optional, List, Union
+from app.images import variant_urls
 
 
 # User Schemas
@@ -39,6 +40,12 @@ class UserResponse(UserBase):
         from_attributes = True
 
 
+class UserUpdateResponse(UserResponse):
+    # Новый токен, если смена пароля или username отозвала текущий (claim ver)
+    access_token: Optional[str] = None
+    token_type: Optional[str] = None
+
+
 # Auth Schemas
 class Token(BaseModel):
     access_token: str
@@ -79,12 +86,25 @@ class PortfolioUpdate(BaseModel):
     order_index: Optional[int] = None
 
 
+class ImageVariant(BaseModel):
+    """Уменьшенная WebP-копия изображения"""
+    width: int
+    url: str
+
+
 class PortfolioResponse(PortfolioBase):
     id: int
     user_id: int
     created_at: datetime
     updated_at: datetime
 
+    @computed_field
+    @property
+    def image_variants(self) -> List[ImageVariant]:
+        """Превью по ширинам; пока превью не готово, по URL отдается оригинал"""
+        # Значения формирует сервер, валидация не нужна (вызывается для каждой строки списка)
+        return [ImageVariant.model_construct(**variant) for variant in variant_urls(self.image_url)]
+
     class Config:
         from_attributes = True
 
@@ -98,6 +118,71 @@ class PortfolioWithOwnerResponse(PortfolioResponse):
         from_attributes = True
 
 
+class PortfolioBatchUpdate(PortfolioUpdate):
+    """Изменение элемента портфолио в пакете"""
+    id: int
+
+
+class PortfolioBatchRequest(BaseModel):
+    """Пакет операций над портфолио текущего пользователя"""
+    create: List[PortfolioCreate] = []
+    update: List[PortfolioBatchUpdate] = []
+    delete: List[int] = []
+
+
+class PortfolioBatchError(BaseModel):
+    """Ошибка отдельной операции пакета (index - позиция в своем списке)"""
+    operation: str
+    index: int
+    id: Optional[int] = None
+    detail: Union[str, List[Any]]
+
+
+class PortfolioBatchResponse(BaseModel):
+    """Результат пакета: созданные элементы, id измененных и удаленных, ошибки"""
+    created: List[PortfolioResponse] = []
+    updated: List[int] = []
+    deleted: List[int] = []
+    errors: List[PortfolioBatchError] = []
+
+
+class PublicPortfolioPage(BaseModel):
+    """Страница публичных проектов (поиск по тегам)"""
+    items: List[PortfolioWithOwnerResponse] = []
+    next_cursor: Optional[str] = None
+
+
+class TagFacet(BaseModel):
+    """Тег и число публичных проектов с ним"""
+    name: str
+    slug: str
+    count: int
+
+
+class SearchProfile(BaseModel):
+    """Краткие данные профиля в результатах поиска"""
+    id: int
+    username: str
+    full_name: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
+
+class SearchHit(BaseModel):
+    """Результат поиска: профиль или проект (заполнено одно из полей)"""
+    type: str
+    rank: float
+    profile: Optional[SearchProfile] = None
+    project: Optional[PortfolioWithOwnerResponse] = None
+
+
+class SearchPage(BaseModel):
+    """Страница результатов поиска, по убыванию релевантности"""
+    items: List[SearchHit] = []
+    next_cursor: Optional[str] = None
+
+
 class PublicProfileResponse(BaseModel):
     """Схема для публичного профиля пользователя"""
     id: int
@@ -113,6 +198,12 @@ class PublicProfileResponse(BaseModel):
         from_attributes = True
 
 
+class PublicProfilePage(BaseModel):
+    """Страница каталога публичных профилей"""
+    items: List[PublicProfileResponse] = []
+    next_cursor: Optional[str] = None
+
+
 # Item Schemas (existing)
 class ItemBase(BaseModel):
     title: str
@@ -137,3 +228,10 @@ class ItemResponse(ItemBase):
 
     class Config:
         from_attributes = True
+
+
+class ItemPage(BaseModel):
+    """Страница элементов по возрастанию id; estimated_total - оценка, только на первой странице"""
+    items: List[ItemResponse] = []
+    next_cursor: Optional[str] = None
+    estimated_total: Optional[int] = None
@@ -0,0 +1,82 @@
+import re
+from typing import List
+from sqlalchemy import column, func, literal, literal_column, select, table
+from app.database import engine
+from app.models import Portfolio, User
+
+SEARCH_MAX_TERMS = 8
+SEARCH_TERM_MAX_LENGTH = 64
+TERM_RE = re.compile(r"[^\W_]+", re.UNICODE)
+
+users_fts = table("users_fts", column("rowid"))
+portfolio_fts = table("portfolio_fts", column("rowid"))
+
+
+def search_terms(query: str) -> List[str]:
+    """Слова запроса без операторов: в tsquery/FTS5 попадают только буквы и цифры"""
+    terms = []
+    for term in TERM_RE.findall(query.lower()):
+        # Сначала обрезка, потом проверка повтора: длинные слова с общим началом совпадают
+        term = term[:SEARCH_TERM_MAX_LENGTH]
+        if term not in terms:
+            terms.append(term)
+            if len(terms) == SEARCH_MAX_TERMS:
+                break
+    return terms
+
+
+def _postgres_query(terms: List[str]):
+    # Все слова обязательны, последнее - как префикс (поиск по мере ввода)
+    text = " & ".join(terms[:-1] + [f"{terms[-1]}:*"])
+    return func.to_tsquery(literal_column("'russian'::regconfig"), text)
+
+
+def _fts5_query(terms: List[str]) -> str:
+    return " ".join([f'"{term}"' for term in terms[:-1]] + [f'"{terms[-1]}"*'])
+
+
+def profile_hits(terms: List[str]):
+    """Публичные активные профили: (kind, id, rank), больший rank - лучше"""
+    public = (User.is_profile_public == True, User.is_active == True)
+    if engine.dialect.name == "postgresql":
+        vector = literal_column("users.search_vector")
+        tsquery = _postgres_query(terms)
+        return select(
+            literal("profile").label("kind"),
+            User.id.label("id"),
+            func.ts_rank_cd(vector, tsquery).label("rank")
+        ).where(vector.op("@@")(tsquery), *public)
+    return select(
+        literal("profile").label("kind"),
+        User.id.label("id"),
+        (-func.bm25(literal_column("users_fts"), 2.0, 1.0)).label("rank")
+    ).select_from(users_fts).join(User, User.id == users_fts.c.rowid).where(
+        literal_column("users_fts").op("MATCH")(_fts5_query(terms)), *public
+    )
+
+
+def project_hits(terms: List[str]):
+    """Видимые проекты публичных профилей: (kind, id, rank)"""
+    public = (Portfolio.is_visible == True, User.is_profile_public == True, User.is_active == True)
+    if engine.dialect.name == "postgresql":
+        vector = literal_column("portfolio.search_vector")
+        tsquery = _postgres_query(terms)
+        return select(
+            literal("project").label("kind"),
+            Portfolio.id.label("id"),
+            func.ts_rank_cd(vector, tsquery).label("rank")
+        ).join(Portfolio.owner).where(vector.op("@@")(tsquery), *public)
+    # Веса колонок как в setweight для PostgreSQL: title > technologies > description
+    return select(
+        literal("project").label("kind"),
+        Portfolio.id.label("id"),
+        (-func.bm25(literal_column("portfolio_fts"), 10.0, 4.0, 1.0)).label("rank")
+    ).select_from(portfolio_fts).join(Portfolio, Portfolio.id == portfolio_fts.c.rowid).join(
+        Portfolio.owner
+    ).where(
+        literal_column("portfolio_fts").op("MATCH")(_fts5_query(terms)), *public
+    )
+
+
+def search_supported() -> bool:
+    return engine.dialect.name in ("postgresql", "sqlite")
@@ -0,0 +1,189 @@
+import hashlib
+import os
+import re
+import tempfile
+from pathlib import Path
+from typing import NamedTuple
+from fastapi import UploadFile
+from starlette.concurrency import run_in_threadpool
+from dotenv import load_dotenv
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow не установлен - анимация не определяется, превью не делаются
+    Image = None
+
+load_dotenv()
+
+# Настройки для хранения файлов
+# Путь относительно корня backend (UPLOAD_ROOT позволяет вынести файлы, например для бенчмарков)
+BASE_DIR = Path(__file__).resolve().parent.parent
+UPLOAD_ROOT = Path(os.getenv("UPLOAD_ROOT", str(BASE_DIR / "uploads")))
+UPLOAD_DIR = UPLOAD_ROOT / "portfolio"
+UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+ALLOWED_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".webp"}
+MAX_FILE_SIZE = 10 * 1024 * 1024  # 10 MB
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+IMAGE_URL_PREFIX = "/api/v1/portfolio/images/"
+
+# Имена загруженных файлов: sha256 или uuid и разрешенное расширение
+IMAGE_NAME_RE = re.compile(r"^[A-Za-z0-9_-]{1,128}\.(?:jpg|jpeg|png|gif|webp)$")
+
+
+def is_valid_image_name(filename: str) -> bool:
+    """Проверка имени без обращения к диску: отсекает ../, слэши и чужие расширения"""
+    return IMAGE_NAME_RE.match(filename) is not None
+
+
+# Уменьшенные WebP-копии изображений (превью для анкет и профилей)
+DERIVATIVE_DIR = UPLOAD_ROOT / "derivatives"
+DERIVATIVE_DIR.mkdir(parents=True, exist_ok=True)
+IMAGE_VARIANT_WIDTHS = sorted(
+    int(width) for width in os.getenv("IMAGE_VARIANT_WIDTHS", "320,640,1280").split(",") if width.strip()
+)
+
+
+# Форматы, для которых делаются WebP-копии: GIF и анимацию не пережимаем
+DERIVATIVE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp"}
+# Анимированные PNG/WebP хранятся как <sha256>-anim.<расширение>: превью для них нет
+ANIMATED_SUFFIX = "-anim"
+
+
+def has_derivatives(filename: str) -> bool:
+    """Делаются ли для изображения WebP-копии (по имени, без обращения к диску)"""
+    path = Path(filename)
+    return path.suffix.lower() in DERIVATIVE_EXTENSIONS and not path.stem.endswith(ANIMATED_SUFFIX)
+
+
+# WebP-копия: основа имени оригинала и ширина
+DERIVATIVE_NAME_RE = re.compile(r"^(?P<stem>.+)-w\d+\.webp$")
+
+
+def derivative_name(filename: str, width: int) -> str:
+    """Имя WebP-копии изображения заданной ширины"""
+    return f"{Path(filename).stem}-w{width}.webp"
+
+
+def shard_prefix(filename: str) -> str:
+    """Два уровня каталогов "ab/cd" по sha256 основы имени.
+
+    Оригинал и его WebP-копии попадают в одинаковые подкаталоги UPLOAD_DIR и
+    DERIVATIVE_DIR. URL не меняются: /portfolio/images/{filename}.
+    """
+    digest = hashlib.sha256(Path(filename).stem.encode("utf-8")).hexdigest()
+    return f"{digest[:2]}/{digest[2:4]}"
+
+
+def upload_path(filename: str, directory: Path = UPLOAD_DIR) -> Path:
+    return directory / shard_prefix(filename) / filename
+
+
+def derivative_path(filename: str, width: int) -> Path:
+    """Путь WebP-копии по имени оригинала"""
+    return DERIVATIVE_DIR / shard_prefix(filename) / derivative_name(filename, width)
+
+
+def legacy_path(path: Path) -> Path:
+    """Прежнее место файла - плоский каталог (до scripts.shard_uploads)"""
+    return path.parent.parent.parent / path.name
+
+
+def remove_stored_image(filename: str):
+    """Удалить оригинал и WebP-копии в обеих раскладках (синхронно, для пула потоков)"""
+    original = upload_path(filename)
+    paths = [original, legacy_path(original)]
+    for width in IMAGE_VARIANT_WIDTHS:
+        variant = derivative_path(filename, width)
+        paths += [variant, legacy_path(variant)]
+    for path in paths:
+        try:
+            path.unlink(missing_ok=True)
+        except OSError:
+            pass  # Игнорируем ошибки при удалении
+
+
+def pick_variant_width(requested: int) -> int:
+    """Наименьшая настроенная ширина, не меньше запрошенной"""
+    for width in IMAGE_VARIANT_WIDTHS:
+        if width >= requested:
+            return width
+    return IMAGE_VARIANT_WIDTHS[-1]
+
+
+class UploadTooLarge(Exception):
+    """Файл превысил допустимый размер"""
+
+
+class StoredFile(NamedTuple):
+    filename: str
+    size: int
+    created: bool  # False - такой файл уже был, загрузка дедуплицирована
+    path: Path
+
+
+def _write_chunk(buffer, hasher, chunk: bytes):
+    # hashlib отпускает GIL на больших буферах, поэтому хешируем в том же потоке
+    hasher.update(chunk)
+    buffer.write(chunk)
+
+
+def _is_animated(path: str) -> bool:
+    """Анимированный PNG (APNG) или WebP; без Pillow или для битого файла - False"""
+    if Image is None:
+        return False
+    try:
+        with Image.open(path) as image:
+            return bool(getattr(image, "is_animated", False))
+    except Exception:
+        return False
+
+
+def _commit_file(tmp_path: str, target: Path) -> bool:
+    """Атомарно переместить временный файл на место, если такого содержимого еще нет"""
+    for existing in (target, legacy_path(target)):
+        if existing.exists():
+            os.unlink(tmp_path)
+            # Освежаем mtime, чтобы сборщик мусора не удалил файл до привязки к проекту
+            os.utime(existing)
+            return False
+    target.parent.mkdir(parents=True, exist_ok=True)
+    os.chmod(tmp_path, 0o644)
+    os.replace(tmp_path, target)
+    return True
+
+
+async def save_upload(
+    upload: UploadFile,
+    extension: str,
+    max_size: int = MAX_FILE_SIZE,
+    directory: Path = UPLOAD_DIR
+) -> StoredFile:
+    """Потоково сохранить загрузку под именем sha256 содержимого (в подкаталог shard_prefix).
+
+    Файл пишется во временный файл в том же каталоге и переименовывается
+    только целиком; при превышении max_size запись прерывается сразу.
+    """
+    hasher = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".upload-", suffix=extension)
+    try:
+        with os.fdopen(fd, "wb") as buffer:
+            while True:
+                chunk = await upload.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_size:
+                    raise UploadTooLarge()
+                await run_in_threadpool(_write_chunk, buffer, hasher, chunk)
+        stem = hasher.hexdigest()
+        if extension in (".png", ".webp") and await run_in_threadpool(_is_animated, tmp_path):
+            stem += ANIMATED_SUFFIX
+        filename = f"{stem}{extension}"
+        target = upload_path(filename, directory)
+        created = await run_in_threadpool(_commit_file, tmp_path, target)
+        return StoredFile(filename, size, created, target)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
@@ -0,0 +1,79 @@
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy import delete, insert, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from app.database import engine
+from app.models import Tag, portfolio_tags
+
+TAG_MAX_LENGTH = 100
+
+
+def tag_slug(name: str) -> str:
+    """Нормализованное имя тега: React, react и ' REACT ' - один тег"""
+    return " ".join(name.split()).lower()[:TAG_MAX_LENGTH]
+
+
+def parse_tags(technologies: Optional[str]) -> Dict[str, str]:
+    """Разобрать строку technologies в {slug: имя} без повторов, в исходном порядке"""
+    tags: Dict[str, str] = {}
+    for part in (technologies or "").split(","):
+        name = " ".join(part.split())[:TAG_MAX_LENGTH]
+        if name:
+            tags.setdefault(tag_slug(name), name)
+    return tags
+
+
+def _insert_ignore_conflicts():
+    """INSERT ... ON CONFLICT DO NOTHING для текущего диалекта"""
+    if engine.dialect.name == "postgresql":
+        return pg_insert(Tag).on_conflict_do_nothing(index_elements=[Tag.slug])
+    if engine.dialect.name == "sqlite":
+        return sqlite_insert(Tag).on_conflict_do_nothing(index_elements=[Tag.slug])
+    return insert(Tag)
+
+
+async def resolve_tag_ids(db, tags: Dict[str, str]) -> Dict[str, int]:
+    """id тегов по slug; недостающие создаются (параллельные вставки не конфликтуют)"""
+    if not tags:
+        return {}
+    query = select(Tag.slug, Tag.id).where(Tag.slug.in_(list(tags)))
+    ids = dict((await db.execute(query)).all())
+    missing = [{"slug": slug, "name": name} for slug, name in tags.items() if slug not in ids]
+    if missing:
+        await db.execute(_insert_ignore_conflicts(), missing)
+        ids = dict((await db.execute(query)).all())
+    return ids
+
+
+async def find_tag_ids(db, slugs: Iterable[str]) -> Dict[str, int]:
+    """id существующих тегов по slug, без создания"""
+    slugs = list(slugs)
+    if not slugs:
+        return {}
+    return dict((await db.execute(select(Tag.slug, Tag.id).where(Tag.slug.in_(slugs)))).all())
+
+
+async def sync_portfolio_tags(db, technologies_by_id: Dict[int, Optional[str]]):
+    """Перестроить связи проектов с тегами по их строкам technologies.
+
+    Выполняется в транзакции записи проектов, до commit; на пакет -
+    несколько запросов независимо от числа проектов.
+    """
+    if not technologies_by_id:
+        return
+    parsed = {item_id: parse_tags(technologies) for item_id, technologies in technologies_by_id.items()}
+    all_tags: Dict[str, str] = {}
+    for tags in parsed.values():
+        for slug, name in tags.items():
+            all_tags.setdefault(slug, name)
+    tag_ids = await resolve_tag_ids(db, all_tags)
+
+    item_ids: List[int] = list(parsed)
+    await db.execute(delete(portfolio_tags).where(portfolio_tags.c.portfolio_id.in_(item_ids)))
+    links = [
+        {"portfolio_id": item_id, "tag_id": tag_ids[slug]}
+        for item_id, tags in parsed.items()
+        for slug in tags
+    ]
+    if links:
+        await db.execute(insert(portfolio_tags), links)
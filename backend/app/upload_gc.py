@@ -0,0 +1,236 @@
+"""Сборка мусора в каталоге загрузок: файлы без проекта старше UPLOAD_GC_GRACE_SECONDS"""
+import asyncio
+import fcntl
+import os
+import re
+import time
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+from dotenv import load_dotenv
+from sqlalchemy import select
+from starlette.concurrency import run_in_threadpool
+from app.database import primary_session
+from app.models import Portfolio
+from app.storage import (
+    ALLOWED_EXTENSIONS,
+    DERIVATIVE_DIR,
+    DERIVATIVE_NAME_RE,
+    IMAGE_URL_PREFIX,
+    UPLOAD_DIR,
+    UPLOAD_ROOT,
+    is_valid_image_name,
+    legacy_path,
+    remove_stored_image,
+    upload_path
+)
+
+load_dotenv()
+
+# Файл моложе этого срока мог только что попасть в проект; повторная загрузка освежает mtime
+UPLOAD_GC_GRACE_SECONDS = int(os.getenv("UPLOAD_GC_GRACE_SECONDS", str(24 * 3600)))
+# 0 - периодическая сборка в приложении выключена (только CLI); serve.py ставит 3600
+UPLOAD_GC_INTERVAL_SECONDS = int(os.getenv("UPLOAD_GC_INTERVAL_SECONDS", "0"))
+# Не больше 999 параметров в IN (...) - предел старых SQLite
+UPLOAD_GC_BATCH = int(os.getenv("UPLOAD_GC_BATCH", "900"))
+
+LOCK_PATH = UPLOAD_ROOT / ".upload-gc.lock"
+# Подкаталоги shard_prefix: два уровня по два hex-символа
+SHARD_DIR_RE = re.compile(r"^[0-9a-f]{2}$")
+
+
+@dataclass
+class GCStats:
+    scanned: int = 0
+    referenced: int = 0
+    orphaned: int = 0
+    deleted: int = 0
+    freed_bytes: int = 0
+    derivatives_deleted: int = 0
+    temp_deleted: int = 0
+    dry_run: bool = False
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+def is_temp_name(name: str) -> bool:
+    """Временные файлы save_upload и render_derivatives"""
+    return name.startswith(".upload-") or (name.startswith(".") and name.endswith(".tmp"))
+
+
+def _shard_dirs(directory) -> Iterator[str]:
+    """Сам каталог (файлы до миграции, временные файлы) и его подкаталоги ab/cd"""
+    yield directory
+    with os.scandir(directory) as first_level:
+        for first in first_level:
+            if not (SHARD_DIR_RE.match(first.name) and first.is_dir(follow_symlinks=False)):
+                continue
+            with os.scandir(first.path) as second_level:
+                for second in second_level:
+                    if SHARD_DIR_RE.match(second.name) and second.is_dir(follow_symlinks=False):
+                        yield second.path
+
+
+def scan_batches(directory, cutoff: float, batch_size: int) -> Iterator[List[Tuple[Path, int]]]:
+    """Пачки (путь, размер) обычных файлов каталога и его шардов, не изменявшихся с cutoff"""
+    batch = []
+    for path in _shard_dirs(directory):
+        with os.scandir(path) as entries:
+            for entry in entries:
+                try:
+                    if not entry.is_file(follow_symlinks=False):
+                        continue
+                    stat = entry.stat(follow_symlinks=False)
+                except FileNotFoundError:
+                    continue
+                if stat.st_mtime >= cutoff:
+                    continue
+                batch.append((Path(entry.path), stat.st_size))
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+    if batch:
+        yield batch
+
+
+def _next_batch(scanner: Iterator) -> Optional[list]:
+    return next(scanner, None)
+
+
+def _unlink_if_older(path, cutoff: float) -> bool:
+    """Удалить файл, если он так и не был освежен; False - файл уже новый или исчез"""
+    try:
+        if path.stat().st_mtime >= cutoff:
+            return False
+        path.unlink()
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def _delete_orphans(files: List[Tuple[Path, int]], cutoff: float, stats: GCStats):
+    for path, size in files:
+        if not _unlink_if_older(path, cutoff):
+            continue
+        stats.deleted += 1
+        stats.freed_bytes += size
+        # Копии и вторая ссылка на оригинал, если перенос в шарды еще не закончен
+        remove_stored_image(path.name)
+
+
+def _original_exists(stem: str) -> bool:
+    for extension in ALLOWED_EXTENSIONS:
+        original = upload_path(f"{stem}{extension}")
+        if original.exists() or legacy_path(original).exists():
+            return True
+    return False
+
+
+def _sweep_derivatives(cutoff: float, batch_size: int, dry_run: bool, stats: GCStats):
+    """WebP-копии без оригинала (оригинал удален не сборщиком или сменились ширины) и их временные файлы"""
+    for batch in scan_batches(DERIVATIVE_DIR, cutoff, batch_size):
+        for path, size in batch:
+            if not is_temp_name(path.name):
+                match = DERIVATIVE_NAME_RE.match(path.name)
+                if match and _original_exists(match.group("stem")):
+                    continue
+            if dry_run or _unlink_if_older(path, cutoff):
+                stats.derivatives_deleted += 1
+                stats.freed_bytes += size
+
+
+async def collect_upload_garbage(
+    db,
+    grace_seconds: int = UPLOAD_GC_GRACE_SECONDS,
+    batch_size: int = UPLOAD_GC_BATCH,
+    dry_run: bool = False
+) -> GCStats:
+    """Удалить (или при dry_run - только посчитать) файлы без ссылок из Portfolio.image_url.
+
+    db должна читать с основной БД: реплика может еще не знать о свежей ссылке.
+    """
+    stats = GCStats(dry_run=dry_run)
+    cutoff = time.time() - grace_seconds
+    scanner = scan_batches(UPLOAD_DIR, cutoff, batch_size)
+    try:
+        await _collect_batches(db, scanner, cutoff, dry_run, stats)
+    finally:
+        # Закрывает os.scandir, если проход прервали
+        scanner.close()
+    await run_in_threadpool(_sweep_derivatives, cutoff, batch_size, dry_run, stats)
+    return stats
+
+
+async def _collect_batches(db, scanner: Iterator, cutoff: float, dry_run: bool, stats: GCStats):
+    while True:
+        batch = await run_in_threadpool(_next_batch, scanner)
+        if batch is None:
+            break
+        stats.scanned += len(batch)
+        temp = [(path, size) for path, size in batch if is_temp_name(path.name)]
+        images = [(path, size) for path, size in batch if is_valid_image_name(path.name)]
+        urls = [IMAGE_URL_PREFIX + path.name for path, _ in images]
+        referenced = set(await db.scalars(
+            select(Portfolio.image_url).where(Portfolio.image_url.in_(urls)).distinct()
+        )) if urls else set()
+        orphans = [(path, size) for path, size in images if IMAGE_URL_PREFIX + path.name not in referenced]
+        stats.referenced += len(images) - len(orphans)
+        stats.orphaned += len(orphans)
+        if dry_run:
+            stats.temp_deleted += len(temp)
+            stats.freed_bytes += sum(size for _, size in orphans + temp)
+            continue
+        await run_in_threadpool(_delete_orphans, orphans, cutoff, stats)
+        for path, size in temp:
+            if await run_in_threadpool(_unlink_if_older, path, cutoff):
+                stats.temp_deleted += 1
+                stats.freed_bytes += size
+
+
+class UploadGCLock:
+    """Межпроцессная блокировка прохода сборщика (flock, без ожидания)"""
+
+    def __init__(self, path=LOCK_PATH):
+        self.path = path
+        self._file = None
+
+    def acquire(self) -> bool:
+        self._file = open(self.path, "a")
+        try:
+            fcntl.flock(self._file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except BlockingIOError:
+            self._file.close()
+            self._file = None
+            return False
+
+    def release(self):
+        if self._file is not None:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+
+
+async def run_upload_gc(dry_run: bool = False, grace_seconds: int = UPLOAD_GC_GRACE_SECONDS) -> Optional[GCStats]:
+    """Один проход с блокировкой; None - проход уже идет в другом процессе"""
+    lock = UploadGCLock()
+    if not lock.acquire():
+        return None
+    try:
+        async with primary_session() as db:
+            return await collect_upload_garbage(db, grace_seconds, dry_run=dry_run)
+    finally:
+        lock.release()
+
+
+async def periodic_upload_gc(interval: int = UPLOAD_GC_INTERVAL_SECONDS):
+    """Фоновая задача приложения: проход раз в interval секунд"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            stats = await run_upload_gc()
+            if stats is not None and (stats.deleted or stats.derivatives_deleted or stats.temp_deleted):
+                print(f"Сборка мусора загрузок: {stats.as_dict()}")
+        except Exception as e:
+            print(f"Ошибка при сборке мусора загрузок: {e}")
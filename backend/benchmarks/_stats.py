@@ -0,0 +1,21 @@
+from typing import Dict, List
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    """Перцентиль по методу ближайшего ранга"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(int(round(pct / 100.0 * len(ordered) + 0.5)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    """p50/p95/p99 и максимум в миллисекундах"""
+    return {
+        "count": len(samples),
+        "p50_ms": round(percentile(samples, 50) * 1000, 3),
+        "p95_ms": round(percentile(samples, 95) * 1000, 3),
+        "p99_ms": round(percentile(samples, 99) * 1000, 3),
+        "max_ms": round(max(samples) * 1000, 3) if samples else 0.0,
+    }
@@ -0,0 +1,141 @@
+"""CPU на повторе атаки подбором паролей: без ограничения входа и с ним.
+
+Запуск (из каталога backend, БД не нужна - используется временный SQLite):
+
+    python -m benchmarks.login_attack --attempts 400 --concurrency 16
+
+Повтор детерминирован (--seed): attacker_ips адресов перебирают пароли к
+существующим аккаунтам (каждая попытка без ограничения - проверка argon2),
+а доля --legit попыток - настоящие пользователи со своих адресов и с верным
+паролем. Один и тот же повтор прогоняется через приложение с LoginThrottle
+и без него; argon2 выполняется в потоках процесса (PASSWORD_HASH_WORKERS=0),
+поэтому time.process_time учитывает все хеширование.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+
+# Настройки читаются при импорте app.*
+os.environ["DATABASE_URL"] = f"sqlite:///{Path(tempfile.mkdtemp(prefix='login-attack-')) / 'bench.db'}"
+os.environ["PASSWORD_HASH_WORKERS"] = "0"
+os.environ["LOGIN_THROTTLE_URL"] = "memory://"
+os.environ["PASSWORD_HASH_MAX_PENDING"] = "100000"
+os.environ.pop("DB_CREATE_ALL", None)
+
+import httpx  # noqa: E402
+
+LEGIT_PASSWORD = "legit-password"
+
+
+def make_replay(args) -> list:
+    """Список попыток (ip, username, password, legit)"""
+    rng = random.Random(args.seed)
+    replay = []
+    for number in range(args.attempts):
+        if rng.random() < args.legit:
+            user = rng.randrange(args.legit_users)
+            replay.append((f"10.1.0.{user + 1}", f"legit{user}", LEGIT_PASSWORD, True))
+        else:
+            ip = f"203.0.113.{rng.randrange(args.attacker_ips) + 1}"
+            replay.append((ip, f"victim{rng.randrange(args.victims)}", f"guess-{number}", False))
+    return replay
+
+
+def seed_users(args):
+    from sqlalchemy import create_engine, insert
+    from app.database import Base
+    from app.hashing import pwd_context
+    from app.models import User
+
+    engine = create_engine(os.environ["DATABASE_URL"])
+    Base.metadata.create_all(bind=engine)
+    hashed = pwd_context.hash(LEGIT_PASSWORD)
+    names = [f"legit{n}" for n in range(args.legit_users)] + [f"victim{n}" for n in range(args.victims)]
+    with engine.begin() as connection:
+        connection.execute(insert(User), [
+            {"email": f"{name}@example.com", "username": name, "hashed_password": hashed,
+             "is_active": True, "is_superuser": False}
+            for name in names
+        ])
+    engine.dispose()
+
+
+async def replay_attack(app, replay: list, concurrency: int) -> dict:
+    clients = {}
+    semaphore = asyncio.Semaphore(concurrency)
+    codes = Counter()
+    legit_codes = Counter()
+
+    def client_for(ip):
+        if ip not in clients:
+            transport = httpx.ASGITransport(app=app, client=(ip, 40000))
+            clients[ip] = httpx.AsyncClient(transport=transport, base_url="http://localhost")
+        return clients[ip]
+
+    async def attempt(ip, username, password, legit):
+        async with semaphore:
+            response = await client_for(ip).post(
+                "/api/v1/auth/login-json", json={"username": username, "password": password}
+            )
+        (legit_codes if legit else codes)[response.status_code] += 1
+
+    cpu_started = time.process_time()
+    started = time.perf_counter()
+    await asyncio.gather(*(attempt(*entry) for entry in replay))
+    report = {
+        "cpu_s": round(time.process_time() - cpu_started, 3),
+        "wall_s": round(time.perf_counter() - started, 3),
+        "attack_status_codes": dict(codes),
+        "legit_status_codes": dict(legit_codes),
+    }
+    for client in clients.values():
+        await client.aclose()
+    return report
+
+
+async def run(args) -> dict:
+    import main
+    from app.login_throttle import ThrottleStats, login_throttle
+
+    replay = make_replay(args)
+    backend = login_throttle.backend
+    report = {"attempts": len(replay)}
+    async with main.app.router.lifespan_context(main.app):
+        for name, enabled in (("without_throttle", False), ("with_throttle", True)):
+            login_throttle.backend = backend if enabled else None
+            login_throttle.stats = ThrottleStats()
+            if enabled and backend is not None:
+                backend.lru.clear()
+            report[name] = await replay_attack(main.app, replay, args.concurrency)
+            report[name].update(login_throttle.stats.as_dict())
+    login_throttle.backend = backend
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--attempts", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--attacker-ips", type=int, default=2)
+    parser.add_argument("--victims", type=int, default=20)
+    parser.add_argument("--legit-users", type=int, default=10)
+    parser.add_argument("--legit", type=float, default=0.05, help="доля попыток настоящих пользователей")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    seed_users(args)
+    report = asyncio.run(run(args))
+    before, after = report["without_throttle"], report["with_throttle"]
+    print(f"CPU: {before['cpu_s']} s -> {after['cpu_s']} s, "
+          f"argon2: {before['hashed']} -> {after['hashed']}, 429: {after['throttled']}")
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
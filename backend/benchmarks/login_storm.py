@@ -0,0 +1,95 @@
+"""Латентность /api/v1/items во время шторма логинов.
+
+Запуск (backend должен быть поднят):
+
+    python -m benchmarks.login_storm --base-url http://localhost:8000 --concurrency 32
+
+Сначала измеряется фон без нагрузки, затем те же пробы идут параллельно
+с concurrency клиентами, которые непрерывно логинятся. Если argon2
+блокирует event loop, p99 под штормом вырастает на порядки.
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import List
+
+import httpx
+
+from benchmarks._stats import summarize
+
+BENCH_USER = {
+    "email": "bench-storm@example.com",
+    "username": "bench_storm",
+    "password": "bench-storm-password",
+}
+
+
+async def ensure_user(client: httpx.AsyncClient):
+    response = await client.post("/api/v1/auth/register", json=BENCH_USER)
+    if response.status_code not in (201, 400):
+        response.raise_for_status()
+
+
+async def probe(client: httpx.AsyncClient, stop: asyncio.Event, interval: float) -> List[float]:
+    samples = []
+    while not stop.is_set():
+        started = time.perf_counter()
+        response = await client.get("/api/v1/items")
+        response.raise_for_status()
+        samples.append(time.perf_counter() - started)
+        await asyncio.sleep(interval)
+    return samples
+
+
+async def storm_worker(client: httpx.AsyncClient, stop: asyncio.Event, codes: dict):
+    payload = {"username": BENCH_USER["username"], "password": BENCH_USER["password"]}
+    while not stop.is_set():
+        response = await client.post("/api/v1/auth/login-json", json=payload)
+        codes[response.status_code] = codes.get(response.status_code, 0) + 1
+
+
+async def run(args) -> dict:
+    limits = httpx.Limits(max_connections=args.concurrency + 4)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=60, limits=limits) as client:
+        await ensure_user(client)
+
+        stop = asyncio.Event()
+        baseline_task = asyncio.create_task(probe(client, stop, args.interval))
+        await asyncio.sleep(args.duration)
+        stop.set()
+        baseline = await baseline_task
+
+        stop = asyncio.Event()
+        codes = {}
+        workers = [
+            asyncio.create_task(storm_worker(client, stop, codes))
+            for _ in range(args.concurrency)
+        ]
+        storm_task = asyncio.create_task(probe(client, stop, args.interval))
+        await asyncio.sleep(args.duration)
+        stop.set()
+        storm = await storm_task
+        await asyncio.gather(*workers)
+
+    return {
+        "concurrency": args.concurrency,
+        "duration_s": args.duration,
+        "items_baseline": summarize(baseline),
+        "items_during_storm": summarize(storm),
+        "login_status_codes": codes,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--interval", type=float, default=0.01)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Стоимость инструментирования метрик.
+
+Запуск (из каталога backend, БД не нужна - используется временный SQLite):
+
+    python -m benchmarks.metrics --requests 20000 --queries 20000
+
+- http: /health через ResponseHeadersMiddleware без и с MetricsMiddleware
+- query: SELECT 1 на движке без и с событиями cursor_execute (внутри track_queries)
+- checkout: выдача соединения из QueuePool и из TimedQueuePool
+"""
+import argparse
+import asyncio
+import json
+import tempfile
+import time
+from pathlib import Path
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import QueuePool
+
+from app.metrics import TimedQueuePool, instrument_pool
+from app.middleware import MetricsMiddleware
+from app.query_stats import instrument_engine, track_queries
+from benchmarks.middleware import make_app, measure
+
+
+def per_call_us(function, count: int) -> float:
+    best = float("inf")
+    for _ in range(3):
+        started = time.perf_counter()
+        for _ in range(count):
+            function()
+        best = min(best, time.perf_counter() - started)
+    return round(best / count * 1e6, 3)
+
+
+def query_costs(count: int) -> dict:
+    directory = Path(tempfile.mkdtemp())
+
+    def make_engine(name, poolclass):
+        return create_engine(f"sqlite:///{directory / name}", poolclass=poolclass, pool_size=5)
+
+    plain = make_engine("plain.db", QueuePool)
+    instrumented = make_engine("instrumented.db", TimedQueuePool)
+    instrument_engine(instrumented)
+    instrument_pool(instrumented, "bench")
+
+    report = {}
+    with plain.connect() as connection:
+        report["query_plain_us"] = per_call_us(lambda: connection.execute(text("SELECT 1")).all(), count)
+    with instrumented.connect() as connection, track_queries() as stats:
+        report["query_instrumented_us"] = per_call_us(lambda: connection.execute(text("SELECT 1")).all(), count)
+    assert stats.queries >= count
+
+    def checkout(engine):
+        def run():
+            engine.connect().close()
+        return run
+
+    report["checkout_plain_us"] = per_call_us(checkout(plain), count)
+    report["checkout_instrumented_us"] = per_call_us(checkout(instrumented), count)
+    return report
+
+
+async def http_costs(args) -> dict:
+    plain = make_app("asgi")
+    instrumented = make_app("asgi")
+    instrumented.add_middleware(MetricsMiddleware)
+    report = {}
+    for name, app in (("plain", plain), ("metrics", instrumented)):
+        await measure(app, "/health", min(args.requests, 1000), 1)  # прогрев
+        report[name] = await measure(app, "/health", args.requests, 1)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=20000)
+    args = parser.parse_args()
+
+    report = {"http": asyncio.run(http_costs(args)), "db": query_costs(args.queries)}
+    http = report["http"]
+    print(f"/health p50: {http['plain']['p50_ms']} ms -> {http['metrics']['p50_ms']} ms, "
+          f"{http['plain']['rps']} -> {http['metrics']['rps']} req/s")
+    db = report["db"]
+    print(f"SELECT 1: {db['query_plain_us']} us -> {db['query_instrumented_us']} us, "
+          f"checkout: {db['checkout_plain_us']} us -> {db['checkout_instrumented_us']} us")
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""Накладные расходы middleware на тривиальных эндпоинтах (/health, /).
+
+Запуск (из каталога backend, БД не нужна):
+
+    python -m benchmarks.middleware --requests 20000 --concurrency 32
+
+Одни и те же маршруты собираются в трех вариантах:
+
+- none: без middleware заголовков (нижняя граница)
+- base_http: прежний @app.middleware("http") add_charset_header (BaseHTTPMiddleware)
+- asgi: app.middleware.ResponseHeadersMiddleware с хуками по умолчанию
+
+Запросы идут прямо в ASGI-приложение, без сети, поэтому видна именно
+стоимость слоя middleware. Латентность - в миллисекундах на запрос.
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import List
+
+from fastapi import FastAPI
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+
+from app.middleware import ResponseHeadersMiddleware, response_header_hooks
+from benchmarks._stats import summarize
+
+PATHS = ("/health", "/")
+
+
+def make_app(variant: str) -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+    if variant == "base_http":
+        @app.middleware("http")
+        async def add_charset_header(request, call_next):
+            response = await call_next(request)
+            if response.headers.get("content-type", "").startswith("application/json"):
+                response.headers["content-type"] = "application/json; charset=utf-8"
+            return response
+    elif variant == "asgi":
+        app.add_middleware(ResponseHeadersMiddleware, hooks=response_header_hooks())
+
+    @app.get("/")
+    async def root():
+        return JSONResponse(content={"message": "benchmark", "version": "1.0.0"})
+
+    @app.get("/health")
+    async def health_check():
+        return {"status": "healthy"}
+
+    return app
+
+
+def make_scope(path: str) -> dict:
+    return {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"host", b"bench"), (b"origin", b"http://bench")],
+        "client": ("127.0.0.1", 50000),
+        "server": ("bench", 80),
+    }
+
+
+async def request(app, path: str) -> dict:
+    messages = [{"type": "http.request", "body": b"", "more_body": False}]
+
+    async def receive():
+        if messages:
+            return messages.pop()
+        # Как у сервера: дальше только ожидание отключения клиента
+        await asyncio.Event().wait()
+
+    response = {}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+            response["headers"] = dict(message["headers"])
+        elif message["type"] == "http.response.body":
+            response["body"] = response.get("body", b"") + message.get("body", b"")
+
+    await app(make_scope(path), receive, send)
+    return response
+
+
+async def measure(app, path: str, total: int, concurrency: int) -> dict:
+    samples: List[float] = []
+    remaining = iter(range(total))
+
+    async def worker():
+        for _ in remaining:
+            started = time.perf_counter()
+            await request(app, path)
+            samples.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {**summarize(samples), "rps": round(total / elapsed, 1)}
+
+
+async def run(args) -> dict:
+    apps = {variant: make_app(variant) for variant in ("none", "base_http", "asgi")}
+    for variant, app in apps.items():
+        response = await request(app, "/health")
+        assert response["status"] == 200, variant
+        if variant != "none":
+            # Оба варианта отдают JSON с явной кодировкой
+            assert response["headers"][b"content-type"] == b"application/json; charset=utf-8", variant
+
+    report = {}
+    for path in PATHS:
+        report[path] = {}
+        for variant, app in apps.items():
+            await measure(app, path, min(args.requests, 1000), args.concurrency)  # прогрев
+            report[path][variant] = await measure(app, path, args.requests, args.concurrency)
+            stats = report[path][variant]
+            print(
+                f"{path:<8} {variant:<10} p50 {stats['p50_ms']} ms, p99 {stats['p99_ms']} ms, "
+                f"{stats['rps']} req/s"
+            )
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+    report = asyncio.run(run(args))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
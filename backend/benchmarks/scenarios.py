@@ -0,0 +1,131 @@
+import io
+import os
+import random
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+import httpx
+
+from benchmarks.seed import SEED_PASSWORD
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+
+@dataclass
+class SeedData:
+    usernames: List[str]
+    public_user_ids: List[int]
+    public_portfolio_ids: List[int]
+
+
+class Recorder:
+    """Латентности и ошибки по шаблону маршрута (например GET /api/v1/items)"""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    async def request(self, client: httpx.AsyncClient, method: str, template: str, url: str, **kwargs):
+        started = time.perf_counter()
+        response = await client.request(method, url, **kwargs)
+        label = f"{method} {template}"
+        self.samples[label].append(time.perf_counter() - started)
+        if response.status_code >= 400:
+            self.errors[label] += 1
+        return response
+
+
+@dataclass
+class WorkerState:
+    index: int
+    rng: random.Random
+    headers: Dict[str, str] = field(default_factory=dict)
+
+
+async def login_worker(client: httpx.AsyncClient, recorder: Recorder, data: SeedData, state: WorkerState):
+    """Войти под собственным пользователем воркера"""
+    username = data.usernames[state.index % len(data.usernames)]
+    response = await recorder.request(
+        client, "POST", "/api/v1/auth/login-json", "/api/v1/auth/login-json",
+        json={"username": username, "password": SEED_PASSWORD}
+    )
+    response.raise_for_status()
+    state.headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+async def browse_directory(client, recorder: Recorder, data: SeedData, state: WorkerState):
+    """Аноним листает каталог анкет, открывает профиль и проект"""
+    cursor = None
+    for _ in range(3):
+        params = {"limit": 20}
+        if cursor:
+            params["cursor"] = cursor
+        response = await recorder.request(
+            client, "GET", "/api/v1/users/public", "/api/v1/users/public", params=params
+        )
+        if response.status_code != 200:
+            break
+        cursor = response.json().get("next_cursor")
+        if not cursor:
+            break
+    if data.public_user_ids:
+        user_id = state.rng.choice(data.public_user_ids)
+        await recorder.request(
+            client, "GET", "/api/v1/users/public/{user_id}", f"/api/v1/users/public/{user_id}"
+        )
+    if data.public_portfolio_ids:
+        item_id = state.rng.choice(data.public_portfolio_ids)
+        await recorder.request(
+            client, "GET", "/api/v1/portfolio/public/{item_id}", f"/api/v1/portfolio/public/{item_id}"
+        )
+
+
+async def login(client, recorder: Recorder, data: SeedData, state: WorkerState):
+    """Вход по паролю (argon2)"""
+    username = state.rng.choice(data.usernames)
+    await recorder.request(
+        client, "POST", "/api/v1/auth/login-json", "/api/v1/auth/login-json",
+        json={"username": username, "password": SEED_PASSWORD}
+    )
+
+
+async def edit_profile(client, recorder: Recorder, data: SeedData, state: WorkerState):
+    """Редактирование своего профиля"""
+    await recorder.request(
+        client, "PUT", "/api/v1/users/me", "/api/v1/users/me",
+        headers=state.headers, json={"full_name": f"Bench {state.rng.randint(0, 10 ** 6)}"}
+    )
+    await recorder.request(client, "GET", "/api/v1/users/me", "/api/v1/users/me", headers=state.headers)
+
+
+def make_image(rng: random.Random, width: int = 800, height: int = 600) -> bytes:
+    """Уникальное изображение: JPEG из шума, если есть Pillow, иначе случайные байты"""
+    if Image is None:
+        return os.urandom(width * height // 2)
+    image = Image.frombytes("RGB", (width, height), rng.randbytes(width * height * 3))
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", quality=85)
+    return buffer.getvalue()
+
+
+async def upload_image(client, recorder: Recorder, data: SeedData, state: WorkerState):
+    """Загрузка изображения для проекта"""
+    payload = make_image(state.rng)
+    await recorder.request(
+        client, "POST", "/api/v1/portfolio/upload-image", "/api/v1/portfolio/upload-image",
+        headers=state.headers, files={"file": ("bench.jpg", payload, "image/jpeg")}
+    )
+
+
+# Сценарий: (шаг, нужен ли вход перед началом)
+SCENARIOS = {
+    "browse": (browse_directory, False),
+    "login": (login, False),
+    "edit_profile": (edit_profile, True),
+    "upload": (upload_image, True),
+}
@@ -0,0 +1,83 @@
+import random
+from typing import List
+
+from sqlalchemy import insert
+
+from app.hashing import pwd_context
+from app.models import Item, Portfolio, Tag, User, portfolio_tags
+from app.tags import parse_tags
+
+SEED_PASSWORD = "bench-password"
+
+FIRST_NAMES = ["Анна", "Иван", "Мария", "Алексей", "Ольга", "Дмитрий", "Екатерина", "Сергей", "Наталья", "Павел"]
+LAST_NAMES = ["Иванова", "Петров", "Смирнова", "Кузнецов", "Попова", "Соколов", "Лебедева", "Козлов", "Новикова", "Морозов"]
+TECHNOLOGIES = ["React", "Vue", "Figma", "Python", "FastAPI", "Django", "Go", "TypeScript", "Blender", "After Effects"]
+WORDS = "дизайн сайт бренд логотип интерфейс приложение анимация лендинг магазин платформа сервис кампания".split()
+
+
+def sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize()
+
+
+def seed(session, users: int, items: int, max_projects: int = 8, seed_value: int = 42) -> List[str]:
+    """Заполнить БД пользователями, проектами и элементами; вернуть username-ы.
+
+    Хеш пароля считается один раз и используется для всех пользователей,
+    иначе заполнение тысяч пользователей заняло бы минуты.
+    """
+    rng = random.Random(seed_value)
+    hashed_password = pwd_context.hash(SEED_PASSWORD)
+
+    user_rows = []
+    for index in range(users):
+        user_rows.append({
+            "email": f"bench{index}@example.com",
+            "username": f"bench{index}",
+            "hashed_password": hashed_password,
+            "full_name": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+            "telegram": f"@bench{index}",
+            "is_active": True,
+            "is_superuser": False,
+            "is_profile_public": rng.random() < 0.8,
+            "show_email_in_profile": rng.random() < 0.5,
+        })
+    user_ids = session.scalars(
+        insert(User).returning(User.id, sort_by_parameter_order=True), user_rows
+    ).all()
+
+    portfolio_rows = []
+    for user_id in user_ids:
+        for order_index in range(rng.randint(0, max_projects)):
+            portfolio_rows.append({
+                "user_id": user_id,
+                "title": sentence(rng, 3),
+                "description": sentence(rng, 30),
+                "project_url": f"https://example.com/{user_id}/{order_index}",
+                "technologies": ", ".join(rng.sample(TECHNOLOGIES, rng.randint(1, 4))),
+                "is_visible": rng.random() < 0.9,
+                "order_index": order_index,
+            })
+    tag_ids = dict(session.execute(
+        insert(Tag).returning(Tag.slug, Tag.id, sort_by_parameter_order=True),
+        [{"slug": name.lower(), "name": name} for name in TECHNOLOGIES]
+    ).all())
+    for start in range(0, len(portfolio_rows), 1000):
+        chunk = portfolio_rows[start:start + 1000]
+        portfolio_ids = session.scalars(
+            insert(Portfolio).returning(Portfolio.id, sort_by_parameter_order=True), chunk
+        ).all()
+        session.execute(insert(portfolio_tags), [
+            {"portfolio_id": portfolio_id, "tag_id": tag_ids[slug]}
+            for portfolio_id, row in zip(portfolio_ids, chunk)
+            for slug in parse_tags(row["technologies"])
+        ])
+
+    item_rows = [
+        {"title": sentence(rng, 2), "description": sentence(rng, 12), "is_active": rng.random() < 0.9}
+        for _ in range(items)
+    ]
+    for start in range(0, len(item_rows), 1000):
+        session.execute(insert(Item), item_rows[start:start + 1000])
+
+    session.commit()
+    return [row["username"] for row in user_rows]
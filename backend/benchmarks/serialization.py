@@ -0,0 +1,100 @@
+"""Стоимость сериализации списка проектов на строку.
+
+Запуск (из каталога backend, БД не нужна):
+
+    python -m benchmarks.serialization --rows 1000,10000,100000
+
+Строки - ORM-объекты Portfolio в памяти. Сравниваются:
+
+- fastapi: путь response_model - validate + serialize в dict + json.dumps
+  (то, что делает FastAPI, когда маршрут возвращает ORM-объекты)
+- fastapi+orjson: то же с ORJSONResponse
+- render_json: app.responses.render_json - одна валидация и JSON из pydantic-core
+"""
+import argparse
+import asyncio
+import json
+import time
+from datetime import datetime, timezone
+from typing import List
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from app.models import Portfolio
+from app.responses import DefaultResponse, render_json
+from app.schemas import PortfolioResponse
+
+
+def make_rows(count: int) -> List[Portfolio]:
+    now = datetime.now(timezone.utc)
+    return [
+        Portfolio(
+            id=index,
+            user_id=index // 8,
+            title=f"Проект {index}",
+            description="Дизайн и разработка интернет-магазина " * 4,
+            image_url=f"/api/v1/portfolio/images/{index:064x}.jpg",
+            project_url=f"https://example.com/{index}",
+            technologies="React, Figma, FastAPI",
+            is_visible=True,
+            order_index=index % 8,
+            created_at=now,
+            updated_at=now,
+        )
+        for index in range(count)
+    ]
+
+
+def fastapi_path(response_class):
+    field = create_response_field(name="response", type_=List[PortfolioResponse])
+
+    def run(rows):
+        content = asyncio.run(serialize_response(field=field, response_content=rows))
+        return response_class(content).body
+
+    return run
+
+
+def render_json_path(rows):
+    return render_json(List[PortfolioResponse], rows)
+
+
+def measure(function, rows, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function(rows)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", default="1000,10000,100000")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    paths = {
+        "fastapi": fastapi_path(JSONResponse),
+        "fastapi+orjson": fastapi_path(DefaultResponse),
+        "render_json": render_json_path,
+    }
+    report = {}
+    for count in (int(value) for value in args.rows.split(",")):
+        rows = make_rows(count)
+        expected = json.loads(render_json_path(rows[:3]))
+        for name, function in paths.items():
+            # Все варианты отдают один и тот же JSON
+            assert json.loads(function(rows[:3])) == expected, name
+        report[count] = {
+            name: round(measure(function, rows, args.repeat) / count * 1e6, 3)
+            for name, function in paths.items()
+        }
+        print(f"{count:>7} rows: " + ", ".join(f"{name} {cost} us/row" for name, cost in report[count].items()))
+    print(json.dumps({"us_per_row": report}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""Масштабирование по числу одновременно выполняющихся медленных запросов.
+
+Запуск (нужен PostgreSQL, используется pg_sleep):
+
+    python -m benchmarks.slow_queries --sleep 0.1 --levels 1,4,16,32
+
+Для каждого уровня конкурентности N запускается N «запросов», каждый
+выполняет SELECT pg_sleep(sleep) через сессию так, как это делают роутеры:
+
+- blocking: синхронная сессия прямо в event loop (старое поведение)
+- threaded: ThreadedSession из app.database (режим по умолчанию)
+- async: AsyncSession на asyncpg (DATABASE_ASYNC=1)
+
+Параллельно раз в 5 мс измеряется задержка event loop - это то,
+сколько ждал бы любой другой запрос, например /health.
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import List
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.database import DATABASE_URL, ThreadedSession, to_async_url
+from benchmarks._stats import summarize
+
+
+async def loop_lag_probe(stop: asyncio.Event, samples: List[float], interval: float = 0.005):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        samples.append(max(time.perf_counter() - started - interval, 0.0))
+
+
+async def run_level(mode: str, factory, concurrency: int, sleep: float) -> dict:
+    statement = text("SELECT pg_sleep(:s)")
+
+    async def one_request():
+        if mode == "blocking":
+            session = factory()
+            try:
+                session.execute(statement, {"s": sleep})
+            finally:
+                session.close()
+        elif mode == "threaded":
+            session = ThreadedSession(factory())
+            try:
+                await session.execute(statement, {"s": sleep})
+            finally:
+                await session.close()
+        else:
+            async with factory() as session:
+                await session.execute(statement, {"s": sleep})
+
+    stop = asyncio.Event()
+    lag: List[float] = []
+    probe = asyncio.create_task(loop_lag_probe(stop, lag))
+    started = time.perf_counter()
+    await asyncio.gather(*(one_request() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await probe
+    return {
+        "mode": mode,
+        "concurrency": concurrency,
+        "wall_s": round(elapsed, 3),
+        "queries_per_s": round(concurrency / elapsed, 2),
+        "loop_lag": summarize(lag),
+    }
+
+
+async def run(args) -> List[dict]:
+    levels = [int(level) for level in args.levels.split(",")]
+    pool_size = max(levels)
+    sync_engine = create_engine(DATABASE_URL, pool_size=pool_size, max_overflow=0)
+    async_engine = create_async_engine(to_async_url(DATABASE_URL), pool_size=pool_size, max_overflow=0)
+    factories = {
+        "blocking": sessionmaker(bind=sync_engine),
+        "threaded": sessionmaker(bind=sync_engine),
+        "async": async_sessionmaker(async_engine),
+    }
+    results = []
+    try:
+        for mode in args.modes.split(","):
+            for concurrency in levels:
+                results.append(await run_level(mode, factories[mode], concurrency, args.sleep))
+    finally:
+        sync_engine.dispose()
+        await async_engine.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sleep", type=float, default=0.1)
+    parser.add_argument("--levels", default="1,2,4,8,16,32")
+    parser.add_argument("--modes", default="blocking,threaded,async")
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
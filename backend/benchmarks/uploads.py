@@ -0,0 +1,94 @@
+"""Параллельные загрузки 10 МБ: старый copyfileobj против save_upload.
+
+Запуск:
+
+    python -m benchmarks.uploads --concurrency 16 --size-mb 10
+
+Загрузки собираются в памяти процесса (UploadFile поверх
+SpooledTemporaryFile, как их отдает Starlette после разбора multipart) и
+сохраняются во временный каталог. Для каждой реализации печатаются время,
+пропускная способность и задержка event loop во время записи.
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from pathlib import Path
+from typing import List
+
+from fastapi import UploadFile
+
+from app.storage import save_upload
+from benchmarks._stats import summarize
+from benchmarks.slow_queries import loop_lag_probe
+
+
+def make_upload(payload: bytes) -> UploadFile:
+    spooled = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+    spooled.write(payload)
+    spooled.seek(0)
+    return UploadFile(file=spooled, filename="bench.jpg")
+
+
+async def legacy_save(upload: UploadFile, directory: Path):
+    # Реализация до перехода на потоковую запись: синхронно, в event loop
+    file_path = directory / f"{uuid.uuid4()}.jpg"
+    with open(file_path, "wb") as buffer:
+        shutil.copyfileobj(upload.file, buffer)
+
+
+async def streaming_save(upload: UploadFile, directory: Path):
+    await save_upload(upload, ".jpg", max_size=1 << 40, directory=directory)
+
+
+async def run_case(name: str, save, payloads: List[bytes]) -> dict:
+    directory = Path(tempfile.mkdtemp(prefix=f"bench-{name}-"))
+    uploads = [make_upload(payload) for payload in payloads]
+    stop = asyncio.Event()
+    lag: List[float] = []
+    probe = asyncio.create_task(loop_lag_probe(stop, lag))
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(save(upload, directory) for upload in uploads))
+        elapsed = time.perf_counter() - started
+    finally:
+        stop.set()
+        await probe
+        stored = len(os.listdir(directory))
+        shutil.rmtree(directory)
+    total_mb = sum(len(payload) for payload in payloads) / (1024 * 1024)
+    return {
+        "implementation": name,
+        "uploads": len(payloads),
+        "files_stored": stored,
+        "wall_s": round(elapsed, 3),
+        "throughput_mb_s": round(total_mb / elapsed, 1),
+        "loop_lag": summarize(lag),
+    }
+
+
+async def run(args) -> List[dict]:
+    size = int(args.size_mb * 1024 * 1024)
+    unique = [os.urandom(size) for _ in range(args.concurrency)]
+    duplicates = [unique[0]] * args.concurrency
+    return [
+        await run_case("legacy", legacy_save, unique),
+        await run_case("streaming", streaming_save, unique),
+        await run_case("streaming-duplicates", streaming_save, duplicates),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--size-mb", type=float, default=10)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,58 @@
-from fastapi import FastAPI
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from app.database import engine, Base
-from app.routers import items, auth, users, portfolio
+from fastapi.responses import JSONResponse, Response
+from starlette.concurrency import run_in_threadpool
+from app.database import engine, Base, dispose_engines, replicas
+from app.hashing import password_hasher
+from app.images import derivative_queue
+from app.upload_gc import UPLOAD_GC_INTERVAL_SECONDS, periodic_upload_gc
+from app.cache import response_cache
+from app.auth import get_current_superuser, password_rehasher, user_cache
+from app.login_throttle import login_throttle
+from app.responses import DefaultResponse
+from app.middleware import (
+    BodySizeLimitMiddleware,
+    MetricsMiddleware,
+    QueryBudgetMiddleware,
+    ReplicaRoutingMiddleware,
+    ResponseHeadersMiddleware,
+    response_header_hooks
+)
+from app.query_budget import QUERY_BUDGET_MODE
+from app.metrics import METRICS_ENABLED, mark_process_dead, render_metrics
+from app.routers import items, auth, users, portfolio, search
+
+# Схемой управляют миграции (alembic upgrade head до запуска воркеров);
+# DB_CREATE_ALL=1 - создать таблицы при старте, только для локальной разработки
+DB_CREATE_ALL = os.getenv("DB_CREATE_ALL", "false").lower() in ("1", "true", "yes")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if DB_CREATE_ALL:
+        await run_in_threadpool(Base.metadata.create_all, bind=engine)
+    # Сборка мусора загрузок; в нескольких воркерах проход выполняет один из них
+    upload_gc = asyncio.create_task(periodic_upload_gc()) if UPLOAD_GC_INTERVAL_SECONDS > 0 else None
+    yield
+    if upload_gc is not None:
+        upload_gc.cancel()
+    password_rehasher.shutdown()
+    password_hasher.shutdown()
+    derivative_queue.shutdown()
+    await dispose_engines()
+    mark_process_dead()
 
-#db tablichki
-Base.metadata.create_all(bind=engine)
 
 app = FastAPI(
     title="Digital Production Agency API",
     description="API",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    # orjson для ответов, которые FastAPI сериализует сам
+    default_response_class=DefaultResponse
 )
 
 # CORS middleware
@@ -22,19 +64,33 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Middleware для правильной кодировки UTF-8
-@app.middleware("http")
-async def add_charset_header(request, call_next):
-    response = await call_next(request)
-    if response.headers.get("content-type", "").startswith("application/json"):
-        response.headers["content-type"] = "application/json; charset=utf-8"
-    return response
+# Заголовки ответов (кодировка UTF-8 для JSON, кэширование, Server-Timing)
+app.add_middleware(ResponseHeadersMiddleware, hooks=response_header_hooks())
+
+# Предел тела загрузки: 413 до разбора multipart, лишние байты не читаются
+app.add_middleware(BodySizeLimitMiddleware, limits={
+    "/api/v1/portfolio/upload-image": (portfolio.UPLOAD_REQUEST_MAX, portfolio.upload_too_large().detail),
+})
+
+# Чтение с реплик: состояние маршрутизации запроса и cookie после записи
+if replicas:
+    app.add_middleware(ReplicaRoutingMiddleware)
+
+# Бюджет SQL-запросов и поиск N+1 - только для разработки и тестов
+if QUERY_BUDGET_MODE != "off":
+    app.add_middleware(QueryBudgetMiddleware, mode=QUERY_BUDGET_MODE)
+
+# Метрики Prometheus - внешний слой, чтобы время включало все middleware
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
 
 # routers
 app.include_router(auth.router, prefix="/api/v1/auth", tags=["authentication"])
 app.include_router(users.router, prefix="/api/v1/users", tags=["users"])
 app.include_router(portfolio.router, prefix="/api/v1", tags=["portfolio"])
 app.include_router(items.router, prefix="/api/v1", tags=["items"])
+app.include_router(search.router, prefix="/api/v1", tags=["search"])
 
 
 @app.get("/", response_class=JSONResponse)
@@ -53,3 +109,18 @@ async def health_check():
     return {"status": "healthy"}
 
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+
+# Внутреннее состояние кэша и ограничения входа - только суперпользователю
+@app.get("/cache/stats", dependencies=[Depends(get_current_superuser)])
+async def cache_stats():
+    return {"responses": response_cache.stats(), "users": user_cache.stats()}
+
+
+@app.get("/auth/throttle/stats", dependencies=[Depends(get_current_superuser)])
+async def login_throttle_stats():
+    return login_throttle.describe()
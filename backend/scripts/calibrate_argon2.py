@@ -0,0 +1,119 @@
+"""Подбор параметров argon2 под текущий сервер и целевую задержку хеширования.
+
+Запуск (из каталога backend):
+
+    python -m scripts.calibrate_argon2 --target-ms 250
+    WEB_CONCURRENCY=4 python -m scripts.calibrate_argon2 --target-ms 250 --write .env
+
+Хеширование измеряется так, как оно идет в production: одновременно в
+WEB_CONCURRENCY * PASSWORD_HASH_WORKERS процессах, которые делят ядра
+сервера. parallelism - ядра на одно одновременное хеширование. Память
+начинается с --max-memory-mib; для нее ищется наибольший time_cost, при
+котором медиана задержки не превышает цель, а если цель недостижима даже
+с time_cost=1, память уменьшается вдвое (не ниже --min-memory-mib).
+
+Результат - ARGON2_TIME_COST, ARGON2_MEMORY_COST (KiB) и ARGON2_PARALLELISM;
+--write обновляет их в env-файле. После перезапуска хеши со старыми
+параметрами и bcrypt перехешируются при входе (см. PasswordRehashQueue).
+"""
+import argparse
+import os
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Tuple
+
+from argon2.low_level import Type, hash_secret_raw
+
+SETTINGS = ("ARGON2_TIME_COST", "ARGON2_MEMORY_COST", "ARGON2_PARALLELISM")
+
+
+def hash_once(time_cost: int, memory_cost: int, parallelism: int) -> float:
+    """Время одного хеширования в секундах (выполняется в рабочем процессе)"""
+    started = time.perf_counter()
+    hash_secret_raw(
+        os.urandom(16), os.urandom(16), time_cost=time_cost, memory_cost=memory_cost,
+        parallelism=parallelism, hash_len=32, type=Type.ID
+    )
+    return time.perf_counter() - started
+
+
+def measure(executor: ProcessPoolExecutor, slots: int, samples: int, params: Tuple[int, int, int]) -> float:
+    """Медиана задержки, когда заняты все slots хеширований сразу"""
+    futures = [executor.submit(hash_once, *params) for _ in range(slots * samples)]
+    return statistics.median(future.result() for future in futures)
+
+
+def calibrate(args, slots: int, parallelism: int) -> Tuple[Tuple[int, int, int], float]:
+    target = args.target_ms / 1000
+    memory_mib = args.max_memory_mib
+    with ProcessPoolExecutor(max_workers=slots) as executor:
+        measure(executor, slots, 1, (1, args.min_memory_mib * 1024, parallelism))  # прогрев
+        while True:
+            best = None
+            for time_cost in range(1, args.max_time_cost + 1):
+                params = (time_cost, memory_mib * 1024, parallelism)
+                latency = measure(executor, slots, args.samples, params)
+                print(f"t={time_cost} m={memory_mib} MiB p={parallelism}: {latency * 1000:.1f} ms")
+                if latency > target:
+                    break
+                best = (params, latency)
+            if best is not None:
+                return best
+            if memory_mib <= args.min_memory_mib:
+                # Цель недостижима: самые дешевые допустимые параметры
+                params = (1, args.min_memory_mib * 1024, parallelism)
+                return params, latency
+            memory_mib = max(memory_mib // 2, args.min_memory_mib)
+
+
+def write_env(path: Path, values: Dict[str, str]):
+    """Заменить или дописать переменные в env-файле, остальные строки не трогать"""
+    lines = path.read_text(encoding="utf-8").splitlines() if path.exists() else []
+    pending = dict(values)
+    for index, line in enumerate(lines):
+        name = line.split("=", 1)[0].strip()
+        if name in pending:
+            lines[index] = f"{name}={pending.pop(name)}"
+    lines.extend(f"{name}={value}" for name, value in pending.items())
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--target-ms", type=float, default=250.0, help="медиана задержки хеширования под нагрузкой")
+    parser.add_argument("--max-memory-mib", type=int, default=64)
+    parser.add_argument("--min-memory-mib", type=int, default=19, help="минимум по рекомендациям OWASP")
+    parser.add_argument("--max-time-cost", type=int, default=10)
+    parser.add_argument("--samples", type=int, default=3, help="хеширований на процесс для каждой пробы")
+    parser.add_argument("--parallelism", type=int, help="по умолчанию - ядра на одно одновременное хеширование")
+    parser.add_argument("--write", type=Path, metavar="ENV_FILE", help="записать параметры в env-файл")
+    args = parser.parse_args()
+
+    from app.hashing import PASSWORD_HASH_WORKERS
+
+    cores = os.cpu_count() or 1
+    workers = max(int(os.getenv("WEB_CONCURRENCY", "1")), 1)
+    slots = workers * max(PASSWORD_HASH_WORKERS, 1)
+    parallelism = args.parallelism or max(cores // slots, 1)
+    print(f"ядер: {cores}, воркеров: {workers}, одновременных хеширований: {slots}, parallelism: {parallelism}")
+
+    (time_cost, memory_cost, parallelism), latency = calibrate(args, slots, parallelism)
+    if latency > args.target_ms / 1000:
+        print(f"Цель {args.target_ms} ms недостижима: минимальные параметры дают {latency * 1000:.1f} ms")
+    values = {
+        "ARGON2_TIME_COST": str(time_cost),
+        "ARGON2_MEMORY_COST": str(memory_cost),
+        "ARGON2_PARALLELISM": str(parallelism),
+    }
+    print(f"\nмедиана {latency * 1000:.1f} ms, до {slots / latency:.1f} проверок пароля в секунду на сервер")
+    for name in SETTINGS:
+        print(f"{name}={values[name]}")
+    if args.write:
+        write_env(args.write, values)
+        print(f"записано в {args.write}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Импорт проектов портфолио из JSON или CSV прямо в БД.
+
+Запуск (из каталога backend):
+
+    python -m scripts.import_portfolio projects.csv --user designer@example.com
+    python -m scripts.import_portfolio projects.json --user designer --atomic
+
+JSON - список объектов с полями PortfolioCreate (или {"create": [...]}),
+CSV - заголовок с теми же именами колонок; пустые ячейки считаются
+отсутствующими. Записи проверяются схемой PortfolioCreate, затем
+вставляются пакетами по --batch-size, каждый пакет - одна транзакция
+с многострочным INSERT ... RETURNING. Если order_index не задан,
+проекты встают после уже существующих в порядке файла.
+"""
+import argparse
+import asyncio
+import csv
+import json
+import sys
+from pathlib import Path
+from typing import List, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import func, select
+
+from app.auth import get_user_by_username_or_email
+from app.cache import response_cache
+from app.database import get_db
+from app.models import Portfolio
+from app.portfolio_batch import BATCH_CHUNK_SIZE, apply_portfolio_batch
+from app.schemas import PortfolioBatchRequest, PortfolioCreate
+
+
+def read_records(path: Path, file_format: str) -> List[dict]:
+    if file_format == "csv":
+        with path.open(newline="", encoding="utf-8-sig") as file:
+            return [
+                {key: value for key, value in row.items() if key and value not in ("", None)}
+                for row in csv.DictReader(file)
+            ]
+    data = json.loads(path.read_text(encoding="utf-8"))
+    if isinstance(data, dict):
+        data = data.get("create", [])
+    if not isinstance(data, list):
+        raise ValueError("JSON должен содержать список проектов")
+    return data
+
+
+def validate_records(records: List[dict], next_order: int) -> Tuple[List[PortfolioCreate], List[int], List[str]]:
+    """Проверить записи схемой; вернуть проекты, их номера в файле (с единицы) и ошибки"""
+    items, numbers, errors = [], [], []
+    for number, record in enumerate(records, start=1):
+        try:
+            item = PortfolioCreate.model_validate(record)
+        except ValidationError as e:
+            fields = "; ".join(
+                f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in e.errors()
+            )
+            errors.append(f"запись {number}: {fields}")
+            continue
+        if "order_index" not in item.model_fields_set:
+            item.order_index = next_order + len(items)
+        items.append(item)
+        numbers.append(number)
+    return items, numbers, errors
+
+
+async def run(args) -> int:
+    path = Path(args.file)
+    file_format = args.format or ("csv" if path.suffix.lower() == ".csv" else "json")
+    records = read_records(path, file_format)
+
+    db_session = get_db()
+    db = await db_session.__anext__()
+    try:
+        user = await get_user_by_username_or_email(db, args.user)
+        if user is None:
+            print(f"Пользователь {args.user} не найден", file=sys.stderr)
+            return 1
+        max_order = await db.scalar(
+            select(func.max(Portfolio.order_index)).where(Portfolio.user_id == user.id)
+        )
+        items, numbers, errors = validate_records(records, 0 if max_order is None else max_order + 1)
+        if errors and args.atomic:
+            print("\n".join(errors), file=sys.stderr)
+            return 1
+
+        created = 0
+        if not args.dry_run:
+            for start in range(0, len(items), args.batch_size):
+                chunk = items[start:start + args.batch_size]
+                result = await apply_portfolio_batch(
+                    db, user.id, PortfolioBatchRequest(create=chunk), atomic=args.atomic
+                )
+                for error in result.errors:
+                    errors.append(f"запись {numbers[start + error['index']]}: {error['detail']}")
+                created += len(result.created)
+                print(f"{created}/{len(items)}", file=sys.stderr)
+            if created:
+                await response_cache.invalidate_user(user.id)
+    finally:
+        await db_session.aclose()
+
+    print(json.dumps(
+        {"records": len(records), "valid": len(items), "created": created, "errors": errors},
+        indent=2, ensure_ascii=False
+    ))
+    return 1 if errors else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("file", help="файл .json или .csv")
+    parser.add_argument("--user", required=True, help="username или email владельца")
+    parser.add_argument("--format", choices=["json", "csv"], help="по умолчанию - по расширению")
+    parser.add_argument("--batch-size", type=int, default=BATCH_CHUNK_SIZE)
+    parser.add_argument("--atomic", action="store_true", help="не импортировать файл с ошибками проверки, пакет с ошибкой БД отменять целиком")
+    parser.add_argument("--dry-run", action="store_true", help="только проверить файл")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(run(args)))
+
+
+if __name__ == "__main__":
+    main()
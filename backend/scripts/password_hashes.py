@@ -0,0 +1,76 @@
+"""Сводка хешей паролей в users: схемы, параметры argon2 и доля устаревших.
+
+Запуск (из каталога backend, с теми же ARGON2_* в окружении, что и у приложения):
+
+    python -m scripts.password_hashes
+    python -m scripts.password_hashes --json
+
+Хеши читаются потоком (yield_per), в памяти - только счетчики по наборам
+параметров. «Устаревший» - bcrypt или argon2 с параметрами, отличными от
+текущих: такой хеш перехешируется при следующем входе пользователя.
+"""
+import argparse
+import json
+from collections import Counter
+
+from sqlalchemy import select
+
+from app.database import engine
+from app.hashing import needs_rehash, pwd_context
+from app.models import User
+
+STREAM_BATCH = 1000
+
+
+def hash_kind(hashed_password: str) -> str:
+    """Схема и параметры: "argon2id m=65536,t=3,p=4", "bcrypt 2b cost=12" """
+    scheme = pwd_context.identify(hashed_password)
+    if scheme is None:
+        return "unknown"
+    parsed = pwd_context.handler(scheme).from_string(hashed_password)
+    if scheme == "argon2":
+        return f"argon2{parsed.type} m={parsed.memory_cost},t={parsed.rounds},p={parsed.parallelism}"
+    if scheme == "bcrypt":
+        return f"bcrypt {parsed.ident.strip('$')} cost={parsed.rounds}"
+    return scheme
+
+
+def collect() -> dict:
+    kinds = Counter()
+    outdated = 0
+    total = 0
+    with engine.connect() as connection:
+        result = connection.execution_options(yield_per=STREAM_BATCH).execute(select(User.hashed_password))
+        for hashed_password in result.scalars():
+            total += 1
+            kinds[hash_kind(hashed_password)] += 1
+            if needs_rehash(hashed_password):
+                outdated += 1
+    return {
+        "total": total,
+        "outdated": outdated,
+        "current": hash_kind(pwd_context.hash("")),
+        "kinds": dict(kinds.most_common()),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--json", action="store_true", help="вывести отчет в JSON")
+    args = parser.parse_args()
+
+    report = collect()
+    if args.json:
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+        return
+    total = report["total"]
+    print(f"пользователей: {total}, текущие параметры: {report['current']}")
+    for kind, count in report["kinds"].items():
+        share = count / total * 100 if total else 0.0
+        marker = "" if kind == report["current"] else "  (перехеширование при входе)"
+        print(f"{count:>10}  {share:5.1f}%  {kind}{marker}")
+    print(f"устаревших: {report['outdated']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""Перенос загруженных изображений из плоских каталогов в подкаталоги ab/cd.
+
+Запуск (из каталога backend, приложение может работать):
+
+    python -m scripts.shard_uploads --dry-run
+    python -m scripts.shard_uploads --batch-size 1000 --settle-seconds 2
+
+Обходятся только файлы верхнего уровня UPLOAD_DIR и DERIVATIVE_DIR
+(os.scandir, пачками - память не зависит от числа файлов). Для каждой
+пачки сначала создаются жесткие ссылки на новом месте (storage.shard_prefix),
+затем, через --settle-seconds, удаляются старые имена: запрос, который
+успел найти файл на старом месте (см. stat_stored_file), дочитывает его
+до конца. Файловые системы без жестких ссылок - перенос os.replace.
+
+Скрипт можно прерывать и запускать повторно: уже перенесенные файлы
+просто не находятся на верхнем уровне. URL изображений не меняются.
+"""
+import argparse
+import json
+import os
+import time
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+
+from app.storage import (
+    DERIVATIVE_DIR,
+    DERIVATIVE_NAME_RE,
+    UPLOAD_DIR,
+    is_valid_image_name,
+    shard_prefix
+)
+
+
+def target_for(directory: Path, name: str) -> Optional[Path]:
+    """Новое место файла; None - файл не из хранилища (временный, чужой)"""
+    if directory == UPLOAD_DIR:
+        return directory / shard_prefix(name) / name if is_valid_image_name(name) else None
+    match = DERIVATIVE_NAME_RE.match(name)
+    if match is None or name.startswith("."):
+        return None
+    return directory / shard_prefix(match.group("stem")) / name
+
+
+def scan_flat(directory: Path, batch_size: int) -> Iterator[List[Tuple[Path, Path]]]:
+    """Пачки (старый путь, новый путь) файлов верхнего уровня"""
+    batch = []
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if not entry.is_file(follow_symlinks=False):
+                continue
+            target = target_for(directory, entry.name)
+            if target is None:
+                continue
+            batch.append((Path(entry.path), target))
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+def link_batch(batch: List[Tuple[Path, Path]], stats: dict) -> List[Path]:
+    """Новые ссылки для пачки; вернуть старые пути, которые осталось удалить"""
+    pending = []
+    for source, target in batch:
+        target.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            os.link(source, target)
+        except FileExistsError:
+            # Имя - хеш содержимого: тот же файл уже на новом месте
+            stats["already_present"] += 1
+        except FileNotFoundError:
+            # Удален (проект удалили, сборщик мусора) после обхода каталога
+            stats["vanished"] += 1
+            continue
+        except OSError:
+            # Жесткие ссылки не поддерживаются - атомарный перенос сразу
+            os.replace(source, target)
+            stats["moved"] += 1
+            continue
+        else:
+            stats["moved"] += 1
+        pending.append(source)
+    return pending
+
+
+def migrate(directory: Path, batch_size: int, settle: float, dry_run: bool) -> dict:
+    stats = {"moved": 0, "already_present": 0, "vanished": 0}
+    for batch in scan_flat(directory, batch_size):
+        if dry_run:
+            stats["moved"] += len(batch)
+            continue
+        pending = link_batch(batch, stats)
+        if pending:
+            time.sleep(settle)
+        for source in pending:
+            source.unlink(missing_ok=True)
+        print(f"{directory.name}: перенесено {stats['moved']}")
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument(
+        "--settle-seconds", type=float, default=2.0,
+        help="пауза между новыми ссылками и удалением старых имен"
+    )
+    parser.add_argument("--dry-run", action="store_true", help="только посчитать файлы для переноса")
+    args = parser.parse_args()
+
+    report = {
+        directory.name: migrate(directory, args.batch_size, args.settle_seconds, args.dry_run)
+        for directory in (UPLOAD_DIR, DERIVATIVE_DIR)
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""Удаление загруженных изображений, на которые не ссылается ни один проект.
+
+Запуск (из каталога backend):
+
+    python -m scripts.upload_gc --dry-run         # только посчитать
+    python -m scripts.upload_gc --grace-hours 48
+
+Сравнение с Portfolio.image_url идет по основной БД пачками, обход
+каталога потоковый (см. app.upload_gc). Если проход уже идет в
+приложении (UPLOAD_GC_INTERVAL_SECONDS) или в другом запуске, скрипт
+завершается с кодом 1.
+"""
+import argparse
+import asyncio
+import json
+import sys
+
+from app.database import dispose_engines
+from app.upload_gc import UPLOAD_GC_GRACE_SECONDS, run_upload_gc
+
+
+async def run(args):
+    try:
+        return await run_upload_gc(dry_run=args.dry_run, grace_seconds=int(args.grace_hours * 3600))
+    finally:
+        await dispose_engines()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dry-run", action="store_true", help="ничего не удалять, только отчет")
+    parser.add_argument(
+        "--grace-hours", type=float, default=UPLOAD_GC_GRACE_SECONDS / 3600,
+        help="не трогать файлы моложе этого срока"
+    )
+    args = parser.parse_args()
+
+    stats = asyncio.run(run(args))
+    if stats is None:
+        print("Сборка мусора уже выполняется в другом процессе")
+        sys.exit(1)
+    print(json.dumps(stats.as_dict(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
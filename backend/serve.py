@@ -0,0 +1,88 @@
+"""Запуск backend в production-режиме: несколько воркеров uvicorn.
+
+    python serve.py --migrate            # alembic upgrade head, затем воркеры
+    WEB_CONCURRENCY=8 DB_CONNECTION_BUDGET=80 python serve.py
+
+Схема БД меняется только здесь (--migrate) и один раз, а не при старте
+каждого воркера. Число воркеров попадает в окружение до их запуска,
+поэтому пул соединений каждого воркера - DB_CONNECTION_BUDGET / WEB_CONCURRENCY
+(см. app.database.pool_settings). Метрики воркеров /metrics собирает из
+общего каталога PROMETHEUS_MULTIPROC_DIR (по умолчанию - временный каталог).
+Сборка мусора загрузок идет раз в час (UPLOAD_GC_INTERVAL_SECONDS).
+Для разработки - start.sh (uvicorn --reload).
+"""
+import argparse
+import importlib.util
+import os
+import tempfile
+from pathlib import Path
+
+import uvicorn
+from dotenv import load_dotenv
+
+BACKEND_DIR = Path(__file__).resolve().parent
+
+
+def available(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+
+def migrate():
+    from alembic import command
+    from alembic.config import Config
+
+    config = Config(str(BACKEND_DIR / "alembic.ini"))
+    config.set_main_option("script_location", str(BACKEND_DIR / "alembic"))
+    command.upgrade(config, "head")
+
+
+def prepare_metrics_dir() -> str:
+    """Пустой каталог для метрик воркеров: значения прошлого запуска не нужны"""
+    path = Path(os.getenv("PROMETHEUS_MULTIPROC_DIR") or tempfile.mkdtemp(prefix="dalee-metrics-"))
+    path.mkdir(parents=True, exist_ok=True)
+    for stale in path.glob("*.db"):
+        stale.unlink()
+    return str(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument(
+        "--workers", type=int,
+        default=int(os.getenv("WEB_CONCURRENCY", str(os.cpu_count() or 1)))
+    )
+    parser.add_argument("--migrate", action="store_true", help="применить миграции перед запуском")
+    args = parser.parse_args()
+
+    if args.migrate:
+        migrate()
+
+    # Воркеры читают настройки пулов из окружения при импорте app.database
+    os.environ["WEB_CONCURRENCY"] = str(args.workers)
+    os.environ.pop("DB_CREATE_ALL", None)
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = prepare_metrics_dir()
+    # Файлы удаленных проектов удаляет только сборщик (app.upload_gc); проход один на все воркеры.
+    # .env читается заранее, иначе значение по умолчанию перекрыло бы его в воркерах
+    load_dotenv()
+    os.environ.setdefault("UPLOAD_GC_INTERVAL_SECONDS", "3600")
+
+    uvicorn.run(
+        "main:app",
+        app_dir=str(BACKEND_DIR),
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        loop="uvloop" if available("uvloop") else "asyncio",
+        http="httptools" if available("httptools") else "h11",
+        proxy_headers=True,
+        forwarded_allow_ips=os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1"),
+        backlog=int(os.getenv("UVICORN_BACKLOG", "2048")),
+        timeout_keep_alive=int(os.getenv("UVICORN_KEEPALIVE", "5")),
+        access_log=os.getenv("UVICORN_ACCESS_LOG", "false").lower() in ("1", "true", "yes"),
+    )
+
+
+if __name__ == "__main__":
+    main()
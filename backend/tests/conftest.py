@@ -0,0 +1,46 @@
+"""Общие фикстуры: приложение на временной SQLite без кэшей и фоновых пулов.
+
+Запуск (из каталога backend): python -m pytest
+"""
+import os
+import tempfile
+from pathlib import Path
+
+# До импорта app.*: настройки читаются при импорте модулей
+_tmp = Path(tempfile.mkdtemp(prefix="dalee-tests-"))
+os.environ["DATABASE_URL"] = f"sqlite:///{_tmp / 'test.db'}"
+os.environ["UPLOAD_ROOT"] = str(_tmp / "uploads")
+os.environ["DB_CREATE_ALL"] = "1"
+os.environ["PASSWORD_HASH_WORKERS"] = "0"
+os.environ["IMAGE_WORKERS"] = "0"
+# Кэш ответов и ограничение входа меняют число SQL-запросов между тестами
+os.environ["CACHE_URL"] = ""
+os.environ["LOGIN_THROTTLE_URL"] = ""
+
+pytest_plugins = ["app.pytest_plugin"]
+
+import pytest  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def app():
+    import main
+
+    return main.app
+
+
+@pytest.fixture(scope="session")
+def client(app):
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+@pytest.fixture(scope="session")
+def auth_headers(client):
+    user = {"email": "anna@example.com", "username": "anna", "password": "password"}
+    response = client.post("/api/v1/auth/register", json=user)
+    assert response.status_code == 201, response.text
+    response = client.post("/api/v1/auth/login-json", json={"username": "anna", "password": "password"})
+    assert response.status_code == 200, response.text
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
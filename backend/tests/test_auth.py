@@ -0,0 +1,47 @@
+"""Отзыв токенов по claim ver при устаревшем кэше пользователей"""
+from datetime import timedelta
+
+import pytest
+
+from app.auth import create_access_token, user_cache
+
+USER = {"email": "boris@example.com", "username": "boris", "password": "password"}
+
+
+def bearer(token: str) -> dict:
+    return {"Authorization": f"Bearer {token}"}
+
+
+@pytest.fixture(scope="module")
+def boris(client):
+    response = client.post("/api/v1/auth/register", json=USER)
+    assert response.status_code == 201, response.text
+    return response.json()["id"]
+
+
+def login(client, password: str = USER["password"]) -> str:
+    response = client.post("/api/v1/auth/login-json", json={"username": USER["username"], "password": password})
+    assert response.status_code == 200, response.text
+    return response.json()["access_token"]
+
+
+def test_password_change_revokes_old_token_on_worker_with_stale_cache(client, boris):
+    old_token = login(client)
+    assert client.get("/api/v1/users/me", headers=bearer(old_token)).status_code == 200
+    # Снимок, который остался бы в кэше другого воркера
+    stale_snapshot = user_cache.lru.get(boris)
+
+    response = client.put("/api/v1/users/me", headers=bearer(old_token), json={"password": "new-password"})
+    assert response.status_code == 200, response.text
+    new_token = response.json()["access_token"]
+    user_cache.lru.set(boris, stale_snapshot)
+
+    assert client.get("/api/v1/users/me", headers=bearer(new_token)).status_code == 200
+    assert client.get("/api/v1/users/me", headers=bearer(old_token)).status_code == 401
+    assert client.get("/api/v1/users/me", headers=bearer(login(client, "new-password"))).status_code == 200
+
+
+def test_token_without_version_is_rejected(client, boris):
+    legacy_token = create_access_token({"sub": USER["username"]}, expires_delta=timedelta(minutes=5))
+
+    assert client.get("/api/v1/users/me", headers=bearer(legacy_token)).status_code == 401
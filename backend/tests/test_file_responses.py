@@ -0,0 +1,70 @@
+"""Range и If-Range при отдаче изображений портфолио"""
+import pytest
+
+from app.file_responses import parse_range
+from app.storage import upload_path
+
+IMAGE_NAME = "range-test.png"
+IMAGE_BYTES = bytes(range(256)) * 4
+IMAGE_URL = f"/api/v1/portfolio/images/{IMAGE_NAME}"
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-99", (0, 99)),
+    ("bytes=1000-", (1000, 1023)),
+    ("bytes=1000-5000", (1000, 1023)),
+    ("bytes=-24", (1000, 1023)),
+    ("bytes=-5000", (0, 1023)),
+    ("bytes=1024-", (-1, -1)),
+    ("bytes=-0", (-1, -1)),
+    ("bytes=99-0", None),
+    ("bytes=-", None),
+    ("bytes=0-1,5-6", None),
+    ("items=0-1", None),
+])
+def test_parse_range(header, expected):
+    assert parse_range(header, 1024) == expected
+
+
+def test_parse_range_empty_file():
+    assert parse_range("bytes=0-", 0) == (-1, -1)
+
+
+@pytest.fixture
+def image(client):
+    path = upload_path(IMAGE_NAME)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(IMAGE_BYTES)
+    yield
+    path.unlink()
+
+
+def test_range_returns_partial_content(client, image):
+    response = client.get(IMAGE_URL, headers={"Range": "bytes=10-19"})
+
+    assert response.status_code == 206
+    assert response.headers["content-range"] == f"bytes 10-19/{len(IMAGE_BYTES)}"
+    assert response.content == IMAGE_BYTES[10:20]
+
+
+def test_range_outside_file_is_416(client, image):
+    response = client.get(IMAGE_URL, headers={"Range": f"bytes={len(IMAGE_BYTES)}-"})
+
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{len(IMAGE_BYTES)}"
+
+
+def test_if_range_matching_etag_keeps_range(client, image):
+    etag = client.get(IMAGE_URL).headers["etag"]
+
+    response = client.get(IMAGE_URL, headers={"Range": "bytes=0-9", "If-Range": etag})
+
+    assert response.status_code == 206
+    assert response.content == IMAGE_BYTES[:10]
+
+
+def test_if_range_stale_etag_returns_whole_file(client, image):
+    response = client.get(IMAGE_URL, headers={"Range": "bytes=0-9", "If-Range": '"stale"'})
+
+    assert response.status_code == 200
+    assert response.content == IMAGE_BYTES
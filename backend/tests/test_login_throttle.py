@@ -0,0 +1,61 @@
+"""Скользящее окно и экспоненциальная блокировка попыток входа"""
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app.login_throttle import LoginThrottle, MemoryThrottleBackend, backoff, sliding_estimate
+
+WINDOW = 300
+
+
+def test_backoff_doubles_up_to_maximum():
+    delays = [backoff(estimate, 5, 1, 900) for estimate in range(5, 16)]
+
+    assert delays[:5] == [1, 2, 4, 8, 16]
+    assert delays[-1] == 900
+    assert backoff(10 ** 9, 5, 1, 900) == 900
+
+
+def test_sliding_estimate_weights_previous_window():
+    assert sliding_estimate(10, 2, now=WINDOW * 7, window=WINDOW) == 12
+    assert sliding_estimate(10, 2, now=WINDOW * 7 + WINDOW / 2, window=WINDOW) == 7
+
+
+def test_memory_backend_blocks_at_limit_without_counting_blocked_attempts():
+    async def scenario():
+        backend = MemoryThrottleBackend(max_keys=10)
+        allowed = [await backend.attempt("id:anna", 3, WINDOW, 60, 900) for _ in range(3)]
+        counted = backend.lru.get("id:anna")[1]
+        blocked = await backend.attempt("id:anna", 3, WINDOW, 60, 900)
+        return allowed, counted, blocked, backend.lru.get("id:anna")[1]
+
+    allowed, counted, blocked, counted_after_block = asyncio.run(scenario())
+
+    assert allowed == [0.0, 0.0, 0.0]
+    assert 0 < blocked <= 60
+    assert counted_after_block == counted
+
+
+def test_reserve_raises_429_and_success_resets_identifier():
+    throttle = LoginThrottle(
+        MemoryThrottleBackend(max_keys=10), window=WINDOW, identifier_limit=2, ip_limit=100,
+        base_delay=30, max_delay=900
+    )
+
+    async def scenario():
+        await throttle.reserve("anna", "10.0.0.1")
+        await throttle.success("anna", "10.0.0.1")
+        await throttle.reserve("anna", "10.0.0.1")
+        await throttle.reserve("anna", "10.0.0.1")
+        with pytest.raises(HTTPException) as error:
+            await throttle.reserve("anna", "10.0.0.1")
+        # Другой идентификатор с того же IP не заблокирован
+        await throttle.reserve("boris", "10.0.0.1")
+        return error.value
+
+    error = asyncio.run(scenario())
+
+    assert error.status_code == 429
+    assert 1 <= int(error.headers["Retry-After"]) <= 30
+    assert throttle.stats.throttled == 1
@@ -0,0 +1,76 @@
+"""Курсоры keyset-пагинации и постраничный каталог /users/public"""
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import update
+
+from app.database import engine
+from app.models import User
+from app.pagination import decode_cursor, encode_cursor
+
+
+def test_cursor_round_trip():
+    created_at = datetime(2024, 5, 17, 12, 30, 45, 123456)
+
+    cursor = encode_cursor(created_at, 42)
+
+    assert "=" not in cursor
+    assert decode_cursor(cursor, datetime, int) == (created_at, 42)
+
+
+@pytest.mark.parametrize("cursor", ["не-base64!", encode_cursor(1), encode_cursor("вчера", 1)])
+def test_bad_cursor_is_400(cursor):
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(cursor, datetime, int)
+
+    assert error.value.status_code == 400
+
+
+@pytest.fixture(scope="module")
+def public_profiles(client):
+    ids = []
+    for number in range(3):
+        user = {"email": f"page{number}@example.com", "username": f"page{number}", "password": "password"}
+        response = client.post("/api/v1/auth/register", json=user)
+        assert response.status_code == 201, response.text
+        token = client.post(
+            "/api/v1/auth/login-json", json={"username": user["username"], "password": "password"}
+        ).json()["access_token"]
+        response = client.put(
+            "/api/v1/users/me", headers={"Authorization": f"Bearer {token}"}, json={"is_profile_public": True}
+        )
+        assert response.status_code == 200, response.text
+        ids.append(response.json()["id"])
+    # CURRENT_TIMESTAMP в SQLite - текст без микросекунд, а курсор привязывается с ними:
+    # пользователи одной секунды сравнивались бы как строки разной длины
+    with engine.begin() as connection:
+        for number, user_id in enumerate(ids):
+            connection.execute(
+                update(User).where(User.id == user_id).values(created_at=datetime(2100, 1, 1, 0, 0, number))
+            )
+    return ids
+
+
+def test_public_profiles_pages_follow_cursor(client, public_profiles):
+    seen = []
+    params = {"limit": 2}
+    while True:
+        response = client.get("/api/v1/users/public", params=params)
+        assert response.status_code == 200, response.text
+        page = response.json()
+        assert len(page["items"]) <= 2
+        seen += [profile["id"] for profile in page["items"]]
+        if not page["next_cursor"]:
+            break
+        params["cursor"] = page["next_cursor"]
+
+    assert seen == sorted(seen)
+    assert seen[-3:] == public_profiles
+
+
+def test_public_profiles_without_paging_is_list(client, public_profiles):
+    response = client.get("/api/v1/users/public")
+
+    assert response.status_code == 200
+    assert [profile["id"] for profile in response.json()][-3:] == public_profiles
@@ -0,0 +1,59 @@
+"""@query_budget и фикстура query_counts (app.pytest_plugin)"""
+import pytest
+from fastapi import Depends
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import get_db
+from app.models import Portfolio, User
+from app.query_budget import QueryBudgetExceeded, query_budget
+
+N_PLUS_ONE_PATH = "/test/portfolio-owners"
+
+
+@pytest.fixture
+def portfolio(client, auth_headers):
+    for number in range(4):
+        response = client.post(
+            "/api/v1/portfolio", headers=auth_headers, json={"title": f"Проект {number}"}
+        )
+        assert response.status_code == 201, response.text
+    yield
+    for item in client.get("/api/v1/portfolio", headers=auth_headers).json():
+        client.delete(f"/api/v1/portfolio/{item['id']}", headers=auth_headers)
+
+
+@pytest.fixture
+def n_plus_one_route(app):
+    """Эндпоинт с N+1: владелец каждого проекта отдельным запросом"""
+
+    @query_budget(2)
+    async def portfolio_owners(db: AsyncSession = Depends(get_db)):
+        items = (await db.scalars(select(Portfolio))).all()
+        return [await db.scalar(select(User.username).where(User.id == item.user_id)) for item in items]
+
+    app.router.add_api_route(N_PLUS_ONE_PATH, portfolio_owners, methods=["GET"])
+    yield
+    app.router.routes[:] = [
+        route for route in app.router.routes if getattr(route, "path", None) != N_PLUS_ONE_PATH
+    ]
+
+
+def test_my_portfolio_within_budget(client, auth_headers, portfolio, query_counts):
+    response = client.get("/api/v1/portfolio", headers=auth_headers)
+
+    assert response.status_code == 200
+    assert len(response.json()) == 4
+    query_counts.assert_at_most("GET /api/v1/portfolio", 2)
+    query_counts.assert_no_repeats()
+
+
+def test_n_plus_one_exceeds_budget(client, portfolio, n_plus_one_route, query_counts):
+    with pytest.raises(QueryBudgetExceeded) as error:
+        client.get(N_PLUS_ONE_PATH)
+
+    assert "при бюджете 2" in str(error.value)
+    assert "повтор x4" in str(error.value)
+    assert query_counts.last(f"GET {N_PLUS_ONE_PATH}").queries == 5
+    with pytest.raises(AssertionError):
+        query_counts.assert_no_repeats(f"GET {N_PLUS_ONE_PATH}")
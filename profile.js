@@ -140,7 +140,7 @@ function setupPasswordForm() {
         
         try {
             await updateProfile({ password });
-            showMessage('Пароль успешно изменен в базе данных', 'success');
+            showMessage('Пароль успешно изменен, другие сеансы завершены', 'success');
             form.reset();
         } catch (error) {
             showMessage(error.message || 'Ошибка при изменении пароля', 'error');
@@ -33,7 +33,14 @@ fi
 # Запуск backend
 echo -e "${BLUE}📦 Запуск backend ${NC}"
 cd backend
-uvicorn main:app --reload --host 0.0.0.0 --port 8000 > ../backend.log 2>&1 &
+if [ "$1" = "prod" ]; then
+    # Несколько воркеров uvloop/httptools, миграции один раз до запуска (см. backend/serve.py)
+    python3 serve.py --migrate --port 8000 > ../backend.log 2>&1 &
+else
+    # Разработка: один процесс с автоперезагрузкой, таблицы создаются при старте,
+    # превышение @query_budget и повторяющиеся SQL-запросы пишутся в лог
+    DB_CREATE_ALL=1 QUERY_BUDGET_MODE=${QUERY_BUDGET_MODE:-log} uvicorn main:app --reload --host 0.0.0.0 --port 8000 > ../backend.log 2>&1 &
+fi
 BACKEND_PID=$!
 cd ..
 